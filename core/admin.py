@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     User, Post, Event, Notification, MarketplaceItem, Reaction, MarketplaceMedia,
-    SwappOffer, Feedback, Group, Message, Comment, Report, PollOption, GroupMessage
+    SwappOffer, Feedback, Group, Message, Comment, Report, PollOption, GroupMessage,
+    PostEngagement, TrendingRank,
 )
 # Register your models here.
 class MarketplaceItemAdmin(admin.ModelAdmin):
@@ -34,6 +35,10 @@ class GroupMessageAdmin(admin.ModelAdmin):
     pass
 class PostAdmin(admin.ModelAdmin):
     pass
+class PostEngagementAdmin(admin.ModelAdmin):
+    pass
+class TrendingRankAdmin(admin.ModelAdmin):
+    pass
 
 admin.site.register(GroupMessage, GroupMessageAdmin)
 admin.site.register(PollOption, PollOptionAdmin)
@@ -48,4 +53,6 @@ admin.site.register(Notification, NotificationAdmin)
 admin.site.register(Event, EventAdmin)
 admin.site.register(User, UserAdmin)
 admin.site.register(MarketplaceItem, MarketplaceItemAdmin)
-admin.site.register(Post, PostAdmin)
\ No newline at end of file
+admin.site.register(Post, PostAdmin)
+admin.site.register(PostEngagement, PostEngagementAdmin)
+admin.site.register(TrendingRank, TrendingRankAdmin)
\ No newline at end of file
@@ -0,0 +1,152 @@
+import csv
+import io
+import json
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .cache import bump_city_version
+from .models import MarketplaceItem
+from .serializers import MarketplaceImportRowSerializer
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+IMPORT_BATCH_SIZE = 500
+# Per-row errors beyond this are counted but not echoed back, so the response stays bounded too.
+MAX_REPORTED_ERRORS = 200
+EXPORT_FIELDS = [
+    'id', 'title', 'description', 'price', 'category', 'condition', 'delivery_options',
+    'delivery_note', 'expiry_date', 'status', 'views_count',
+]
+
+
+def import_format(upload, requested=None):
+    fmt = (requested or upload.name.rsplit('.', 1)[-1]).lower()
+    return {'ndjson': 'jsonl', 'json': 'jsonl'}.get(fmt, fmt)
+
+
+class ImportReadError(ValueError):
+    """The upload cannot be read as the requested format at all (as opposed to a bad row)."""
+
+
+def iter_rows(upload, fmt):
+    """Yield (row number, dict or None) one line at a time, without reading the whole file."""
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    first = True
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        if first and line.lstrip().startswith('['):
+            # A .json upload holding one array would have to be parsed whole; only JSONL streams.
+            raise ImportReadError('JSON arrays are not supported; upload JSONL, one object per line.')
+        first = False
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+class ListingImport:
+    """
+    Validates uploaded rows one at a time and inserts the valid ones for
+    `seller` with bulk_create in batches of IMPORT_BATCH_SIZE, so memory use
+    does not grow with the size of the file.
+
+    bulk_create sends no post_save, so run() bumps the feed cache version of
+    every city it wrote to itself, even when reading the file fails part-way.
+    The other MarketplaceItem receivers are skipped on purpose: imported
+    listings are always 'available', so the swap matcher has nothing to
+    discard, and the similar-listings index finds them by updated_at.
+    """
+
+    def __init__(self, seller):
+        self.seller = seller
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.batch = []
+        self.cities = set()
+        # One serializer for every row: run_validation() reuses its bound fields instead of rebuilding them.
+        self.validator = MarketplaceImportRowSerializer()
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def add(self, row_number, row):
+        if row is None:
+            self.add_error(row_number, {'non_field_errors': ['Row is not a valid JSON object.']})
+            return
+        # Blank CSV cells mean "use the default", not "empty string".
+        data = {key: value for key, value in row.items() if key and value not in ('', None)}
+        try:
+            validated = self.validator.run_validation(data)
+        except ValidationError as exc:
+            self.add_error(row_number, exc.detail)
+            return
+        self.batch.append(MarketplaceItem(seller=self.seller, city=self.seller.city, **validated))
+        if len(self.batch) >= IMPORT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            with transaction.atomic():
+                MarketplaceItem.objects.bulk_create(self.batch)
+            self.created += len(self.batch)
+            self.cities.update(item.city_key for item in self.batch)
+            self.batch = []
+
+    def run(self, rows):
+        read_error = None
+        try:
+            for row_number, row in rows:
+                self.add(row_number, row)
+            self.flush()
+        except (UnicodeDecodeError, csv.Error, ImportReadError) as exc:
+            # Keep every valid row read before the error and report them, so a retry can skip them.
+            read_error = f'Could not read the file: {exc}'
+            self.flush()
+        finally:
+            for city in self.cities:
+                bump_city_version(city)
+        result = {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+        if read_error:
+            result['error'] = read_error
+        return result
+
+
+class _Echo:
+    """File-like object whose write() hands back the value, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(seller, chunk_size=2000):
+    return (
+        MarketplaceItem.objects.filter(seller=seller).order_by('pk')
+        .values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    )
+
+
+def stream_csv(seller):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(seller):
+        yield writer.writerow(row)
+
+
+def stream_jsonl(seller):
+    for row in export_rows(seller):
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str) + '\n'
@@ -0,0 +1,96 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .models import normalize_city
+
+FEED_CACHE_PREFIX = 'feedcache'
+FEED_CACHE_STATS = ('hits', 'misses')
+
+
+def _incr(key, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Key expired or never set; add() loses the race gracefully if another process got there first.
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def get_city_version(city):
+    key = f'{FEED_CACHE_PREFIX}:version:{normalize_city(city)}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_city_version(city):
+    """Invalidate every cached feed page for `city` by moving it to a new version."""
+    if city:
+        _incr(f'{FEED_CACHE_PREFIX}:version:{normalize_city(city)}')
+
+
+def record(stat):
+    _incr(f'{FEED_CACHE_PREFIX}:stats:{stat}')
+
+
+def get_stats():
+    values = cache.get_many([f'{FEED_CACHE_PREFIX}:stats:{stat}' for stat in FEED_CACHE_STATS])
+    stats = {stat: values.get(f'{FEED_CACHE_PREFIX}:stats:{stat}', 0) for stat in FEED_CACHE_STATS}
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / total, 4) if total else None
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([f'{FEED_CACHE_PREFIX}:stats:{stat}' for stat in FEED_CACHE_STATS])
+
+
+class CityFeedCacheMixin:
+    """
+    Caches serialized list pages for anonymous `?city=` reads.
+
+    Keys combine the view's `feed_cache_name`, the city's current version and
+    the remaining query params (sort, cursor, page, ...); `sort=random` is only
+    cached once the request carries its `seed`. Writes to anything
+    shown in a city's feeds bump that version (see core.signals), so stale
+    pages are never read again and simply age out of the cache.
+    """
+    feed_cache_name = None
+
+    def get_feed_cache_key(self, request):
+        city = request.query_params.get('city', '')
+        if request.method != 'GET' or request.user.is_authenticated or not normalize_city(city):
+            return None
+        if request.query_params.get('sort') == 'random' and not request.query_params.get('seed'):
+            # Each unseeded request draws a fresh seed; caching one would replay it to every visitor.
+            return None
+        params = sorted(
+            (key, value) for key, values in request.query_params.lists()
+            for value in values if key != 'city'
+        )
+        digest = hashlib.md5(repr(params).encode()).hexdigest()
+        version = get_city_version(city)
+        return f'{FEED_CACHE_PREFIX}:page:{self.feed_cache_name}:{normalize_city(city)}:v{version}:{digest}'
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_feed_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+
+        data = cache.get(key)
+        if data is not None:
+            record('hits')
+            return Response(data, headers={'X-Feed-Cache': 'hit'})
+
+        record('misses')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=getattr(settings, 'FEED_CACHE_TIMEOUT', 300))
+        response['X-Feed-Cache'] = 'miss'
+        return response
@@ -0,0 +1,135 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, ExpressionWrapper, F, Value, When
+
+from .models import Event, MarketplaceItem, Post
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedCounter:
+    """
+    Write-behind counter for an integer column (e.g. MarketplaceItem.views_count).
+
+    Increments accumulate in process memory and are written back in a single
+    `UPDATE ... SET col = CASE WHEN pk IN (...) THEN col + n ... END` per
+    flush, so a hot row costs one write per flush rather than one per view.
+    A flush happens every VIEW_COUNTER_FLUSH_INTERVAL seconds (background
+    thread), as soon as VIEW_COUNTER_MAX_PENDING distinct rows are waiting,
+    and at interpreter exit. A crash loses at most one interval's worth.
+    """
+
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+        self.pending = Counter()
+        self.lock = threading.Lock()
+
+    def incr(self, pk, delta=1):
+        with self.lock:
+            self.pending[pk] += delta
+            full = len(self.pending) >= getattr(settings, 'VIEW_COUNTER_MAX_PENDING', 1000)
+        ensure_flusher()
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                # Never fail the request that happened to fill the buffer; the flusher retries.
+                logger.exception("Flushing %r failed", self)
+
+    def get_pending(self, pk):
+        """Increments for `pk` not yet written, for read-your-own-views display."""
+        return self.pending.get(pk, 0)
+
+    def flush(self):
+        """Write every buffered increment. Returns the number of rows updated."""
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        if not pending:
+            return 0
+
+        # Rows with the same delta share a WHEN branch, which keeps the statement short for popular items.
+        by_delta = defaultdict(list)
+        for pk, delta in pending.items():
+            by_delta[delta].append(pk)
+        column = F(self.field)
+        output_field = self.model._meta.get_field(self.field)
+        value = Case(
+            *[
+                When(pk__in=pks, then=ExpressionWrapper(column + Value(delta), output_field=output_field))
+                for delta, pks in by_delta.items()
+            ],
+            default=column,
+            output_field=output_field,
+        )
+        try:
+            return self.model.objects.filter(pk__in=list(pending)).update(**{self.field: value})
+        except Exception:
+            # Put the increments back so the next flush retries them.
+            with self.lock:
+                self.pending.update(pending)
+            raise
+
+    def __repr__(self):
+        return f'<BufferedCounter {self.model._meta.label}.{self.field}>'
+
+
+marketplace_views = BufferedCounter(MarketplaceItem, 'views_count')
+post_views = BufferedCounter(Post, 'views_count')
+event_views = BufferedCounter(Event, 'views_count')
+COUNTERS = [marketplace_views, post_views, event_views]
+
+
+def flush_all():
+    updated = 0
+    for counter in COUNTERS:
+        try:
+            updated += counter.flush()
+        except Exception:
+            logger.exception("Flushing %r failed", counter)
+    return updated
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 10))
+        flush_all()
+        connections.close_all()
+
+
+def ensure_flusher():
+    """Start the background flush thread in this process (once; also re-created after a fork)."""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_forever, name='view-counter-flush', daemon=True)
+            _flusher.start()
+
+
+atexit.register(flush_all)
+
+
+class ViewCountMixin:
+    """Counts successful retrieve() calls on a detail view through `view_counter`."""
+    view_counter = None
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == 200:
+            pk, field = response.data['id'], self.view_counter.field
+            self.view_counter.incr(pk)
+            if field in response.data:
+                response.data[field] += self.view_counter.get_pending(pk)
+        return response
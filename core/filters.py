@@ -0,0 +1,134 @@
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, CharField, Count, Q, Value, When
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+# (label, lower bound inclusive, upper bound exclusive); None means open-ended.
+PRICE_BUCKETS = [
+    ('0-25', None, 25),
+    ('25-50', 25, 50),
+    ('50-100', 50, 100),
+    ('100-250', 100, 250),
+    ('250-500', 250, 500),
+    ('500+', 500, None),
+]
+
+# query param -> model field for the multi-select facet dimensions
+FACET_FIELDS = {
+    'category': 'category',
+    'condition': 'condition',
+    'delivery': 'delivery_options',
+}
+
+
+def _multi_value(request, param):
+    values = []
+    for raw in request.query_params.getlist(param):
+        values.extend(value.strip() for value in raw.split(',') if value.strip())
+    return values
+
+
+def _decimal(request, param):
+    raw = request.query_params.get(param)
+    if raw in (None, ''):
+        return None
+    try:
+        value = Decimal(raw)
+    except InvalidOperation:
+        raise ValidationError({param: 'Must be a number.'})
+    # NaN, sNaN and Infinity parse fine but cannot be compared against a price column.
+    if not value.is_finite():
+        raise ValidationError({param: 'Must be a number.'})
+    return value
+
+
+def _date(request, param):
+    raw = request.query_params.get(param)
+    if raw in (None, ''):
+        return None
+    value = parse_date(raw)
+    if value is None:
+        raise ValidationError({param: 'Must be a date (YYYY-MM-DD).'})
+    return value
+
+
+def price_bucket_expression():
+    whens = []
+    for label, low, high in PRICE_BUCKETS:
+        condition = Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        whens.append(When(condition, then=Value(label)))
+    return Case(*whens, output_field=CharField())
+
+
+class MarketplaceFilter:
+    """
+    Server-side filtering for the marketplace feed.
+
+    Query params: `search` (title/description terms), `min_price`, `max_price`,
+    `expires_after`, `expires_before`, and the multi-select facets `category`,
+    `condition` and `delivery` (repeat the param or comma-separate values).
+    """
+
+    def __init__(self, request):
+        self.search_terms = request.query_params.get('search', '').split()
+        self.min_price = _decimal(request, 'min_price')
+        self.max_price = _decimal(request, 'max_price')
+        self.expires_after = _date(request, 'expires_after')
+        self.expires_before = _date(request, 'expires_before')
+        self.selected = {param: _multi_value(request, param) for param in FACET_FIELDS}
+
+    def filter_base(self, queryset):
+        """Apply everything except the facet selections."""
+        for term in self.search_terms:
+            queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+        if self.min_price is not None:
+            queryset = queryset.filter(price__gte=self.min_price)
+        if self.max_price is not None:
+            queryset = queryset.filter(price__lte=self.max_price)
+        if self.expires_after is not None:
+            queryset = queryset.filter(Q(expiry_date__isnull=True) | Q(expiry_date__gte=self.expires_after))
+        if self.expires_before is not None:
+            queryset = queryset.filter(expiry_date__lte=self.expires_before)
+        return queryset
+
+    def filter_facets(self, queryset):
+        for param, field in FACET_FIELDS.items():
+            if self.selected[param]:
+                queryset = queryset.filter(**{f'{field}__in': self.selected[param]})
+        return queryset
+
+    def facet_counts(self, base_queryset):
+        """
+        Counts for every facet value in one GROUP BY over (category, condition,
+        delivery, price bucket). Each dimension is counted with the other
+        dimensions' selections applied but not its own, so clients can show
+        how many results picking another value would give.
+        """
+        rows = (
+            base_queryset.order_by()
+            .values(*FACET_FIELDS.values(), price_bucket=price_bucket_expression())
+            .annotate(count=Count('id'))
+        )
+
+        facets = {param: Counter() for param in FACET_FIELDS}
+        facets['price'] = Counter()
+        for row in rows:
+            matches = {
+                param: not self.selected[param] or row[field] in self.selected[param]
+                for param, field in FACET_FIELDS.items()
+            }
+            for param, field in FACET_FIELDS.items():
+                if all(ok for other, ok in matches.items() if other != param):
+                    facets[param][row[field]] += row['count']
+            if all(matches.values()):
+                facets['price'][row['price_bucket']] += row['count']
+
+        result = {param: dict(counts.most_common()) for param, counts in facets.items() if param != 'price'}
+        result['price'] = {label: facets['price'].get(label, 0) for label, _, _ in PRICE_BUCKETS}
+        return result
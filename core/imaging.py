@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from .media import MEDIA_PRESETS
+
+# Every preset in core.media is rendered in each of these formats. WebP method 2 encodes
+# ~2.5x faster than the default of 4 for files within a few percent of the same size.
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 2}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Originals keep their format when it is one of these; anything else (GIF, ...) is re-encoded as JPEG.
+ORIGINAL_FORMATS = {
+    'JPEG': ('jpg', {'quality': 92}),
+    'PNG': ('png', {'optimize': True}),
+    'WEBP': ('webp', {'quality': 92}),
+}
+# Image.info entries that carry camera/location metadata and must not be written back out.
+STRIPPED_METADATA = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+
+def _strip_metadata(image):
+    # Bake the EXIF orientation into the pixels before the tag is dropped.
+    image = ImageOps.exif_transpose(image)
+    for key in STRIPPED_METADATA:
+        image.info.pop(key, None)
+    return image
+
+
+def _opaque(image):
+    """JPEG has no alpha channel: flatten transparent images onto white."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        flat = Image.new('RGB', rgba.size, 'white')
+        flat.paste(rgba, mask=rgba.getchannel('A'))
+        return flat
+    return image.convert('RGB')
+
+
+def _for_format(image, fmt):
+    if fmt == 'JPEG':
+        return _opaque(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    return image
+
+
+def _resize(image, preset):
+    if preset['crop'] == 'fill':
+        return ImageOps.fit(image, (preset['width'], preset['height']), Image.Resampling.LANCZOS)
+    # 'limit': only ever scale down, keeping the aspect ratio.
+    resized = image.copy()
+    resized.thumbnail((preset['width'], preset.get('height') or image.height), Image.Resampling.LANCZOS)
+    return resized
+
+
+def _save(image, path, fmt, options):
+    image.save(path, fmt, **options)
+    return {'path': path, 'bytes': os.path.getsize(path)}
+
+
+def process_image(path, out_dir):
+    """
+    Write an EXIF-stripped copy of the image at `path` plus every MEDIA_PRESETS
+    derivative in every DERIVATIVE_FORMATS format into `out_dir`.
+
+    Pure Pillow work with no Django state, so it can run in a worker process.
+    Returns {'width', 'height', 'original': {'path', 'bytes'}, 'derivatives':
+    {preset: {'width', 'height', fmt: {'path', 'bytes'}}}}.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    with Image.open(path) as source:
+        source_format = source.format
+        image = _strip_metadata(source)
+        image.load()
+
+    ext, options = ORIGINAL_FORMATS.get(source_format, ('jpg', ORIGINAL_FORMATS['JPEG'][1]))
+    fmt = source_format if source_format in ORIGINAL_FORMATS else 'JPEG'
+    result = {
+        'width': image.width,
+        'height': image.height,
+        'original': _save(_for_format(image, fmt), os.path.join(out_dir, f'{stem}-original.{ext}'), fmt, options),
+        'derivatives': {},
+    }
+
+    # Largest preset first: smaller ones are resized from it rather than from the full-size original.
+    source = image
+    for name, preset in sorted(MEDIA_PRESETS.items(), key=lambda item: -item[1]['width']):
+        derivative = _resize(source, preset)
+        if preset['crop'] == 'limit':
+            source = derivative
+        entry = {'width': derivative.width, 'height': derivative.height}
+        for key, (fmt, options) in DERIVATIVE_FORMATS.items():
+            entry[key] = _save(_for_format(derivative, fmt), os.path.join(out_dir, f'{stem}-{name}.{key}'), fmt, options)
+        result['derivatives'][name] = entry
+    return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the web process has live threads (the ingest pool) and DB connections.
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_PROCESS_WORKERS', None) or os.cpu_count(),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def generate_derivatives(path, out_dir=None):
+    """Run process_image() in the process pool and wait for it."""
+    global _pool
+    try:
+        return get_pool().submit(process_image, path, out_dir or os.path.dirname(path)).result()
+    except BrokenProcessPool:
+        # A worker died (OOM on a huge image, say); start a fresh pool for the next call.
+        with _pool_lock:
+            _pool = None
+        raise
@@ -0,0 +1,220 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from cloudinary import uploader
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+from .cache import bump_city_version
+from .imaging import DERIVATIVE_FORMATS, generate_derivatives
+from .media import media_srcset, media_url
+from .models import MarketplaceMedia
+
+logger = logging.getLogger(__name__)
+
+MEDIA_FOLDER = 'marketplace/media/'
+
+
+class CloudinaryMediaStorage:
+    """Pushes staged files to Cloudinary; URLs are built from the named presets in core.media."""
+
+    def save(self, path, is_video=False):
+        """Upload the file at `path`. Returns the value stored in MarketplaceMedia.file."""
+        resource = uploader.upload_resource(
+            path, folder=MEDIA_FOLDER, type='upload', resource_type='video' if is_video else 'image',
+        )
+        return resource.get_prep_value()
+
+    def public_url(self, stored):
+        """Plain delivery URL (no transformation) for a value returned by save()."""
+        return MarketplaceMedia._meta.get_field('file').parse_cloudinary_resource(stored).build_url(secure=True)
+
+    def url(self, resource, preset):
+        return media_url(resource.public_id, preset)
+
+    def srcset(self, resource, preset):
+        return media_srcset(resource.public_id, preset)
+
+
+class LocalMediaStorage:
+    """
+    Offline stand-in for Cloudinary: copies staged files under MEDIA_ROOT and
+    serves them from MEDIA_URL. There are no transformations, so every preset
+    gets the original file.
+    """
+
+    def save(self, path, is_video=False):
+        name = MEDIA_FOLDER + os.path.basename(path)
+        destination = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(path, destination)
+        return name
+
+    def public_url(self, stored):
+        return settings.MEDIA_URL + stored
+
+    def url(self, resource, preset):
+        name = f'{resource.public_id}.{resource.format}' if resource.format else resource.public_id
+        return settings.MEDIA_URL + name
+
+    def srcset(self, resource, preset):
+        return None
+
+
+@lru_cache(maxsize=None)
+def _load_storage(path):
+    return import_string(path)()
+
+
+def get_media_storage():
+    return _load_storage(getattr(settings, 'MARKETPLACE_MEDIA_STORAGE', 'core.ingest.CloudinaryMediaStorage'))
+
+
+def stage_upload(file):
+    """Write an uploaded file to the staging directory and return its path."""
+    root = settings.MEDIA_STAGING_ROOT
+    os.makedirs(root, exist_ok=True)
+    ext = os.path.splitext(file.name)[1].lower()
+    path = os.path.join(root, uuid.uuid4().hex + ext)
+    with open(path, 'wb') as out:
+        for chunk in file.chunks():
+            out.write(chunk)
+    return path
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _processed_paths(processed):
+    yield processed['original']['path']
+    for entry in processed['derivatives'].values():
+        for key in DERIVATIVE_FORMATS:
+            yield entry[key]['path']
+
+
+def _push(storage, media, processed):
+    """Upload the original (EXIF-stripped for images) and any derivatives. Returns (stored, derivatives)."""
+    if processed is None:
+        return storage.save(media.staged_file, is_video=media.is_video), {}
+    stored = storage.save(processed['original']['path'])
+    derivatives = {}
+    for name, entry in processed['derivatives'].items():
+        derivatives[name] = {'width': entry['width'], 'height': entry['height']}
+        for key in DERIVATIVE_FORMATS:
+            derivatives[name][key] = {
+                'url': storage.public_url(storage.save(entry[key]['path'])),
+                'bytes': entry[key]['bytes'],
+            }
+    return stored, derivatives
+
+
+def _fail(media, attempts, error):
+    MarketplaceMedia.objects.filter(pk=media.pk).update(
+        status=MarketplaceMedia.FAILED, attempts=attempts, error=error,
+    )
+    return False
+
+
+def ingest_media(media_id):
+    """
+    Render image derivatives in the process pool (core.imaging), then push
+    everything to storage, retrying uploads with exponential backoff. Marks
+    the media 'ready' (and deletes the staged files) or 'failed'. Returns
+    True on success.
+    """
+    media = (
+        MarketplaceMedia.objects.select_related('item')
+        .filter(pk=media_id, status=MarketplaceMedia.PROCESSING).first()
+    )
+    if media is None:
+        return False
+
+    processed = None
+    if not media.is_video:
+        try:
+            processed = generate_derivatives(media.staged_file)
+        except Exception as exc:
+            # Undecodable images won't get better on retry.
+            logger.warning("Media %s could not be processed: %s", media_id, exc)
+            return _fail(media, media.attempts + 1, f'{type(exc).__name__}: {exc}')
+
+    storage = get_media_storage()
+    max_attempts = getattr(settings, 'MEDIA_INGEST_MAX_ATTEMPTS', 3)
+    delay = getattr(settings, 'MEDIA_INGEST_RETRY_DELAY', 2)
+    attempts = media.attempts
+    error = ''
+    try:
+        for attempt in range(max_attempts):
+            attempts += 1
+            try:
+                stored, derivatives = _push(storage, media, processed)
+                break
+            except Exception as exc:
+                error = f'{type(exc).__name__}: {exc}'
+                logger.warning("Media %s upload attempt %s failed: %s", media_id, attempts, error)
+                if attempt + 1 < max_attempts:
+                    time.sleep(delay * 2 ** attempt)
+        else:
+            return _fail(media, attempts, error)
+    finally:
+        if processed is not None:
+            _remove(*_processed_paths(processed))
+
+    MarketplaceMedia.objects.filter(pk=media_id).update(
+        file=stored, status=MarketplaceMedia.READY, staged_file='', attempts=attempts, error='',
+        width=processed['width'] if processed else None,
+        height=processed['height'] if processed else None,
+        derivatives=derivatives,
+    )
+    _remove(media.staged_file)
+    # Cached feed pages still show this media as processing.
+    bump_city_version(media.item.city)
+    return True
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'MEDIA_INGEST_WORKERS', 4), thread_name_prefix='media-ingest',
+            )
+        return _executor
+
+
+def _run(media_id):
+    try:
+        ingest_media(media_id)
+    except Exception:
+        logger.exception("Media %s ingestion crashed", media_id)
+    finally:
+        # Worker threads get their own connections; don't leak them.
+        connections.close_all()
+
+
+def enqueue(media_ids):
+    """Hand staged media to the background pool once the creating transaction commits."""
+    media_ids = list(media_ids)
+
+    def submit():
+        executor = get_executor()
+        for media_id in media_ids:
+            executor.submit(_run, media_id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,82 @@
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_city_version
+from .models import MarketplaceItem, Notification
+
+
+def overdue_listings(today=None):
+    """Available listings whose expiry_date has passed; served by market_status_expiry_idx."""
+    today = today or timezone.localdate()
+    return MarketplaceItem.objects.filter(status='available', expiry_date__lt=today)
+
+
+def expiry_notifications(expired):
+    """One notification per seller for a batch of (pk, seller_id, title) rows."""
+    by_seller = defaultdict(list)
+    for pk, seller_id, title in expired:
+        by_seller[seller_id].append((pk, title))
+    notifications = []
+    for seller_id, items in by_seller.items():
+        if len(items) == 1:
+            pk, title = items[0]
+            content, link = f"Your listing \"{title}\" has expired.", f"/marketplace/{pk}"
+        else:
+            content, link = f"{len(items)} of your listings have expired.", "/marketplace"
+        notifications.append(Notification(user_id=seller_id, content=content[:255], link=link))
+    return notifications
+
+
+def expire_listings(today=None, batch_size=1000, notify=True):
+    """
+    Flip overdue listings to 'expired' in chunks of `batch_size`, each chunk in
+    its own short transaction together with the seller notifications, so the
+    sweep never holds locks on more than one chunk. Returns a stats dict.
+    """
+    today = today or timezone.localdate()
+    started = time.monotonic()
+    expired = notified = batches = 0
+    cities = set()
+
+    while True:
+        with transaction.atomic():
+            # skip_locked lets several sweepers (or a sweeper and checkout traffic) share the table.
+            batch = list(
+                overdue_listings(today).select_for_update(skip_locked=True).order_by('expiry_date', 'pk')
+                .values_list('pk', 'seller_id', 'title', 'city')[:batch_size]
+            )
+            if not batch:
+                break
+            pks = [row[0] for row in batch]
+            # Re-check the status where there are no row locks (SQLite): a listing sold since the SELECT stays sold.
+            # updated_at moves too, so anything syncing on it (e.g. core.similar) sees the change.
+            now = timezone.now()
+            MarketplaceItem.objects.filter(pk__in=pks, status='available').update(status='expired', updated_at=now)
+            # Only the rows this UPDATE changed get notified and counted.
+            changed = set(
+                MarketplaceItem.objects.filter(pk__in=pks, status='expired', updated_at=now).values_list('pk', flat=True)
+            )
+            batch = [row for row in batch if row[0] in changed]
+            if notify and batch:
+                notifications = expiry_notifications(row[:3] for row in batch)
+                Notification.objects.bulk_create(notifications)
+                notified += len(notifications)
+        expired += len(batch)
+        batches += 1
+        cities.update(row[3] for row in batch)
+
+    # update() skips the signals that normally invalidate cached feed pages.
+    for city in cities:
+        bump_city_version(city)
+
+    elapsed = time.monotonic() - started
+    return {
+        'expired': expired,
+        'notified': notified,
+        'batches': batches,
+        'seconds': elapsed,
+        'per_second': expired / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from core.imaging import process_image
+
+
+def make_photo(path, width, height, seed):
+    # Noise over a gradient compresses roughly like a real photo; tag it with an orientation and a GPS block.
+    noise = Image.effect_noise((width, height), 40 + seed % 20).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    image = Image.blend(noise, gradient, 0.5)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 CW
+    exif[0x010F] = 'BenchCam'
+    exif[0x8825] = {1: 'N', 2: (43.0, 39.0, 0.0)}
+    image.save(path, 'JPEG', quality=90, exif=exif)
+
+
+class Command(BaseCommand):
+    help = "Benchmark derivative generation (core.imaging.process_image): images/sec serially and in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=24)
+        parser.add_argument('--width', type=int, default=4000)
+        parser.add_argument('--height', type=int, default=3000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        count, workers = options['images'], options['workers']
+        workdir = tempfile.mkdtemp(prefix='derivative-bench-')
+        try:
+            sources = []
+            for i in range(count):
+                path = os.path.join(workdir, f'photo{i}.jpg')
+                make_photo(path, options['width'], options['height'], i)
+                sources.append(path)
+            out_dir = os.path.join(workdir, 'out')
+            os.makedirs(out_dir)
+
+            started = time.perf_counter()
+            for path in sources:
+                result = process_image(path, out_dir)
+            serial = time.perf_counter() - started
+
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                # Warm the workers up so process start-up isn't billed to the first images.
+                for future in [pool.submit(os.getpid) for _ in range(workers)]:
+                    future.result()
+                started = time.perf_counter()
+                list(pool.map(process_image, sources, [out_dir] * count))
+                pooled = time.perf_counter() - started
+
+            with Image.open(result['original']['path']) as original:
+                assert not original.getexif(), "original still carries EXIF"
+                assert original.size == (options['height'], options['width']), "orientation was not applied"
+            written = sum(entry[key]['bytes'] for entry in result['derivatives'].values() for key in ('webp', 'jpeg'))
+
+            self.stdout.write(
+                f"{count} images at {options['width']}x{options['height']}, "
+                f"{len(result['derivatives'])} presets x 2 formats + original each "
+                f"({written / 1024:.0f} KiB of derivatives per image)"
+            )
+            self.stdout.write(f"  serial           : {serial:.2f}s ({count / serial:.2f} images/s on 1 core)")
+            self.stdout.write(
+                f"  pool, {workers} workers : {pooled:.2f}s ({count / pooled:.2f} images/s, "
+                f"{count / pooled / workers:.2f} images/s per core)"
+            )
+            self.stdout.write(self.style.SUCCESS(f"Per-core throughput: {count / serial:.2f} images/s"))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
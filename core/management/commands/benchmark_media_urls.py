@@ -0,0 +1,46 @@
+import time
+
+from cloudinary.utils import cloudinary_url
+from django.core.management.base import BaseCommand
+
+from core.media import MEDIA_PRESETS, media_srcset, media_url
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark: per-call cloudinary_url() (the old MarketplaceMediaSerializer path) "
+        "vs the memoized preset URL builder in core.media."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200_000)
+        parser.add_argument('--distinct', type=int, default=2_000, help="Distinct public ids cycled through.")
+
+    def handle(self, *args, **options):
+        calls, distinct = options['calls'], options['distinct']
+        public_ids = [f'marketplace/media/bench_{i}' for i in range(distinct)]
+
+        started = time.perf_counter()
+        for i in range(calls):
+            cloudinary_url(public_ids[i % distinct], width=400, height=400, crop="fill", quality="auto")
+        direct = time.perf_counter() - started
+
+        media_url.cache_clear()
+        started = time.perf_counter()
+        for i in range(calls):
+            media_url(public_ids[i % distinct], 'card')
+        memoized = time.perf_counter() - started
+
+        media_srcset.cache_clear()
+        started = time.perf_counter()
+        for i in range(calls):
+            media_srcset(public_ids[i % distinct], 'card')
+        srcset = time.perf_counter() - started
+
+        assert media_url(public_ids[0], 'card') == cloudinary_url(public_ids[0], **MEDIA_PRESETS['card'])[0]
+
+        self.stdout.write(f"{calls} calls over {distinct} public ids")
+        self.stdout.write(f"  cloudinary_url per call : {direct:.3f}s ({calls / direct:,.0f}/s)")
+        self.stdout.write(f"  memoized media_url      : {memoized:.3f}s ({calls / memoized:,.0f}/s)")
+        self.stdout.write(f"  memoized media_srcset   : {srcset:.3f}s ({calls / srcset:,.0f}/s)")
+        self.stdout.write(self.style.SUCCESS(f"Speedup (url): {direct / memoized:.1f}x"))
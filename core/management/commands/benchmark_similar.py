@@ -0,0 +1,68 @@
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.similar import SimilarityIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the similar-listings TF-IDF index (core.similar) on synthetic listings: "
+        "build time, query latency and incremental update cost. Runs entirely in memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=1_000)
+        parser.add_argument('--updates', type=int, default=2_000)
+        parser.add_argument('--vocabulary', type=int, default=8_000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = [f'w{i}' for i in range(options['vocabulary'])]
+        # Zipf-like word frequencies, like real listing text.
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+        categories = [f'cat{i}' for i in range(40)]
+
+        def listing(pk):
+            title = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(3, 8)))
+            description = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(10, 60)))
+            return pk, title, description, rng.choice(categories)
+
+        rows = [listing(pk) for pk in range(1, options['listings'] + 1)]
+
+        started = time.perf_counter()
+        index = SimilarityIndex.build(rows)
+        build = time.perf_counter() - started
+
+        def measure(samples):
+            latencies = []
+            for pk, title, description, category in samples:
+                started = time.perf_counter()
+                columns, values = index.vectorize(title, description, category)
+                index.query(columns, values, k=10, exclude=pk)
+                latencies.append((time.perf_counter() - started) * 1000)
+            latencies.sort()
+            return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)], latencies[-1]
+
+        queries = rng.sample(rows, min(options['queries'], len(rows)))
+        p50, p95, worst = measure(queries)
+
+        started = time.perf_counter()
+        for pk in rng.sample(range(1, len(rows) + 1), options['updates']):
+            index.upsert(*listing(pk))
+        update = (time.perf_counter() - started) / options['updates'] * 1000
+        b50, b95, _ = measure(queries)
+
+        self.stdout.write(
+            f"{len(rows):,} listings, {index.matrix.nnz:,} non-zeros "
+            f"({(index.matrix.data.nbytes + index.matrix.indices.nbytes) / 1e6:.0f} MB)"
+        )
+        self.stdout.write(f"  build            : {build:.2f}s ({len(rows) / build:,.0f} listings/s)")
+        self.stdout.write(f"  query (top 10)   : p50 {p50:.2f} ms, p95 {p95:.2f} ms, max {worst:.2f} ms")
+        self.stdout.write(f"  upsert           : {update:.3f} ms each ({options['updates']:,} buffered)")
+        self.stdout.write(f"  query w/ buffer  : p50 {b50:.2f} ms, p95 {b95:.2f} ms")
+        self.stdout.write(self.style.SUCCESS("Done."))
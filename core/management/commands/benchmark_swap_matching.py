@@ -0,0 +1,76 @@
+import itertools
+import random
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from core.matching import MAX_CYCLE_LENGTH, WantGraph
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark multi-way swap cycle detection (core.matching) on a synthetic city: full search over "
+        "the want graph and the incremental per-offer search. Runs entirely in memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100_000)
+        parser.add_argument('--listings-per-user', type=int, default=4)
+        parser.add_argument('--offers-per-user', type=int, default=3)
+        parser.add_argument('--incremental', type=int, default=5_000, help="Offers added one at a time afterwards.")
+        parser.add_argument('--budget', type=float, default=10.0, help="Seconds allowed for the full search.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        users = max(2, options['listings'] // options['listings_per_user'])
+        owner_of = [item % users for item in range(options['listings'])]
+        # Popular listings attract most offers, as in a real marketplace.
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) ** 0.8 for rank in range(options['listings'])))
+        listings = range(options['listings'])
+
+        def offer(wanter):
+            item = rng.choices(listings, cum_weights=cum_weights)[0]
+            return wanter, owner_of[item], item
+
+        wants = [
+            offer(wanter) for wanter in range(users) for _ in range(options['offers_per_user'])
+        ]
+        wants = [(wanter, owner, item) for wanter, owner, item in wants if wanter != owner]
+
+        started = time.perf_counter()
+        graph = WantGraph.from_wants(wants)
+        load = time.perf_counter() - started
+
+        started = time.perf_counter()
+        lengths = Counter(len(cycle) for cycle in graph.cycles(MAX_CYCLE_LENGTH))
+        search = time.perf_counter() - started
+
+        latencies = []
+        for _ in range(options['incremental']):
+            wanter, owner, item = offer(rng.randrange(users))
+            if wanter == owner:
+                continue
+            started = time.perf_counter()
+            graph.add(wanter, owner, item)
+            graph.cycles_through(wanter, owner)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+
+        edges = sum(len(owners) for owners in graph.wants.values())
+        self.stdout.write(f"{options['listings']:,} listings, {users:,} users, {edges:,} want edges")
+        self.stdout.write(f"  graph load       : {load:.2f}s")
+        self.stdout.write(
+            f"  full search      : {search:.2f}s, rings by length "
+            + ', '.join(f"{length}: {lengths[length]:,}" for length in range(2, MAX_CYCLE_LENGTH + 1))
+        )
+        if latencies:
+            self.stdout.write(
+                f"  incremental      : p50 {latencies[len(latencies) // 2]:.3f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95)]:.3f} ms, max {latencies[-1]:.3f} ms per offer"
+            )
+        if search <= options['budget']:
+            self.stdout.write(self.style.SUCCESS(f"Full search within the {options['budget']:.1f}s budget."))
+        else:
+            self.stdout.write(self.style.ERROR(f"Full search over the {options['budget']:.1f}s budget."))
@@ -0,0 +1,81 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Post, TrendingRank, User
+from core.ranking import TRENDING_WINDOW, recompute_trending
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a full trending recompute against synthetic data (default: 1M posts, 10M reactions). "
+        "The job reads the per-post counters kept by the reaction/comment write path, so reactions "
+        "are synthesized as those counters rather than as Reaction rows. Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--reactions', type=int, default=10_000_000)
+        parser.add_argument('--cities', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        posts, reactions = options['posts'], options['reactions']
+        cities = [f'bench-city-{i}' for i in range(options['cities'])]
+        now = timezone.now()
+        # Spread posts over twice the window so roughly half of them are out of range, as in a live table.
+        span = int(TRENDING_WINDOW.total_seconds() * 2)
+
+        started = time.monotonic()
+        author = User.objects.create(username=f'trending-bench-{rng.random()}')
+        # Reactions follow a heavy-tailed distribution across posts.
+        weights = [rng.paretovariate(1.2) for _ in range(posts)]
+        scale = reactions / sum(weights)
+        batch = []
+        for i in range(posts):
+            hot = int(weights[i] * scale)
+            batch.append(Post(
+                user=author, title='bench', content='', post_type='discussion',
+                city=cities[i % len(cities)], hot_score=hot, comment_count=hot // 5,
+            ))
+            if len(batch) == 10_000:
+                Post.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Post.objects.bulk_create(batch)
+        # auto_now_add ignores explicit values, so age the posts afterwards in small primary-key ranges.
+        pks = Post.objects.filter(user=author).order_by('pk').values_list('pk', flat=True)
+        first, last = pks.first(), pks.last()
+        for low in range(first, last + 1, 1000):
+            Post.objects.filter(user=author, pk__gte=low, pk__lt=low + 1000).update(
+                created_at=now - timedelta(seconds=rng.randrange(span)),
+            )
+        self.stdout.write(f"Generated {posts} posts / ~{reactions} reactions in {time.monotonic() - started:.1f}s")
+
+        started = time.monotonic()
+        results = recompute_trending(cities=cities, batch_size=options['batch_size'], now=now)
+        elapsed = time.monotonic() - started
+
+        ranked = sum(results.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Recompute: {ranked} posts ranked across {len(cities)} cities in {elapsed:.2f}s "
+            f"({ranked / elapsed if elapsed else 0:,.0f} posts/s); rank table rows: {TrendingRank.objects.count()}"
+        ))
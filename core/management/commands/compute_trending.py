@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import normalize_city
+from core.ranking import recompute_trending
+
+
+class Command(BaseCommand):
+    help = "Recompute the TrendingRank table used by sort=trending. Schedule this every few minutes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', action='append', dest='cities', help="Only recompute this city (repeatable).")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cities = [normalize_city(city) for city in options['cities']] if options['cities'] else None
+
+        started = time.monotonic()
+        results = recompute_trending(cities=cities, batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+
+        for city, ranked in results.items():
+            self.stdout.write(f"{city}: {ranked} posts ranked")
+        self.stdout.write(self.style.SUCCESS(f"Recomputed trending for {len(results)} cities in {elapsed:.2f}s."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from core.lifecycle import expire_listings, overdue_listings
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark available marketplace listings past their expiry_date as expired and notify their sellers. "
+        "Schedule this daily (or more often)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--date', help="Treat this day (YYYY-MM-DD) as today.")
+        parser.add_argument('--no-notify', action='store_true', help="Skip seller notifications.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the overdue listings.")
+
+    def handle(self, *args, **options):
+        today = parse_date(options['date']) if options['date'] else None
+        if options['dry_run']:
+            self.stdout.write(f"{overdue_listings(today).count()} listings would expire.")
+            return
+
+        stats = expire_listings(today=today, batch_size=options['batch_size'], notify=not options['no_notify'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {stats['expired']} listings in {stats['batches']} batches, "
+            f"{stats['notified']} seller notifications, {stats['seconds']:.2f}s "
+            f"({stats['per_second']:,.0f} listings/s)."
+        ))
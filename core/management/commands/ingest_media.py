@@ -0,0 +1,53 @@
+import os
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.ingest import ingest_media
+from core.models import MarketplaceMedia
+
+
+class Command(BaseCommand):
+    help = (
+        "Push staged marketplace media to storage. Picks up uploads whose background "
+        "worker never finished (e.g. after a restart) and, with --retry-failed, failed ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help="Also retry media marked failed.")
+        parser.add_argument(
+            '--stale-after', type=int, default=10,
+            help="Minutes a 'processing' row must be untouched before it is considered abandoned.",
+        )
+
+    def handle(self, *args, **options):
+        media = MarketplaceMedia.objects.exclude(staged_file='')
+        statuses = Q(status=MarketplaceMedia.PROCESSING)
+        if options['retry_failed']:
+            statuses |= Q(status=MarketplaceMedia.FAILED)
+        media = media.filter(statuses)
+
+        # Stage files are named when the upload lands, so their mtime says how long they've waited.
+        cutoff = time.time() - timedelta(minutes=options['stale_after']).total_seconds()
+        pending = [
+            (pk, status) for pk, status, path in media.values_list('pk', 'status', 'staged_file')
+            if status == MarketplaceMedia.FAILED or self.staged_before(path, cutoff)
+        ]
+
+        ready = failed = 0
+        for pk, status in pending:
+            if status == MarketplaceMedia.FAILED:
+                MarketplaceMedia.objects.filter(pk=pk).update(status=MarketplaceMedia.PROCESSING)
+            if ingest_media(pk):
+                ready += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Ingested {ready} media ({failed} failed)."))
+
+    def staged_before(self, path, cutoff):
+        try:
+            return os.path.getmtime(path) < cutoff
+        except OSError:
+            return True
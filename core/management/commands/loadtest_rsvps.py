@@ -0,0 +1,128 @@
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from core.models import Event, EventWaitlistEntry, User
+from core.rsvps import ATTENDING, WAITLISTED, join_event, leave_event
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test RSVP capacity enforcement (core.rsvps): a flash crowd of simultaneous RSVPs on one capped "
+        "event, then concurrent cancellations. Checks that the event is never oversold and the waitlist "
+        "stays in order. Creates its own users and event in the configured database and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5_000)
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--limit', type=int, default=500, help="The event's rsvp_limit.")
+        parser.add_argument('--cancels', type=int, default=100, help="Attendees who cancel concurrently afterwards.")
+        parser.add_argument('--keep', action='store_true', help="Keep the test users and event.")
+
+    def handle(self, *args, **options):
+        if options['limit'] < 1 or options['users'] <= options['limit']:
+            raise CommandError("--users must exceed --limit, so the event fills up.")
+        prefix = f'rsvp-load-{secrets.token_hex(4)}'
+        host = User.objects.create_user(f'{prefix}-host', password=None)
+        event = Event.objects.create(
+            host=host, title='RSVP load test', description='...', location='-', city=host.city,
+            datetime=timezone.now() + timedelta(days=30), rsvp_limit=options['limit'], waitlist_enabled=True,
+        )
+        try:
+            User.objects.bulk_create(
+                [User(username=f'{prefix}-{i}', password='!') for i in range(options['users'])], batch_size=1000,
+            )
+            users = list(User.objects.filter(username__startswith=f'{prefix}-').exclude(pk=host.pk).order_by('pk'))
+
+            joined, join_stats = self.run_concurrently(join_event, event, users, options['threads'])
+            attending = [pk for pk, (status, _) in joined.items() if status == ATTENDING]
+            self.report('join', join_stats, options['threads'])
+            self.verify(event, options['limit'], len(users), expect_joined=Counter(
+                status for status, _ in joined.values()
+            ))
+
+            cancelling = set(attending[:options['cancels']])
+            leavers = [user for user in users if user.pk in cancelling]
+            if leavers:
+                queue = list(EventWaitlistEntry.objects.filter(event=event).order_by('pk')
+                             .values_list('user_id', flat=True)[:len(leavers)])
+                _, leave_stats = self.run_concurrently(leave_event, event, leavers, options['threads'])
+                self.report('cancel', leave_stats, options['threads'])
+                promoted = set(event.rsvps.filter(pk__in=queue).values_list('pk', flat=True))
+                if promoted != set(queue):
+                    raise CommandError(f"Cancellations promoted {len(promoted)} of the first {len(queue)} waitlisted.")
+                self.verify(event, options['limit'], len(users) - len(leavers))
+        finally:
+            if not options['keep']:
+                event.delete()
+                User.objects.filter(username__startswith=f'{prefix}-').delete()
+        self.stdout.write(self.style.SUCCESS("Never oversold; waitlist promoted first come, first served."))
+
+    def run_concurrently(self, func, event, users, threads):
+        barrier = threading.Barrier(threads)
+        results, latencies, retries = {}, [], Counter()
+
+        def worker(chunk):
+            barrier.wait()
+            try:
+                for user in chunk:
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            results[user.pk] = func(event, user)
+                            break
+                        except OperationalError:
+                            # SQLite gives up on a busy write lock after its timeout instead of queueing.
+                            if connection.vendor != 'sqlite':
+                                raise
+                            retries['locked'] += 1
+                            time.sleep(0.001)
+                    latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(users[i::threads],)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return results, {
+            'calls': len(latencies),
+            'seconds': elapsed,
+            'p50': latencies[len(latencies) // 2],
+            'p95': latencies[int(len(latencies) * 0.95)],
+            'retries': retries['locked'],
+        }
+
+    def report(self, phase, stats, threads):
+        self.stdout.write(
+            f"  {phase:<7}: {stats['calls']:,} calls on {threads} threads in {stats['seconds']:.2f}s "
+            f"({stats['calls'] / stats['seconds']:,.0f}/s), p50 {stats['p50']:.1f} ms, p95 {stats['p95']:.1f} ms, "
+            f"{stats['retries']} lock retries"
+        )
+
+    def verify(self, event, limit, involved, expect_joined=None):
+        event.refresh_from_db()
+        seats = event.rsvps.count()
+        queued = list(EventWaitlistEntry.objects.filter(event=event).order_by('pk').values_list('pk', flat=True))
+        self.stdout.write(
+            f"  state  : {seats} attending (limit {limit}, counter {event.rsvp_count}), {len(queued)} waitlisted"
+        )
+        if seats > limit:
+            raise CommandError(f"Oversold: {seats} attendees for {limit} seats.")
+        if event.rsvp_count != seats:
+            raise CommandError(f"rsvp_count is {event.rsvp_count} but {seats} attendees are stored.")
+        if seats != limit or seats + len(queued) != involved:
+            raise CommandError(f"Expected {limit} attending and {involved - limit} waitlisted.")
+        if expect_joined is not None and (expect_joined[ATTENDING], expect_joined[WAITLISTED]) != (limit, involved - limit):
+            raise CommandError(f"Unexpected join results: {dict(expect_joined)}")
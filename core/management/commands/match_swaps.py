@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.matching import MAX_CYCLE_LENGTH, cities_with_open_offers, rebuild_city
+from core.models import normalize_city
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the multi-way swap suggestions (core.matching) from scratch. Offers and listings keep them "
+        "current incrementally; schedule this nightly to sweep out rings broken by bulk updates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', action='append', dest='cities', help="Only rebuild this city (repeatable).")
+        parser.add_argument('--max-length', type=int, default=MAX_CYCLE_LENGTH, choices=range(2, MAX_CYCLE_LENGTH + 1))
+
+    def handle(self, *args, **options):
+        cities = [normalize_city(city) for city in options['cities']] if options['cities'] else cities_with_open_offers()
+
+        started = time.monotonic()
+        total = 0
+        for city in cities:
+            stats = rebuild_city(city, max_length=options['max_length'])
+            total += stats['cycles']
+            self.stdout.write(f"{city}: {stats['cycles']} swap rings among {stats['users']} users")
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Stored {total} swap suggestions in {elapsed:.2f}s."))
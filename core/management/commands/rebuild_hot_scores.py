@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Case, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from core.models import Post, Reaction, REACTION_WEIGHTS, normalize_city
+
+
+def hot_score_subquery():
+    weights = Case(
+        *[When(emoji=emoji, then=Value(weight)) for emoji, weight in REACTION_WEIGHTS.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    totals = (
+        Reaction.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Sum(weights))
+        .values('total')
+    )
+    return Coalesce(Subquery(totals, output_field=IntegerField()), Value(0))
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.hot_score from the reactions table (it is normally maintained by the Reaction signals)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', help="Only rebuild posts in this city.")
+
+    def handle(self, *args, **options):
+        qs = Post.objects.all()
+        if options['city']:
+            qs = qs.filter(city_key=normalize_city(options['city']))
+
+        updated = qs.update(hot_score=hot_score_subquery())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt hot_score for {updated} posts."))
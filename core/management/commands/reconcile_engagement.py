@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Post, PostEngagement, normalize_city
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild PostEngagement rollups (and Post.comment_count) from comments and reactions. "
+        "Run periodically to correct any drift in the incrementally maintained counters."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--city', help="Only reconcile posts in this city.")
+
+    def handle(self, *args, **options):
+        qs = Post.objects.order_by('pk')
+        if options['city']:
+            qs = qs.filter(city_key=normalize_city(options['city']))
+
+        started = time.monotonic()
+        total = 0
+        last_pk = 0
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            total += PostEngagement.rebuild(batch)
+            last_pk = batch[-1]
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {total} posts in {elapsed:.2f}s."))
@@ -0,0 +1,255 @@
+import logging
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Q
+
+from .models import MarketplaceItem, MarketplaceMedia, SwapCycle, SwapCycleLeg, SwappOffer
+from .swaps import OPEN_STATUSES
+
+logger = logging.getLogger(__name__)
+
+MIN_CYCLE_LENGTH = 2
+MAX_CYCLE_LENGTH = 4
+SAVE_BATCH_SIZE = 1000
+
+
+def open_wants(**filters):
+    """
+    (wanter, owner, item) for every open offer on another user's available
+    listing: the want edges of the swap graph. `filters` narrow the offers.
+    """
+    return (
+        SwappOffer.objects.filter(status__in=OPEN_STATUSES, item__status='available', **filters)
+        .exclude(offered_by_id=F('recipient_id'))
+        .values_list('offered_by_id', 'recipient_id', 'item_id')
+    )
+
+
+def cycle_key(cycle):
+    return '>'.join(map(str, cycle))
+
+
+def canonical(cycle):
+    """Rotate a ring of user ids to start at its smallest id, so each ring has one key."""
+    start = cycle.index(min(cycle))
+    return tuple(cycle[start:] + cycle[:start])
+
+
+class WantGraph:
+    """
+    Directed user graph: an edge wanter -> owner means `wanter` has an open
+    offer on one of `owner`'s listings. A simple cycle u1 -> u2 -> ... -> u1
+    is a swap in which every user receives a listing they asked for and
+    gives away one of their own.
+    """
+
+    def __init__(self):
+        self.wants = defaultdict(dict)  # wanter -> {owner: item}
+
+    @classmethod
+    def from_wants(cls, wants):
+        graph = cls()
+        for wanter, owner, item in wants:
+            graph.add(wanter, owner, item)
+        return graph
+
+    def add(self, wanter, owner, item):
+        # Several wanted listings from the same owner are interchangeable here; keep the first.
+        self.wants[wanter].setdefault(owner, item)
+
+    def cycles(self, max_length=MAX_CYCLE_LENGTH):
+        """
+        Yield every simple cycle of MIN_CYCLE_LENGTH..max_length users exactly
+        once, starting at its smallest user: from each start the search only
+        visits larger user ids, so no rotation is found twice.
+        """
+        wants = self.wants
+        wanted_by = defaultdict(set)
+        for wanter, owners in wants.items():
+            for owner in owners:
+                wanted_by[owner].add(wanter)
+
+        def extend(path, start, closers):
+            # On the last hop only users who want something from `start` can close the ring,
+            # so test membership instead of expanding one more level.
+            last_hop = len(path) == max_length - 1
+            for owner in wants.get(path[-1], ()):
+                if owner == start:
+                    if len(path) >= MIN_CYCLE_LENGTH:
+                        yield tuple(path)
+                elif owner > start and owner not in path:
+                    if last_hop:
+                        if owner in closers:
+                            yield (*path, owner)
+                    else:
+                        path.append(owner)
+                        yield from extend(path, start, closers)
+                        path.pop()
+
+        for start in sorted(wants):
+            if wanted_by[start]:
+                yield from extend([start], start, wanted_by[start])
+
+    def cycles_through(self, wanter, owner, max_length=MAX_CYCLE_LENGTH):
+        """Canonical cycles that use the edge wanter -> owner: paths from owner back to wanter."""
+        if owner not in self.wants.get(wanter, ()):
+            return []
+        found = []
+
+        def extend(path):
+            for nxt in self.wants.get(path[-1], ()):
+                if nxt == wanter:
+                    found.append(canonical(path))
+                elif len(path) < max_length and nxt not in path:
+                    path.append(nxt)
+                    extend(path)
+                    path.pop()
+
+        extend([wanter, owner])
+        return found
+
+    def legs(self, cycle):
+        """(giver, receiver, item) for each hand-over in `cycle`."""
+        return [
+            (cycle[(i + 1) % len(cycle)], receiver, self.wants[receiver][cycle[(i + 1) % len(cycle)]])
+            for i, receiver in enumerate(cycle)
+        ]
+
+
+def save_cycles(graph, cycles, city_key):
+    """Store the cycles not already suggested. Returns how many were created."""
+    created = 0
+    cycles = list(cycles)
+    for start in range(0, len(cycles), SAVE_BATCH_SIZE):
+        batch = {cycle_key(cycle): cycle for cycle in cycles[start:start + SAVE_BATCH_SIZE]}
+        existing = set(SwapCycle.objects.filter(key__in=list(batch)).values_list('key', flat=True))
+        new = [
+            SwapCycle(key=key, city=city_key, length=len(cycle))
+            for key, cycle in batch.items() if key not in existing
+        ]
+        if not new:
+            continue
+        try:
+            with transaction.atomic():
+                SwapCycle.objects.bulk_create(new)
+                SwapCycleLeg.objects.bulk_create([
+                    SwapCycleLeg(cycle=row, position=position, giver_id=giver, receiver_id=receiver, item_id=item)
+                    for row in new
+                    for position, (giver, receiver, item) in enumerate(graph.legs(batch[row.key]))
+                ])
+        except IntegrityError:
+            # A concurrent search stored one of these rings first; the next rebuild picks up the rest.
+            continue
+        created += len(new)
+    return created
+
+
+def rebuild_city(city_key, max_length=MAX_CYCLE_LENGTH):
+    """Replace the city's suggestions with every cycle in its current want graph."""
+    graph = WantGraph.from_wants(open_wants(item__city_key=city_key).iterator(chunk_size=5000))
+    cycles = list(graph.cycles(max_length))
+    with transaction.atomic():
+        SwapCycle.objects.filter(city=city_key).delete()
+        created = save_cycles(graph, cycles, city_key)
+    return {'users': len(graph.wants), 'cycles': created}
+
+
+def neighbourhood(owner, city_key, max_length=MAX_CYCLE_LENGTH):
+    """The want graph within max_length - 1 hops of `owner`, loaded one query per hop."""
+    graph = WantGraph()
+    frontier, expanded = {owner}, set()
+    for _ in range(max_length - 1):
+        expanded |= frontier
+        frontier_wants = list(open_wants(offered_by_id__in=frontier, item__city_key=city_key))
+        for wanter, next_owner, item in frontier_wants:
+            graph.add(wanter, next_owner, item)
+        frontier = {next_owner for _, next_owner, _ in frontier_wants} - expanded
+        if not frontier:
+            break
+    return graph
+
+
+def match_offer(offer):
+    """
+    Incremental step for a new or still-open offer: find and store the cycles
+    through its want edge by walking the owner's neighbourhood, without
+    loading the rest of the city.
+    """
+    item = offer.item
+    if offer.offered_by_id == item.seller_id or item.status != 'available':
+        return 0
+    graph = neighbourhood(item.seller_id, item.city_key)
+    graph.wants[offer.offered_by_id][item.seller_id] = item.pk
+    cycles = graph.cycles_through(offer.offered_by_id, item.seller_id)
+    return save_cycles(graph, cycles, item.city_key)
+
+
+def discard_cycles(items=(), wants=()):
+    """
+    Drop the suggestions that hand over any of `items`, or that rely on one of
+    the (receiver, item) `wants` that is no longer open.
+    """
+    condition = Q(item_id__in=list(items)) if items else Q()
+    for receiver, item in wants:
+        condition |= Q(item_id=item, receiver_id=receiver)
+    if not condition:
+        return 0
+    cycle_ids = SwapCycleLeg.objects.filter(condition).values('cycle_id')
+    return SwapCycle.objects.filter(pk__in=cycle_ids).delete()[1].get(SwapCycle._meta.label, 0)
+
+
+def cycle_summaries(cycles):
+    """`cycles` with everything SwapCycleSerializer reads, in a fixed number of queries."""
+    ready_media = MarketplaceMedia.objects.filter(status=MarketplaceMedia.READY).order_by('pk')
+    return cycles.prefetch_related(
+        Prefetch('legs', queryset=SwapCycleLeg.objects.select_related('giver', 'receiver', 'item')),
+        Prefetch('legs__item__media', queryset=ready_media),
+    )
+
+
+def live_cycles(user):
+    """
+    The user's suggestions whose legs all still hold: the listing is available
+    and the receiver's offer on it is still open. Anything else changed behind
+    the last incremental update (e.g. bulk expiry) is filtered out here.
+    """
+    stale_legs = SwapCycleLeg.objects.filter(cycle=OuterRef('pk')).filter(
+        ~Q(item__status='available') | ~Exists(
+            SwappOffer.objects.filter(
+                item_id=OuterRef('item_id'), offered_by_id=OuterRef('receiver_id'), status__in=OPEN_STATUSES,
+            )
+        )
+    )
+    return (
+        SwapCycle.objects.filter(legs__giver=user).filter(~Exists(stale_legs))
+        .order_by('length', '-created_at')
+    )
+
+
+def cities_with_open_offers():
+    return (
+        MarketplaceItem.objects.filter(status='available', offers_received__status__in=OPEN_STATUSES)
+        .order_by().values_list('city_key', flat=True).distinct()
+    )
+
+
+def _run_safely(func, *args, **kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        # Suggestions are best-effort; the periodic rebuild repairs anything missed here.
+        logger.exception("Swap matching update failed")
+
+
+def offer_changed(offer):
+    """Keep suggestions current after `offer` is saved (runs once the transaction commits)."""
+    if offer.status in OPEN_STATUSES:
+        transaction.on_commit(lambda: _run_safely(match_offer, offer))
+    else:
+        transaction.on_commit(lambda: _run_safely(discard_cycles, wants=[(offer.offered_by_id, offer.item_id)]))
+
+
+def listing_changed(item):
+    if item.status != 'available':
+        transaction.on_commit(lambda: _run_safely(discard_cycles, items=[item.pk]))
@@ -0,0 +1,57 @@
+from functools import lru_cache
+
+from cloudinary.utils import cloudinary_url
+
+# Named Cloudinary transformations for marketplace media. 'card' is what the feed has always served.
+MEDIA_PRESETS = {
+    'thumb': {'width': 200, 'height': 200, 'crop': 'fill', 'quality': 'auto'},
+    'card': {'width': 400, 'height': 400, 'crop': 'fill', 'quality': 'auto'},
+    'full': {'width': 1600, 'crop': 'limit', 'quality': 'auto'},
+}
+DEFAULT_MEDIA_PRESET = 'card'
+# Formats of the locally rendered derivatives (see core.imaging), picked with ?media_format=.
+MEDIA_FORMATS = ('webp', 'jpeg')
+DEFAULT_MEDIA_FORMAT = 'webp'
+SRCSET_WIDTHS = (200, 400, 800, 1200)
+MEDIA_URL_CACHE_SIZE = 16384
+
+
+@lru_cache(maxsize=MEDIA_URL_CACHE_SIZE)
+def media_url(public_id, preset=DEFAULT_MEDIA_PRESET, width=None):
+    """
+    Cloudinary delivery URL for `public_id` with a named preset, optionally
+    overriding its width (height scales to keep the preset's aspect ratio).
+    URL signing is pure CPU work, so results are memoized per process.
+    """
+    options = dict(MEDIA_PRESETS[preset])
+    if width is not None:
+        if 'height' in options:
+            options['height'] = round(options['height'] * width / options['width'])
+        options['width'] = width
+    url, _ = cloudinary_url(public_id, **options)
+    return url
+
+
+@lru_cache(maxsize=MEDIA_URL_CACHE_SIZE)
+def media_srcset(public_id, preset=DEFAULT_MEDIA_PRESET):
+    return ', '.join(f'{media_url(public_id, preset, width)} {width}w' for width in SRCSET_WIDTHS)
+
+
+def resolve_preset(request):
+    preset = request.query_params.get('media_preset') if request is not None else None
+    return preset if preset in MEDIA_PRESETS else DEFAULT_MEDIA_PRESET
+
+
+def resolve_format(request):
+    fmt = request.query_params.get('media_format') if request is not None else None
+    return fmt if fmt in MEDIA_FORMATS else DEFAULT_MEDIA_FORMAT
+
+
+def derivative_srcset(derivatives, preset=DEFAULT_MEDIA_PRESET, fmt=DEFAULT_MEDIA_FORMAT):
+    """srcset over the stored derivatives that share `preset`'s crop, so every candidate has the same shape."""
+    crop = MEDIA_PRESETS[preset]['crop']
+    candidates = sorted(
+        (entry['width'], entry[fmt]['url']) for name, entry in derivatives.items()
+        if name in MEDIA_PRESETS and MEDIA_PRESETS[name]['crop'] == crop
+    )
+    return ', '.join(f'{url} {width}w' for width, url in candidates)
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:25
+
+from django.db import migrations, models
+from django.db.models import Case, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+# Frozen copy of core.models.REACTION_WEIGHTS at the time of this migration.
+REACTION_WEIGHTS = {'👍': 1, '❤️': 2, '😂': 1, '👎': -1}
+
+
+def backfill_hot_score(apps, schema_editor):
+    Post = apps.get_model('core', 'Post')
+    Reaction = apps.get_model('core', 'Reaction')
+    weights = Case(
+        *[When(emoji=emoji, then=Value(weight)) for emoji, weight in REACTION_WEIGHTS.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    totals = (
+        Reaction.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Sum(weights))
+        .values('total')
+    )
+    Post.objects.update(hot_score=Coalesce(Subquery(totals, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_feedback_email'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='group',
+            options={'ordering': ['created_by']},
+        ),
+        migrations.AlterModelOptions(
+            name='groupchat',
+            options={'ordering': ['created_at']},
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-created_at'], name='post_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['city', '-hot_score', '-created_at'], name='post_city_hot_idx'),
+        ),
+        migrations.RunPython(backfill_hot_score, migrations.RunPython.noop),
+    ]
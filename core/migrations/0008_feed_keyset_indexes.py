@@ -0,0 +1,37 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_post_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['datetime', 'id'], name='event_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['city', 'datetime', 'id'], name='event_city_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', '-id'], name='market_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city', '-id'], name='market_status_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['city', '-created_at', '-id'], name='post_city_created_idx'),
+        ),
+    ]
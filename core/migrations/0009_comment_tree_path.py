@@ -0,0 +1,54 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    Comment = apps.get_model('core', 'Comment')
+    parents = dict(Comment.objects.values_list('id', 'parent_id'))
+    resolved = {}
+
+    def resolve(comment_id):
+        if comment_id not in resolved:
+            segment = str(comment_id).zfill(10)
+            parent_id = parents[comment_id]
+            if parent_id is None:
+                resolved[comment_id] = (segment, 0)
+            else:
+                parent_path, parent_depth = resolve(parent_id)
+                resolved[comment_id] = (f'{parent_path}/{segment}', parent_depth + 1)
+        return resolved[comment_id]
+
+    comments = list(Comment.objects.only('id', 'path', 'depth'))
+    for comment in comments:
+        comment.path, comment.depth = resolve(comment.id)
+    Comment.objects.bulk_update(comments, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_feed_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent', '-created_at'], name='comment_post_parent_idx'),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:31
+
+import random
+
+import core.models
+from django.db import migrations, models
+
+
+def randomize_existing_keys(apps, schema_editor):
+    # AddField evaluates the callable default once, so every existing row got the same key.
+    Post = apps.get_model('core', 'Post')
+    posts = list(Post.objects.only('id'))
+    for post in posts:
+        post.random_key = random.random()
+    Post.objects.bulk_update(posts, ['random_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_comment_tree_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='random_key',
+            field=models.FloatField(default=core.models.random_sort_key, editable=False),
+        ),
+        migrations.RunPython(randomize_existing_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['random_key', 'id'], name='post_random_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['city', 'random_key', 'id'], name='post_city_random_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_engagement(apps, schema_editor):
+    Post = apps.get_model('core', 'Post')
+    Comment = apps.get_model('core', 'Comment')
+    Reaction = apps.get_model('core', 'Reaction')
+    PostEngagement = apps.get_model('core', 'PostEngagement')
+
+    rollups = {post_id: PostEngagement(post_id=post_id) for post_id in Post.objects.values_list('pk', flat=True)}
+    participants = {post_id: set() for post_id in rollups}
+    for model, count_field in ((Comment, 'comment_count'), (Reaction, 'reaction_count')):
+        totals = model.objects.values('post_id').annotate(total=Count('id'), last=Max('created_at')).order_by()
+        for row in totals:
+            rollup = rollups[row['post_id']]
+            setattr(rollup, count_field, row['total'])
+            if rollup.last_activity_at is None or row['last'] > rollup.last_activity_at:
+                rollup.last_activity_at = row['last']
+        for post_id, user_id in model.objects.values_list('post_id', 'user_id').distinct():
+            participants[post_id].add(user_id)
+
+    for post_id, rollup in rollups.items():
+        rollup.participant_count = len(participants[post_id])
+        rollup.score = rollup.comment_count + rollup.reaction_count
+    PostEngagement.objects.bulk_create(rollups.values(), batch_size=1000)
+    Post.objects.bulk_update(
+        [Post(pk=post_id, comment_count=rollup.comment_count) for post_id, rollup in rollups.items()],
+        ['comment_count'], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_post_random_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostEngagement',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='engagement', serialize=False, to='core.post')),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('reaction_count', models.PositiveIntegerField(default=0)),
+                ('participant_count', models.PositiveIntegerField(default=0)),
+                ('score', models.IntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score', '-last_activity_at'], name='engagement_score_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_engagement, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_post_engagement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingRank',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='core.post')),
+                ('city', models.CharField(max_length=50)),
+                ('score', models.FloatField(default=0)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['city', '-score'], name='trending_city_score_idx'), models.Index(fields=['-score'], name='trending_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_trending_rank'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city', 'price'], name='market_city_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city', 'category', 'price'], name='market_city_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city', 'condition', 'delivery_options'], name='market_city_condition_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city', 'expiry_date'], name='market_city_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:44
+
+import core.models
+from django.db import migrations, models
+from django.utils.text import slugify
+
+CITY_SCOPED_MODELS = ['User', 'Group', 'Post', 'Event', 'MarketplaceItem']
+
+
+def backfill_city_keys(apps, schema_editor):
+    for model_name in CITY_SCOPED_MODELS:
+        Model = apps.get_model('core', model_name)
+        # One UPDATE per distinct spelling rather than one per row.
+        for city in Model.objects.order_by().values_list('city', flat=True).distinct():
+            Model.objects.filter(city=city).update(city_key=slugify(city or ''))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0013_marketplace_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_city_datetime_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='marketplaceitem',
+            name='market_status_city_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='marketplaceitem',
+            name='market_city_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='marketplaceitem',
+            name='market_city_category_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='marketplaceitem',
+            name='market_city_condition_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='marketplaceitem',
+            name='market_city_expiry_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_city_hot_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_city_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_city_random_idx',
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='city_key',
+            field=core.models.CityKeyField(db_index=False, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='city_key',
+            field=core.models.CityKeyField(db_index=False, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='marketplaceitem',
+            name='city_key',
+            field=core.models.CityKeyField(db_index=False, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='city_key',
+            field=core.models.CityKeyField(db_index=False, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='city_key',
+            field=core.models.CityKeyField(db_index=False, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_city_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['city_key', 'datetime', 'id'], name='event_city_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['city_key', 'is_public'], name='group_city_public_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city_key', '-id'], name='market_status_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city_key', 'price'], name='market_city_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city_key', 'category', 'price'], name='market_city_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city_key', 'condition', 'delivery_options'], name='market_city_condition_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'city_key', 'expiry_date'], name='market_city_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['city_key', '-hot_score', '-created_at'], name='post_city_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['city_key', '-created_at', '-id'], name='post_city_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['city_key', 'random_key', 'id'], name='post_city_random_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['city_key', '-xp'], name='user_city_xp_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:46
+
+import cloudinary.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_city_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketplacemedia',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='marketplacemedia',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='marketplacemedia',
+            name='staged_file',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='marketplacemedia',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='marketplacemedia',
+            name='file',
+            field=cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='file'),
+        ),
+        migrations.AddIndex(
+            model_name='marketplacemedia',
+            index=models.Index(fields=['status'], name='media_status_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_marketplace_media_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
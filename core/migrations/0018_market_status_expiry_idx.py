@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_views_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['status', 'expiry_date'], name='market_status_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_market_status_expiry_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketplaceitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='marketplaceitem',
+            index=models.Index(fields=['city_key', 'updated_at'], name='market_city_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.5 on 2026-10-17 03:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_recipients(apps, schema_editor):
+    MarketplaceItem = apps.get_model('core', 'MarketplaceItem')
+    SwappOffer = apps.get_model('core', 'SwappOffer')
+    seller = MarketplaceItem.objects.filter(pk=models.OuterRef('item_id')).values('seller_id')[:1]
+    SwappOffer.objects.filter(recipient__isnull=True).update(recipient_id=models.Subquery(seller))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_marketplace_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='swappoffer',
+            name='recipient',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='swapp_offers_received', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_recipients, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='swappoffer',
+            index=models.Index(fields=['recipient', '-date_created'], name='swapp_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='swappoffer',
+            index=models.Index(fields=['offered_by', '-date_created'], name='swapp_outbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='swappoffer',
+            index=models.Index(condition=models.Q(('is_seen', False)), fields=['recipient', 'status'], name='swapp_inbox_unseen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='swappoffer',
+            index=models.Index(condition=models.Q(('is_seen', False)), fields=['offered_by', 'status'], name='swapp_outbox_unseen_idx'),
+        ),
+    ]
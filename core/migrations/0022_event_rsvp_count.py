@@ -0,0 +1,30 @@
+# Generated by Django 5.1.5 on 2026-10-17 03:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_rsvp_counts(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    attendees = (
+        Event.rsvps.through.objects.filter(event_id=OuterRef('pk')).order_by()
+        .values('event_id').annotate(count=Count('*')).values('count')
+    )
+    Event.objects.update(rsvp_count=Coalesce(Subquery(attendees), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_swap_cycles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='rsvp_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rsvp_counts, migrations.RunPython.noop),
+    ]
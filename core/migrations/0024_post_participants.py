@@ -0,0 +1,47 @@
+# Generated by Django 5.1.5 on 2026-10-17 03:41
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_participants(apps, schema_editor):
+    PostParticipant = apps.get_model('core', 'PostParticipant')
+    activity = Counter()
+    for model in ('Comment', 'Reaction'):
+        pairs = (
+            apps.get_model('core', model).objects.values_list('post_id', 'user_id')
+            .annotate(total=Count('id')).order_by()
+        )
+        for post_id, user_id, total in pairs.iterator():
+            activity[post_id, user_id] += total
+    PostParticipant.objects.bulk_create(
+        [PostParticipant(post_id=post_id, user_id=user_id, activity=total) for (post_id, user_id), total in activity.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_event_waitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='core.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('post', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_participants, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,71 @@
+import random
+from collections import Counter
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connection, models
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.text import slugify
 from cloudinary.models import CloudinaryField
 
 
 
-class User(AbstractUser):
+# Weight of each emoji in a post's hot_score. Reactions not listed here count as 0.
+REACTION_WEIGHTS = {
+    '👍': 1,
+    '❤️': 2,
+    '😂': 1,
+    '👎': -1,
+}
+
+
+def random_sort_key():
+    return random.random()
+
+
+def normalize_city(city):
+    """Canonical form of a free-form city name: "Toronto ", "toronto" and "TORONTO" all become "toronto"."""
+    return slugify(city or '')
+
+
+class CityKeyField(models.SlugField):
+    """
+    Indexed, normalized copy of the model's `city` column. It is recomputed
+    from `city` on every save and bulk_create, so feeds can filter with a
+    plain equality lookup instead of `city__iexact`. Models using it extend
+    CityKeyModel so partial saves of `city` keep it current.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 100)
+        kwargs.setdefault('db_index', False)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('default', '')
+        super().__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        value = normalize_city(model_instance.city)
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class CityKeyModel(models.Model):
+    """
+    Base for models with a CityKeyField. CityKeyField.pre_save only runs for
+    fields being written, so a save(update_fields=[..., 'city']) also writes
+    city_key; otherwise it would keep the old city.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is not None and 'city' in update_fields:
+            update_fields = {*update_fields, 'city_key'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class User(CityKeyModel, AbstractUser):
     CITY_CHOICES = [
         ('toronto', 'Toronto'),
         ('scarborough', 'Scarborough'),
@@ -14,6 +75,7 @@ class User(AbstractUser):
 
     is_moderator = models.BooleanField(default=False)
     city = models.CharField(max_length=50, choices=CITY_CHOICES, default='toronto')
+    city_key = CityKeyField()
     is_verified = models.BooleanField(default=False)
     is_business = models.BooleanField(default=False)
     is_moderator = models.BooleanField(default=False)
@@ -22,6 +84,10 @@ class User(AbstractUser):
     profile_image = CloudinaryField('image', blank=True, null=True)
     saved_listings = models.ManyToManyField('MarketplaceItem', blank=True, related_name='saved_by_users')
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['city_key', '-xp'], name='user_city_xp_idx'),
+        ]
 
     def __str__(self):
         return self.username
@@ -43,10 +109,11 @@ class Feedback(models.Model):
     def __str__(self):
         return f'{self.get_type_display()} - {self.content[:40]}'   
 
-class Group(models.Model):
+class Group(CityKeyModel):
     name = models.CharField(max_length=100)
     description = models.TextField()
     city = models.CharField(max_length=100)
+    city_key = CityKeyField()
     is_public = models.BooleanField(default=True)
     requires_approval = models.BooleanField(default=False)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -56,6 +123,9 @@ class Group(models.Model):
         return self.name
     class Meta:
         ordering = ['created_by']
+        indexes = [
+            models.Index(fields=['city_key', 'is_public'], name='group_city_public_idx'),
+        ]
 
 class GroupChat(models.Model):
     name = models.CharField(max_length=100)
@@ -72,7 +142,7 @@ class GroupMessage(models.Model):
     read_by = models.ManyToManyField(User, related_name='read_group_messages', blank=True)
 
 
-class Post(models.Model):
+class Post(CityKeyModel):
     POST_TYPES = [
         ('discussion', 'Discussion'),
         ('alert', 'Alert'),
@@ -84,34 +154,99 @@ class Post(models.Model):
     content = models.TextField()
     post_type = models.CharField(max_length=20, choices=POST_TYPES)
     city = models.CharField(max_length=50)  # duplicate for filtering speed
+    city_key = CityKeyField()
     anonymous = models.BooleanField(default=False)
     comment_count = models.IntegerField(default=0)
+    views_count = models.PositiveIntegerField(default=0)  # buffered, see core.counters
+    hot_score = models.IntegerField(default=0)  # weighted reaction total, see REACTION_WEIGHTS
+    random_key = models.FloatField(default=random_sort_key, editable=False)  # for sort=random sampling
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-hot_score', '-created_at'], name='post_hot_idx'),
+            models.Index(fields=['city_key', '-hot_score', '-created_at'], name='post_city_hot_idx'),
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            models.Index(fields=['city_key', '-created_at', '-id'], name='post_city_created_idx'),
+            models.Index(fields=['random_key', 'id'], name='post_random_idx'),
+            models.Index(fields=['city_key', 'random_key', 'id'], name='post_city_random_idx'),
+        ]
+
     def __str__(self):
         return self.title
+
+    @classmethod
+    def bump_hot_score(cls, post_id, emoji, delta=1):
+        weight = REACTION_WEIGHTS.get(emoji, 0)
+        if weight:
+            cls.objects.filter(pk=post_id).update(hot_score=F('hot_score') + weight * delta)
     
 class PollOption(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='poll_options')
     text = models.CharField(max_length=255)
     votes = models.ManyToManyField(User, blank=True, related_name='voted_options')
     
-class Event(models.Model):
+class Event(CityKeyModel):
     host = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     description = models.TextField()
     datetime = models.DateTimeField()
     location = models.CharField(max_length=255)
     city = models.CharField(max_length=50)
+    city_key = CityKeyField()
     is_public = models.BooleanField(default=True)
     rsvps = models.ManyToManyField(User, related_name='rsvped_events', blank=True)
     rsvp_limit = models.PositiveIntegerField(null=True, blank=True)
+    rsvp_count = models.PositiveIntegerField(default=0)  # the seat counter, see core.rsvps
+    waitlist_enabled = models.BooleanField(default=False)
     show_countdown = models.BooleanField(default=False)
+    views_count = models.PositiveIntegerField(default=0)  # buffered, see core.counters
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['datetime', 'id'], name='event_datetime_idx'),
+            models.Index(fields=['city_key', 'datetime', 'id'], name='event_city_datetime_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} in {self.city} on {self.datetime}"
+
+    @classmethod
+    def bump_rsvp_counts(cls, deltas):
+        """Apply {event_id: delta} to rsvp_count with one relative UPDATE per distinct delta."""
+        by_delta = {}
+        for event_id, delta in deltas.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(event_id)
+        for delta, event_ids in by_delta.items():
+            cls.objects.filter(pk__in=event_ids).update(rsvp_count=F('rsvp_count') + delta)
+
+    @classmethod
+    def recount_rsvps(cls, event_ids):
+        """Reset rsvp_count from the rsvps table for `event_ids`; returns the number of events updated."""
+        attendees = (
+            cls.rsvps.through.objects.filter(event_id=OuterRef('pk')).order_by()
+            .values('event_id').annotate(count=Count('*')).values('count')
+        )
+        return cls.objects.filter(pk__in=event_ids).update(rsvp_count=Coalesce(Subquery(attendees), 0))
     
     
-# models.py
+class EventWaitlistEntry(models.Model):
+    """A user queued for a full event; core.rsvps promotes entries in pk order as seats free up."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='waitlist')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_waitlists')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('event', 'user')
+        indexes = [
+            models.Index(fields=['event', 'id'], name='event_waitlist_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} waiting for {self.event}"
+
+
 class Reaction(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='reactions')
@@ -121,7 +256,7 @@ class Reaction(models.Model):
     class Meta:
         unique_together = ('user', 'post', 'emoji')
         
-class MarketplaceItem(models.Model):
+class MarketplaceItem(CityKeyModel):
     CONDITION_CHOICES = [
         ('new', 'New'),
         ('used', 'Used'),
@@ -145,18 +280,55 @@ class MarketplaceItem(models.Model):
     condition = models.CharField(max_length=20, choices=CONDITION_CHOICES, default='used')
     status = models.CharField(max_length=20, default='available')
     city = models.CharField(max_length=50)
+    city_key = CityKeyField()
     expiry_date = models.DateField(null=True, blank=True)
-    views_count = models.PositiveIntegerField(default=0)
+    views_count = models.PositiveIntegerField(default=0)  # buffered, see core.counters
+    updated_at = models.DateTimeField(auto_now=True)  # drives incremental similar-listing index syncs
     saved_by = models.ManyToManyField('core.User', related_name='saved_items', blank=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-id'], name='market_status_idx'),
+            models.Index(fields=['status', 'city_key', '-id'], name='market_status_city_idx'),
+            models.Index(fields=['status', 'city_key', 'price'], name='market_city_price_idx'),
+            models.Index(fields=['status', 'city_key', 'category', 'price'], name='market_city_category_idx'),
+            models.Index(fields=['status', 'city_key', 'condition', 'delivery_options'], name='market_city_condition_idx'),
+            models.Index(fields=['status', 'city_key', 'expiry_date'], name='market_city_expiry_idx'),
+            models.Index(fields=['status', 'expiry_date'], name='market_status_expiry_idx'),
+            models.Index(fields=['city_key', 'updated_at'], name='market_city_updated_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
 
 class MarketplaceMedia(models.Model):
+    # Uploads are staged to local disk and pushed to storage in the background (see core.ingest).
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PROCESSING, 'Processing'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    ]
+
     item = models.ForeignKey('MarketplaceItem', related_name='media', on_delete=models.CASCADE)
-    file = CloudinaryField('file', folder='marketplace/media/')
+    file = CloudinaryField('file', folder='marketplace/media/', blank=True, null=True)
     is_video = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=READY)
+    staged_file = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    # {preset: {'width', 'height', 'webp': {'url', 'bytes'}, 'jpeg': {'url', 'bytes'}}}, see core.imaging
+    derivatives = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='media_status_idx'),
+        ]
 
 class Message(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
@@ -179,10 +351,61 @@ class SwappOffer(models.Model):
     message = models.TextField(blank=True)
     date_created = models.DateTimeField(auto_now_add=True)
     is_seen = models.BooleanField(default=False)
+    # Denormalized item.seller, so the inbox and its unseen badge are index scans rather than joins.
+    recipient = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='swapp_offers_received', null=True, editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-date_created'], name='swapp_inbox_idx'),
+            models.Index(fields=['offered_by', '-date_created'], name='swapp_outbox_idx'),
+            # Partial: only unseen offers are indexed, so the badge count stays small however old the history.
+            models.Index(fields=['recipient', 'status'], condition=Q(is_seen=False), name='swapp_inbox_unseen_idx'),
+            models.Index(fields=['offered_by', 'status'], condition=Q(is_seen=False), name='swapp_outbox_unseen_idx'),
+        ]
 
     def __str__(self):
         return f"Offer by {self.offered_by} on {self.item}"
 
+    def save(self, *args, **kwargs):
+        if self.recipient_id is None and self.item_id is not None:
+            self.recipient_id = self.item.seller_id
+        super().save(*args, **kwargs)
+
+class SwapCycle(models.Model):
+    """
+    A suggested multi-way swap found by core.matching: a ring of 2-4 users in
+    which each one wants (has an open offer on) a listing of the next.
+    """
+    key = models.CharField(max_length=100, unique=True)  # user ids in ring order, starting at the smallest
+    city = models.CharField(max_length=50)  # the listings' city_key
+    length = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', '-created_at'], name='swapcycle_city_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.length}-way swap {self.key} in {self.city}"
+
+class SwapCycleLeg(models.Model):
+    """One hand-over in a SwapCycle: `giver` passes `item` to `receiver`, who has an open offer on it."""
+    cycle = models.ForeignKey(SwapCycle, on_delete=models.CASCADE, related_name='legs')
+    position = models.PositiveSmallIntegerField()
+    giver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    item = models.ForeignKey(MarketplaceItem, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        ordering = ['position']
+        indexes = [
+            # Finding the cycles an offer or listing change invalidates.
+            models.Index(fields=['item', 'receiver'], name='swapleg_item_receiver_idx'),
+        ]
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     content = models.CharField(max_length=255)
@@ -199,11 +422,189 @@ class Comment(models.Model):
     content = models.TextField()
     anonymous = models.BooleanField(default=False)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
+    # Materialized path of zero-padded ids ("0000000012/0000000034"); sorting by it yields tree order.
+    path = models.TextField(blank=True, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    PATH_SEGMENT_WIDTH = 10
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+            models.Index(fields=['post', 'parent', '-created_at'], name='comment_post_parent_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {'Anon' if self.anonymous else self.user.username} on {self.post.title[:20]}"
 
+    def save(self, *args, **kwargs):
+        creating = self.pk is None
+        super().save(*args, **kwargs)
+        if creating and not self.path:
+            segment = str(self.pk).zfill(self.PATH_SEGMENT_WIDTH)
+            if self.parent_id:
+                parent = self.parent
+                self.path = f'{parent.path}/{segment}'
+                self.depth = parent.depth + 1
+            else:
+                self.path = segment
+                self.depth = 0
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
+class PostEngagement(models.Model):
+    """
+    Per-post engagement rollup backing sort=highlights. Kept up to date by
+    core.signals on comment and reaction writes; `reconcile_engagement`
+    rebuilds it from the source tables.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='engagement')
+    comment_count = models.PositiveIntegerField(default=0)
+    reaction_count = models.PositiveIntegerField(default=0)
+    participant_count = models.PositiveIntegerField(default=0)
+    score = models.IntegerField(default=0)  # comment_count + reaction_count
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-last_activity_at'], name='engagement_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"Engagement for post {self.post_id}: {self.score}"
+
+    @classmethod
+    def record(cls, post_id, user_id, comments=0, reactions=0, when=None):
+        """Apply a +1/-1 comment or reaction delta. Call after the row has been written or deleted."""
+        participants = PostParticipant.touch(post_id, user_id, comments + reactions)
+        changes = {
+            'comment_count': F('comment_count') + comments,
+            'reaction_count': F('reaction_count') + reactions,
+            'participant_count': F('participant_count') + participants,
+            'score': F('score') + comments + reactions,
+        }
+        if when is not None:
+            changes['last_activity_at'] = when
+
+        updated = cls.objects.filter(post_id=post_id).update(**changes)
+        if not updated and comments + reactions > 0:
+            # Rollup missing (e.g. post predates it); rebuild this one row from scratch.
+            cls.rebuild([post_id])
+
+    @classmethod
+    def rebuild(cls, post_ids):
+        """Recompute the rollups for `post_ids` with a handful of grouped queries."""
+        post_ids = list(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+        rollups = {
+            post_id: cls(post_id=post_id) for post_id in post_ids
+        }
+        activity = Counter()
+
+        for model, count_field in ((Comment, 'comment_count'), (Reaction, 'reaction_count')):
+            totals = (
+                model.objects.filter(post_id__in=post_ids)
+                .values('post_id')
+                .annotate(total=models.Count('id'), last=models.Max('created_at'))
+                .order_by()
+            )
+            for row in totals:
+                rollup = rollups[row['post_id']]
+                setattr(rollup, count_field, row['total'])
+                if rollup.last_activity_at is None or row['last'] > rollup.last_activity_at:
+                    rollup.last_activity_at = row['last']
+            pairs = (
+                model.objects.filter(post_id__in=post_ids)
+                .values_list('post_id', 'user_id').annotate(total=models.Count('id')).order_by()
+            )
+            for post_id, user_id, total in pairs:
+                activity[post_id, user_id] += total
+
+        participants = Counter(post_id for post_id, _ in activity)
+        for post_id, rollup in rollups.items():
+            rollup.participant_count = participants[post_id]
+            rollup.score = rollup.comment_count + rollup.reaction_count
+
+        PostParticipant.objects.filter(post_id__in=post_ids).delete()
+        PostParticipant.objects.bulk_create(
+            [PostParticipant(post_id=post_id, user_id=user_id, activity=total) for (post_id, user_id), total in activity.items()],
+            batch_size=1000,
+        )
+        fields = ['comment_count', 'reaction_count', 'participant_count', 'score', 'last_activity_at']
+        cls.objects.bulk_create(
+            rollups.values(), update_conflicts=True, unique_fields=['post'], update_fields=fields,
+        )
+        Post.objects.bulk_update(
+            [Post(pk=post_id, comment_count=rollup.comment_count) for post_id, rollup in rollups.items()],
+            ['comment_count'],
+        )
+        return len(rollups)
+
+class PostParticipant(models.Model):
+    """
+    How many comments and reactions `user` has on `post`. A row exists while
+    that number is positive, so PostEngagement.participant_count moves by
+    +1/-1 exactly when a row appears or disappears, without re-counting.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    activity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'user')
+
+    @classmethod
+    def touch(cls, post_id, user_id, delta):
+        """Move the user's activity on the post by `delta`; returns +1 / -1 when they join / leave, else 0."""
+        if not delta:
+            return 0
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            if delta > 0:
+                # One upsert either creates the row or bumps it; the returned total tells which.
+                cursor.execute(
+                    f"INSERT INTO {table} (post_id, user_id, activity) VALUES (%s, %s, %s) "
+                    f"ON CONFLICT (post_id, user_id) DO UPDATE SET activity = {table}.activity + %s "
+                    f"RETURNING activity",
+                    [post_id, user_id, delta, delta],
+                )
+                return 1 if cursor.fetchone()[0] == delta else 0
+            # Both statements are guarded, so a concurrent +1 between them is never lost: if the row
+            # grew after the UPDATE missed it, the DELETE misses too and the UPDATE is retried.
+            while True:
+                cursor.execute(
+                    f"UPDATE {table} SET activity = activity + %s "
+                    f"WHERE post_id = %s AND user_id = %s AND activity > %s",
+                    [delta, post_id, user_id, -delta],
+                )
+                if cursor.rowcount:
+                    return 0
+                # Nothing left above zero: this was the user's last comment or reaction on the post.
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE post_id = %s AND user_id = %s AND activity <= %s",
+                    [post_id, user_id, -delta],
+                )
+                if cursor.rowcount:
+                    return -1
+                if not cls.objects.filter(post_id=post_id, user_id=user_id).exists():
+                    return 0
+
+
+class TrendingRank(models.Model):
+    """Materialized sort=trending scores, recomputed per city by `compute_trending` (see core.ranking)."""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    city = models.CharField(max_length=50)  # the post's city_key
+    score = models.FloatField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', '-score'], name='trending_city_score_idx'),
+            models.Index(fields=['-score'], name='trending_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"Trending {self.post_id} in {self.city}: {self.score:.4f}"
+
 class Report(models.Model):
     CONTENT_TYPES = [
         ('post', 'Post'),
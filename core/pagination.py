@@ -0,0 +1,222 @@
+import base64
+import hashlib
+import json
+import math
+import operator
+import secrets
+from datetime import date, datetime
+from decimal import Decimal
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class FeedPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, keyset ("cursor") pagination when the
+    request carries a `cursor` query param. Pass an empty `?cursor=` to get the
+    first page; every response then links to the next one.
+
+    The keyset is the queryset's own ordering with the primary key appended as a
+    tie-breaker, so `?sort=` and `?city=` keep working and each page is an
+    index range scan instead of COUNT(*) + OFFSET.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.query = queryset.query
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        self.ordering = self.get_ordering(queryset) if self.cursor_mode else None
+
+        # Orderings we can't seek on (e.g. '?') fall back to page numbers.
+        if not self.ordering:
+            self.cursor_mode = False
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position))
+
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = [_encode_value(getattr(last, field.lstrip('-'))) for field in self.ordering]
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position))
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or [])
+        if any(not isinstance(field, str) or field == '?' or '__' in field for field in ordering):
+            return None
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            descending = ordering[-1].startswith('-') if ordering else True
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    def seek_filter(self, position):
+        # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        branches = []
+        prefix = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            branches.append(prefix & Q(**{f'{name}__{lookup}': value}))
+            prefix &= Q(**{name: value})
+        return reduce(operator.or_, branches)
+
+    def encode_cursor(self, position):
+        raw = json.dumps(position, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param, '')
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != self.get_cursor_length():
+            raise NotFound(self.invalid_cursor_message)
+        # A hand-edited cursor must fail here as a 404, not later inside the seek lookups as a 500.
+        try:
+            return self.clean_position(position)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_cursor_length(self):
+        return len(self.ordering)
+
+    def clean_position(self, position):
+        return [self.clean_value(field.lstrip('-'), value) for field, value in zip(self.ordering, position)]
+
+    def clean_value(self, name, value):
+        """Convert one decoded cursor value to its ordering field's type; raises ValueError on a mismatch."""
+        if value is None or isinstance(value, (bool, list, dict)):
+            raise ValueError(f'Unexpected cursor value for {name}: {value!r}')
+        if name in self.query.annotations:
+            field = self.query.annotations[name].output_field
+        elif name == 'pk':
+            field = self.query.model._meta.pk
+        else:
+            field = self.query.model._meta.get_field(name)
+        value = field.to_python(value)
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError(f'Unexpected cursor value for {name}: {value!r}')
+        return value
+
+
+class RandomSamplePagination(FeedPagination):
+    """
+    Stable random ordering for `?sort=random`.
+
+    Every row carries a uniformly distributed `random_key`. A `?seed=` string is
+    hashed to a start point in [0, 1); pages walk the (random_key, id) index
+    upward from there and wrap around once, so each page is an index range
+    scan, a seed always yields the same sequence, and no row repeats. When no
+    seed is given one is generated and carried through the `next` links.
+    """
+    seed_query_param = 'seed'
+    key_field = 'random_key'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.query = queryset.query
+        self.cursor_mode = True
+        self.ordering = [self.key_field, 'pk']
+        self.seed = request.query_params.get(self.seed_query_param) or secrets.token_hex(8)
+        self.start = start = self.seed_to_key(self.seed)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        position = self.decode_cursor(request)
+        wrapped, key, pk = position if position is not None else (False, start, None)
+
+        queryset = queryset.order_by(*self.ordering)
+        results = []
+        if not wrapped:
+            head = queryset.filter(**{f'{self.key_field}__gte': start})
+            if pk is not None:
+                head = head.filter(self.seek_filter([key, pk]))
+            results = list(head[:page_size + 1])
+            if len(results) <= page_size:
+                wrapped, pk = True, None
+        if wrapped:
+            tail = queryset.filter(**{f'{self.key_field}__lt': start})
+            if pk is not None:
+                tail = tail.filter(self.seek_filter([key, pk]))
+            results += list(tail[:page_size + 1 - len(results)])
+
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'seed': self.seed,
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        key = getattr(last, self.key_field)
+        position = [key < self.start, key, last.pk]
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        url = replace_query_param(url, self.seed_query_param, self.seed)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position))
+
+    def get_cursor_length(self):
+        return 3  # (wrapped, random_key, pk)
+
+    def clean_position(self, position):
+        wrapped, key, pk = position
+        if not isinstance(wrapped, bool):
+            raise ValueError(f'Unexpected cursor value for wrapped: {wrapped!r}')
+        return [wrapped, self.clean_value(self.key_field, key), self.clean_value('pk', pk)]
+
+    @staticmethod
+    def seed_to_key(seed):
+        digest = hashlib.sha256(str(seed).encode()).digest()
+        return int.from_bytes(digest[:7], 'big') / float(1 << 56)
@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_city_version
+from .models import Post, TrendingRank
+
+# Hacker News style gravity: points / (age_hours + AGE_OFFSET_HOURS) ** GRAVITY.
+TRENDING_GRAVITY = 1.8
+TRENDING_AGE_OFFSET_HOURS = 2
+TRENDING_COMMENT_WEIGHT = 2
+# Posts older than this score ~0 anyway, so the job never scans them.
+TRENDING_WINDOW = timedelta(days=14)
+
+
+def trending_score(hot_score, comment_count, age_hours):
+    points = max(hot_score, 0) + TRENDING_COMMENT_WEIGHT * comment_count
+    return points / (age_hours + TRENDING_AGE_OFFSET_HOURS) ** TRENDING_GRAVITY
+
+
+def recompute_city(city, now=None, batch_size=5000):
+    """
+    Rewrite the TrendingRank rows for one city from Post.hot_score and
+    Post.comment_count, walking the posts in primary-key batches. Rows for
+    posts that have left the window are dropped. Returns the number of posts ranked.
+    """
+    now = now or timezone.now()
+    cutoff = now - TRENDING_WINDOW
+    posts = (
+        Post.objects.filter(city_key=city, created_at__gte=cutoff)
+        .order_by('pk')
+        .values_list('pk', 'hot_score', 'comment_count', 'created_at')
+    )
+
+    ranked = 0
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        rows = [
+            TrendingRank(
+                post_id=pk,
+                city=city,
+                score=trending_score(hot, comments, (now - created_at).total_seconds() / 3600),
+                computed_at=now,
+            )
+            for pk, hot, comments, created_at in batch
+        ]
+        TrendingRank.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['post'], update_fields=['city', 'score', 'computed_at'],
+        )
+        ranked += len(rows)
+        last_pk = batch[-1][0]
+
+    TrendingRank.objects.filter(city=city, computed_at__lt=now).delete()
+    return ranked
+
+
+def recompute_trending(cities=None, batch_size=5000, now=None):
+    """Recompute every city key (or just `cities`). Returns {city key: posts ranked}."""
+    now = now or timezone.now()
+    if cities is None:
+        cities = list(
+            Post.objects.filter(created_at__gte=now - TRENDING_WINDOW)
+            .order_by().values_list('city_key', flat=True).distinct()
+        )
+        # Cities with no recent posts still need their stale ranks cleared.
+        cities = sorted(set(cities) | set(TrendingRank.objects.order_by().values_list('city', flat=True).distinct()))
+
+    results = {}
+    for city in cities:
+        with transaction.atomic():
+            results[city] = recompute_city(city, now=now, batch_size=batch_size)
+        bump_city_version(city)
+    return results
@@ -0,0 +1,49 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_city_version
+from .models import Post, PostEngagement, Reaction
+
+ADDED = 'added'
+REMOVED = 'removed'
+UNCHANGED = 'unchanged'
+
+REACTION_ACTIONS = ('toggle', 'add', 'remove')
+
+_TABLE = connection.ops.quote_name(Reaction._meta.db_table)
+# Both statements are single-row and idempotent: the (user, post, emoji) unique key makes a
+# concurrent duplicate insert a no-op, and only one of two racing deletes sees a row.
+INSERT_SQL = (
+    f"INSERT INTO {_TABLE} (user_id, post_id, emoji, created_at) VALUES (%s, %s, %s, %s) "
+    f"ON CONFLICT (user_id, post_id, emoji) DO NOTHING"
+)
+DELETE_SQL = f"DELETE FROM {_TABLE} WHERE user_id = %s AND post_id = %s AND emoji = %s"
+
+
+def apply_reaction(user, post, emoji, action='toggle'):
+    """
+    Add, remove or toggle one reaction and return ADDED, REMOVED or UNCHANGED.
+
+    `post` is the already-loaded Post. The reaction row changes in one
+    statement (a toggle tries the insert and falls back to the delete),
+    judged by its rowcount, so concurrent double taps never error and never
+    double-count. The raw statements skip the Reaction signals, so
+    Post.hot_score, the PostEngagement rollup and the city feed version are
+    updated here, by relative UPDATEs in the same transaction.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            delta = 0
+            if action != 'remove':
+                cursor.execute(INSERT_SQL, [user.pk, post.pk, emoji, connection.ops.adapt_datetimefield_value(now)])
+                delta = cursor.rowcount
+            if not delta and action != 'add':
+                cursor.execute(DELETE_SQL, [user.pk, post.pk, emoji])
+                delta = -cursor.rowcount
+        if not delta:
+            return UNCHANGED
+        Post.bump_hot_score(post.pk, emoji, delta)
+        PostEngagement.record(post.pk, user.pk, reactions=delta, when=now if delta > 0 else None)
+    bump_city_version(post.city)
+    return ADDED if delta > 0 else REMOVED
@@ -0,0 +1,130 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from .cache import bump_city_version
+from .models import Event, EventWaitlistEntry, Notification
+
+ATTENDING = 'attending'
+WAITLISTED = 'waitlisted'
+FULL = 'full'
+CANCELLED = 'cancelled'
+LEFT_WAITLIST = 'left_waitlist'
+UNCHANGED = 'unchanged'
+
+# Attendee rows are written directly, so the rsvps m2m_changed receiver does not count them a second time.
+Attendance = Event.rsvps.through
+
+
+def _claim_seat(event_id):
+    """Take one seat with a single conditional UPDATE; False when the event is full."""
+    # A limit of 0 has always meant "no limit".
+    has_room = Q(rsvp_limit__isnull=True) | Q(rsvp_limit=0) | Q(rsvp_count__lt=F('rsvp_limit'))
+    return Event.objects.filter(has_room, pk=event_id).update(rsvp_count=F('rsvp_count') + 1) == 1
+
+
+def _release_seat(event_id):
+    Event.objects.filter(pk=event_id).update(rsvp_count=F('rsvp_count') - 1)
+
+
+def join_event(event, user):
+    """
+    RSVP `user` to `event` and return (status, waitlist position or None).
+
+    The seat is claimed first, by the conditional UPDATE on rsvp_count, which
+    is the only capacity check: the database applies it atomically, so any
+    number of simultaneous RSVPs can never oversell. The attendee row follows
+    in the same transaction and its (event, user) unique key rejects doubles.
+    A full event puts the user on its waitlist if it has one, otherwise FULL.
+    Already attending or waitlisted gives UNCHANGED.
+    """
+    try:
+        with transaction.atomic():
+            seated = _claim_seat(event.pk)
+            if seated:
+                Attendance.objects.create(event_id=event.pk, user_id=user.pk)
+    except IntegrityError:
+        # Already attending; the rollback returned the seat.
+        return UNCHANGED, None
+
+    if seated:
+        bump_city_version(event.city)
+        return ATTENDING, None
+    if Attendance.objects.filter(event_id=event.pk, user_id=user.pk).exists():
+        return UNCHANGED, None
+    if not event.waitlist_enabled:
+        return FULL, None
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                entry = EventWaitlistEntry.objects.create(event=event, user=user)
+        except IntegrityError:
+            return UNCHANGED, None
+        # A seat may have been freed between the failed claim and joining the queue.
+        if user.pk in promote_waitlist(event):
+            return ATTENDING, None
+        return WAITLISTED, EventWaitlistEntry.objects.filter(event=event, pk__lte=entry.pk).count()
+
+
+def leave_event(event, user):
+    """
+    Cancel `user`'s RSVP (or waitlist place). A freed seat goes to the head of
+    the waitlist in the same transaction, so a racing new RSVP cannot take it.
+    Returns CANCELLED, LEFT_WAITLIST or UNCHANGED.
+    """
+    with transaction.atomic():
+        if Attendance.objects.filter(event_id=event.pk, user_id=user.pk).delete()[0]:
+            _release_seat(event.pk)
+            promote_waitlist(event)
+        elif EventWaitlistEntry.objects.filter(event=event, user=user).delete()[0]:
+            return LEFT_WAITLIST
+        else:
+            return UNCHANGED
+    bump_city_version(event.city)
+    return CANCELLED
+
+
+def toggle_rsvp(event, user):
+    """The RSVP button: join when not involved yet, otherwise leave. Returns (status, waitlist position)."""
+    status, position = join_event(event, user)
+    if status == UNCHANGED:
+        return leave_event(event, user), None
+    return status, position
+
+
+def promote_waitlist(event):
+    """
+    Fill free seats from the waitlist, first come first served, and notify
+    the users moved in. Returns their ids.
+    """
+    if not event.waitlist_enabled:
+        return []
+    promoted = []
+    with transaction.atomic():
+        # Claim before reading the queue: a full event costs one UPDATE, and SQLite takes its write lock up front.
+        while _claim_seat(event.pk):
+            entry = (
+                EventWaitlistEntry.objects.select_for_update(skip_locked=True)
+                .filter(event=event).order_by('pk').first()
+            )
+            if entry is None:
+                _release_seat(event.pk)
+                break
+            entry.delete()
+            try:
+                with transaction.atomic():
+                    Attendance.objects.create(event_id=event.pk, user_id=entry.user_id)
+            except IntegrityError:
+                _release_seat(event.pk)
+                continue
+            promoted.append(entry.user_id)
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id, link=f'/events/{event.pk}',
+                content=f'A spot opened up: you are now attending "{event.title}".'[:255],
+            )
+            for user_id in promoted
+        ])
+    if promoted:
+        bump_city_version(event.city)
+    return promoted
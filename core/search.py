@@ -0,0 +1,148 @@
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+
+
+class BasePostSearchBackend:
+    """
+    A full-text index over Post.title and Post.content.
+
+    `install_sql` creates the index and whatever keeps it in sync with
+    core_post (triggers, generated columns), so creates, updates and deletes
+    are indexed without any application code. `search` narrows a Post
+    queryset to matches and annotates it with a `rank` (higher is better).
+    """
+    install_sql = []
+    installed_check_sql = None
+    rebuild_sql = []
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def no_results(self, queryset):
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField())).none()
+
+    def install(self, using=DEFAULT_DB_ALIAS):
+        """Create the index if it is missing. Returns True if anything was installed."""
+        if not self.installed_check_sql:
+            return False
+        with connections[using].cursor() as cursor:
+            cursor.execute(self.installed_check_sql)
+            if cursor.fetchone()[0]:
+                return False
+            for statement in self.install_sql + self.rebuild_sql:
+                cursor.execute(statement)
+        return True
+
+    def rebuild(self, using=DEFAULT_DB_ALIAS):
+        with connections[using].cursor() as cursor:
+            for statement in self.rebuild_sql:
+                cursor.execute(statement)
+
+
+class SQLiteFTS5SearchBackend(BasePostSearchBackend):
+    install_sql = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS core_post_fts USING fts5("
+        "title, content, content='core_post', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS core_post_fts_insert AFTER INSERT ON core_post BEGIN "
+        "INSERT INTO core_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+        "CREATE TRIGGER IF NOT EXISTS core_post_fts_delete AFTER DELETE ON core_post BEGIN "
+        "INSERT INTO core_post_fts(core_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+        "CREATE TRIGGER IF NOT EXISTS core_post_fts_update AFTER UPDATE OF title, content ON core_post BEGIN "
+        "INSERT INTO core_post_fts(core_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+        "INSERT INTO core_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    ]
+    # SQLite migrations that remake core_post silently drop its triggers, so check for those.
+    installed_check_sql = "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name = 'core_post_fts_update'"
+    rebuild_sql = ["INSERT INTO core_post_fts(core_post_fts) VALUES ('rebuild')"]
+
+    # Title matches weigh more than body matches, like the setweight() 'A'/'B' split on Postgres.
+    RANK_SQL = "SELECT -bm25(core_post_fts, 4.0, 1.0) FROM core_post_fts WHERE core_post_fts MATCH %s AND rowid = core_post.id"
+    MATCH_SQL = "SELECT rowid FROM core_post_fts WHERE core_post_fts MATCH %s"
+
+    def to_match_expression(self, query):
+        # Quote every term so user input can never be parsed as FTS5 syntax; terms are ANDed.
+        terms = re.findall(r'\w+', query)
+        return ' '.join(f'"{term}"' for term in terms)
+
+    def search(self, queryset, query):
+        match = self.to_match_expression(query)
+        if not match:
+            return self.no_results(queryset)
+        return queryset.filter(id__in=RawSQL(self.MATCH_SQL, [match])).annotate(
+            rank=RawSQL(self.RANK_SQL, [match], output_field=FloatField()),
+        )
+
+
+class PostgresSearchBackend(BasePostSearchBackend):
+    install_sql = [
+        "ALTER TABLE core_post ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED",
+        "CREATE INDEX IF NOT EXISTS core_post_search_vector_idx ON core_post USING gin (search_vector)",
+    ]
+    installed_check_sql = "SELECT COUNT(*) FROM pg_indexes WHERE indexname = 'core_post_search_vector_idx'"
+    # The generated column is recomputed by Postgres on every write, so there is nothing to rebuild.
+    rebuild_sql = []
+
+    MATCH_SQL = "core_post.search_vector @@ websearch_to_tsquery('english', %s)"
+    RANK_SQL = "ts_rank(core_post.search_vector, websearch_to_tsquery('english', %s))"
+
+    def search(self, queryset, query):
+        return (
+            queryset
+            .alias(matched=RawSQL(self.MATCH_SQL, [query], output_field=BooleanField()))
+            .filter(matched=True)
+            .annotate(rank=RawSQL(self.RANK_SQL, [query], output_field=FloatField()))
+        )
+
+
+class SubstringSearchBackend(BasePostSearchBackend):
+    """Unindexed fallback for databases without a native full-text engine."""
+
+    def search(self, queryset, query):
+        terms = query.split()
+        if not terms:
+            return self.no_results(queryset)
+        for term in terms:
+            queryset = queryset.filter(Q(title__icontains=term) | Q(content__icontains=term))
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteFTS5SearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using=DEFAULT_DB_ALIAS):
+    backend_path = getattr(settings, 'POST_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return SEARCH_BACKENDS.get(connections[using].vendor, SubstringSearchBackend)()
+
+
+def install_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate hook: (re)creates the full-text index and its sync triggers when missing."""
+    if 'core_post' not in connections[using].introspection.table_names():
+        return
+    get_search_backend(using).install(using)
+
+
+class PostSearchFilter(BaseFilterBackend):
+    """
+    Drop-in replacement for DRF's SearchFilter on the posts feed: `?search=`
+    goes through the full-text backend and results are ordered by relevance.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return get_search_backend().search(queryset, query).order_by('-rank', '-created_at', '-id')
@@ -2,12 +2,13 @@ from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.decorators import api_view
 from rest_framework.decorators import permission_classes
-from django.db.models import Count
+from django.db.models import Count, prefetch_related_objects
 from .models import (
     User, Post, Event, Notification, MarketplaceItem, Reaction, MarketplaceMedia,
-    SwappOffer, Feedback, Group, Message, Comment, Report, PollOption, GroupMessage
+    SwappOffer, Feedback, Group, Message, Comment, Report, PollOption, GroupMessage, SwapCycle, SwapCycleLeg,
 )
-from cloudinary.utils import cloudinary_url
+from .ingest import get_media_storage
+from .media import derivative_srcset, resolve_format, resolve_preset
 # -----------------------------
 # Auth & User
 # -----------------------------
@@ -52,20 +53,45 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 
+class EventListSerializer(serializers.ListSerializer):
+    """Loads which events on the page the requesting user has RSVP'd to in one query."""
+
+    def to_representation(self, data):
+        events = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        rsvped_ids = set()
+        if events and user and user.is_authenticated:
+            rsvped_ids = set(
+                Event.rsvps.through.objects.filter(
+                    user_id=user.id, event_id__in=[event.id for event in events],
+                ).values_list('event_id', flat=True)
+            )
+        self.context['rsvped_event_ids'] = rsvped_ids
+        return super().to_representation(events)
+
+
 class EventSerializer(serializers.ModelSerializer):
     has_rsvped = serializers.SerializerMethodField()
-    rsvp_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Event
-        fields = ['id', 'title', 'description', 'datetime', 'location', 'has_rsvped', 'rsvp_count']
+        fields = [
+            'id', 'title', 'description', 'datetime', 'location', 'has_rsvped', 'rsvp_count', 'rsvp_limit',
+            'waitlist_enabled', 'views_count',
+        ]
+        read_only_fields = ['rsvp_count', 'views_count']
+        list_serializer_class = EventListSerializer
 
     def get_has_rsvped(self, obj):
         request = self.context.get('request')
-        return request.user in obj.rsvps.all() if request else False
-
-    def get_rsvp_count(self, obj):
-        return obj.rsvps.count()
+        user = getattr(request, 'user', None)
+        if not user or not user.is_authenticated:
+            return False
+        rsvped_ids = self.context.get('rsvped_event_ids')
+        if rsvped_ids is not None:
+            return obj.id in rsvped_ids
+        return obj.rsvps.filter(pk=user.pk).exists()
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -74,7 +100,7 @@ class EventSerializer(serializers.ModelSerializer):
         if not request or not hasattr(request, 'user'):
             return data
 
-        if request.user != instance.host:
+        if request.user.pk != instance.host_id:
             data.pop('rsvps', None)
 
         return data
@@ -97,16 +123,53 @@ class RecursiveCommentSerializer(serializers.ModelSerializer):
 
 class CommentSerializer(serializers.ModelSerializer):
     replies = serializers.SerializerMethodField()
+    reply_count = serializers.SerializerMethodField()
+    more_replies = serializers.SerializerMethodField()
     user = serializers.SerializerMethodField()
     post = serializers.PrimaryKeyRelatedField(read_only=True)
     parent = serializers.PrimaryKeyRelatedField(queryset=Comment.objects.all(), required=False, allow_null=True)
 
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'user', 'content', 'anonymous', 'parent', 'created_at', 'replies']
+        fields = ['id', 'post', 'user', 'content', 'anonymous', 'parent', 'created_at', 'depth',
+                  'replies', 'reply_count', 'more_replies']
+        read_only_fields = ['depth']
+
+    # When the view has pre-loaded the thread (see CommentListCreateView.load_replies)
+    # replies are assembled from context['comment_children'] instead of querying per comment.
+    # Only the first replies_per_comment + 1 replies of each comment are loaded; the counts
+    # come from context['comment_reply_counts'].
+
+    def _children(self, obj):
+        children = self.context.get('comment_children')
+        if children is None:
+            return None
+        return children.get(obj.id, [])
+
+    def _shown_replies(self, obj):
+        children = self._children(obj)
+        if obj.depth >= self.context['comment_depth_limit']:
+            return []
+        return children[:self.context['replies_per_comment']]
 
     def get_replies(self, obj):
-        return CommentSerializer(obj.replies.all().order_by('created_at'), many=True).data
+        if self._children(obj) is None:
+            return CommentSerializer(obj.replies.all().order_by('created_at'), many=True).data
+        return CommentSerializer(self._shown_replies(obj), many=True, context=self.context).data
+
+    def get_reply_count(self, obj):
+        if self._children(obj) is None:
+            return obj.replies.count()
+        return self.context['comment_reply_counts'].get(obj.id, 0)
+
+    def get_more_replies(self, obj):
+        children = self._children(obj)
+        if children is None or not self.get_reply_count(obj):
+            return None
+        shown = self._shown_replies(obj)
+        if shown and len(children) <= len(shown):
+            return None
+        return self.context['more_replies_url'](obj, after=shown[-1] if shown else None)
 
     def get_user(self, obj):
         return "Anonymous" if obj.anonymous else obj.user.username
@@ -117,16 +180,32 @@ class CommentSerializer(serializers.ModelSerializer):
 
 class MarketplaceMediaSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = MarketplaceMedia
-        fields = ['id', 'file', 'is_video']
+        fields = ['id', 'file', 'srcset', 'is_video', 'status']
+
+    # ?media_preset=thumb|card|full picks the size and ?media_format=webp|jpeg the encoding. Images
+    # ingested with local derivatives are served from those; older media falls back to the storage's
+    # transformations. Media still being ingested has no URL yet.
 
     def get_file(self, obj):
-        if obj.file:
-            url, _ = cloudinary_url(obj.file.public_id, width=400, height=400, crop="fill", quality="auto")
-            return url
-        return None
+        if not obj.file or obj.status != MarketplaceMedia.READY:
+            return None
+        request = self.context.get('request')
+        preset = resolve_preset(request)
+        if preset in obj.derivatives:
+            return obj.derivatives[preset][resolve_format(request)]['url']
+        return get_media_storage().url(obj.file, preset)
+
+    def get_srcset(self, obj):
+        if not obj.file or obj.status != MarketplaceMedia.READY or obj.is_video:
+            return None
+        request = self.context.get('request')
+        if obj.derivatives:
+            return derivative_srcset(obj.derivatives, resolve_preset(request), resolve_format(request))
+        return get_media_storage().srcset(obj.file, resolve_preset(request))
         
         
 class ThreadSummarySerializer(serializers.Serializer):
@@ -140,6 +219,35 @@ class MiniUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'profile_image']
 
+class MarketplaceItemListSerializer(serializers.ListSerializer):
+    """Loads the requesting user's saved item ids for the whole page in one query."""
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        saved_ids = set()
+        if items and user and user.is_authenticated:
+            saved_ids = set(
+                MarketplaceItem.saved_by.through.objects.filter(
+                    user_id=user.id, marketplaceitem_id__in=[item.id for item in items],
+                ).values_list('marketplaceitem_id', flat=True)
+            )
+        self.context['saved_item_ids'] = saved_ids
+        return super().to_representation(items)
+
+
+class MarketplaceImportRowSerializer(serializers.ModelSerializer):
+    """One row of a bulk listing import (see core.bulk); seller and city come from the uploader."""
+
+    class Meta:
+        model = MarketplaceItem
+        fields = [
+            'title', 'description', 'price', 'category', 'condition',
+            'delivery_options', 'delivery_note', 'expiry_date',
+        ]
+
+
 class MarketplaceItemSerializer(serializers.ModelSerializer):
     is_saved = serializers.SerializerMethodField()
     saved_by_user = serializers.SerializerMethodField()
@@ -148,19 +256,27 @@ class MarketplaceItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = MarketplaceItem
         fields = [
-            'id', 'title', 'description', 'price', 'category',
-            'delivery_options', 'delivery_note', 'is_saved', 
-            'saved_by_user', 'status', 'seller', 'city', 'images'
+            'id', 'title', 'description', 'price', 'category', 'condition',
+            'delivery_options', 'delivery_note', 'expiry_date', 'is_saved', 
+            'saved_by_user', 'status', 'seller', 'city', 'images', 'views_count'
         ]
-        read_only_fields = ['seller', 'city', 'is_saved', 'saved_by_user']
+        read_only_fields = ['seller', 'city', 'is_saved', 'saved_by_user', 'views_count']
+        list_serializer_class = MarketplaceItemListSerializer
 
-    def get_is_saved(self, obj):
+    def _is_saved(self, obj):
         user = self.context['request'].user
-        return user.is_authenticated and obj.saved_by.filter(id=user.id).exists()
+        if not user.is_authenticated:
+            return False
+        saved_ids = self.context.get('saved_item_ids')
+        if saved_ids is not None:
+            return obj.id in saved_ids
+        return obj.saved_by.filter(id=user.id).exists()
+
+    def get_is_saved(self, obj):
+        return self._is_saved(obj)
 
     def get_saved_by_user(self, obj):
-        user = self.context['request'].user
-        return user.is_authenticated and obj.saved_by.filter(id=user.id).exists()
+        return self._is_saved(obj)
 
 
 
@@ -172,6 +288,57 @@ class SwappOfferSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['offered_by', 'status', 'date_created', 'is_seen']
 
+
+class SwappItemSummarySerializer(serializers.ModelSerializer):
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MarketplaceItem
+        fields = ['id', 'title', 'price', 'status', 'thumbnail']
+
+    def get_thumbnail(self, obj):
+        # Reads the ready media prefetched by core.swaps.offer_summaries.
+        for media in obj.media.all():
+            if media.file and not media.is_video:
+                if 'thumb' in media.derivatives:
+                    return media.derivatives['thumb'][resolve_format(self.context.get('request'))]['url']
+                return get_media_storage().url(media.file, 'thumb')
+        return None
+
+
+class SwappOfferSummarySerializer(serializers.ModelSerializer):
+    """Compact offer for the inbox/outbox lists; the full offer is at swapp/offers/<id>/."""
+    item = SwappItemSummarySerializer(read_only=True)
+    offered_item = SwappItemSummarySerializer(read_only=True)
+    offered_by = MiniUserSerializer(read_only=True)
+    seller = MiniUserSerializer(source='recipient', read_only=True)
+
+    class Meta:
+        model = SwappOffer
+        fields = [
+            'id', 'status', 'cash_difference', 'is_seen', 'date_created',
+            'item', 'offered_item', 'offered_by', 'seller',
+        ]
+
+
+class SwapCycleLegSerializer(serializers.ModelSerializer):
+    giver = MiniUserSerializer(read_only=True)
+    receiver = MiniUserSerializer(read_only=True)
+    item = SwappItemSummarySerializer(read_only=True)
+
+    class Meta:
+        model = SwapCycleLeg
+        fields = ['position', 'giver', 'receiver', 'item']
+
+
+class SwapCycleSerializer(serializers.ModelSerializer):
+    """A suggested multi-way swap (see core.matching), one leg per hand-over in ring order."""
+    legs = SwapCycleLegSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = SwapCycle
+        fields = ['id', 'length', 'created_at', 'legs']
+
 # -----------------------------
 # Messaging, Groups, Feedback
 # -----------------------------
@@ -187,7 +354,7 @@ class GroupSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Group
-        fields = '__all__'
+        exclude = ['city_key']  # internal index column
 
     def get_is_member(self, obj):
         user = self.context['request'].user
@@ -230,8 +397,62 @@ class PollOptionSerializer(serializers.ModelSerializer):
         fields = ['id', 'text', 'votes_count']
 
     def get_votes_count(self, obj):
+        poll_votes = self.context.get('poll_votes')
+        if poll_votes is not None:
+            return poll_votes.get(obj.id, 0)
         return obj.votes.count()
-    
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Resolves reactions, the requesting user's reactions and poll vote counts for
+    a whole page of posts in a fixed number of grouped queries, and hands the
+    results to each PostSerializer through the shared context.
+    """
+
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        self.resolve(posts)
+        return super().to_representation(posts)
+
+    def resolve(self, posts):
+        post_ids = [post.id for post in posts]
+        summaries = {post_id: {} for post_id in post_ids}
+        user_reactions = {post_id: [] for post_id in post_ids}
+        poll_votes = {}
+
+        if post_ids:
+            counts = (
+                Reaction.objects.filter(post_id__in=post_ids)
+                .values('post_id', 'emoji')
+                .annotate(count=Count('id'))
+                .order_by('post_id', '-count')
+            )
+            for row in counts:
+                summaries[row['post_id']][row['emoji']] = row['count']
+
+            request = self.context.get('request')
+            user = getattr(request, 'user', None)
+            if user and user.is_authenticated:
+                mine = Reaction.objects.filter(post_id__in=post_ids, user=user).values_list('post_id', 'emoji')
+                for post_id, emoji in mine:
+                    user_reactions[post_id].append(emoji)
+
+            prefetch_related_objects(posts, 'poll_options')
+            votes = (
+                PollOption.votes.through.objects.filter(polloption__post_id__in=post_ids)
+                .values('polloption_id')
+                .annotate(count=Count('id'))
+                .order_by()
+            )
+            poll_votes = {row['polloption_id']: row['count'] for row in votes}
+
+        self.context.update({
+            'reaction_summaries': summaries,
+            'user_reactions': user_reactions,
+            'poll_votes': poll_votes,
+        })
+
 
 class PostSerializer(serializers.ModelSerializer):
     poll_options = PollOptionSerializer(many=True, read_only=True)
@@ -240,11 +461,15 @@ class PostSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Post
-        fields = '__all__'
-        read_only_fields = ['reaction_summary', 'user_reactions', 'user', 'city']
+        # city_key and random_key are internal index/sampling columns; random_key would also reveal the random order.
+        exclude = ['city_key', 'random_key']
+        read_only_fields = ['reaction_summary', 'user_reactions', 'user', 'city', 'hot_score', 'views_count']
+        list_serializer_class = PostListSerializer
 
     def get_reaction_summary(self, obj):
-        from django.db.models import Count  # ensure it's imported
+        summaries = self.context.get('reaction_summaries')
+        if summaries is not None and obj.id in summaries:
+            return summaries[obj.id]
 
         summary = (
             obj.reactions.values('emoji')     # ✅ Group by emoji
@@ -253,16 +478,11 @@ class PostSerializer(serializers.ModelSerializer):
         )
         return {entry['emoji']: entry['count'] for entry in summary}
 
-
     def get_user_reactions(self, obj):
-        request = self.context.get('request')
-        user = request.user if request else None
-        if user and user.is_authenticated:
-            return list(obj.reactions.filter(user=user).values_list('emoji', flat=True))
-        return []
-
+        resolved = self.context.get('user_reactions')
+        if resolved is not None and obj.id in resolved:
+            return resolved[obj.id]
 
-    def get_user_reactions(self, obj):
         user = self.context.get('request') and self.context['request'].user
         if user and user.is_authenticated:
             return list(obj.reactions.filter(user=user).values_list('emoji', flat=True))
@@ -273,6 +493,14 @@ class ReactionSerializer(serializers.ModelSerializer):
         model = Reaction
         fields = ['post', 'emoji']
 
+class ReactionBatchItemSerializer(serializers.Serializer):
+    post = serializers.IntegerField()
+    emoji = serializers.CharField(max_length=10)
+    action = serializers.ChoiceField(choices=['toggle', 'add', 'remove'], default='toggle')
+
+class ReactionBatchSerializer(serializers.Serializer):
+    reactions = ReactionBatchItemSerializer(many=True, allow_empty=False, max_length=100)
+
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
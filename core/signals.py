@@ -0,0 +1,97 @@
+from collections import Counter
+
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_city_version
+from .matching import listing_changed, offer_changed
+from .models import Comment, Event, MarketplaceItem, Post, PostEngagement, Reaction, SwappOffer
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=MarketplaceItem)
+def invalidate_city_feeds(sender, instance, **kwargs):
+    bump_city_version(instance.city)
+
+
+@receiver([post_save, post_delete], sender=Reaction)
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_post_city_feeds(sender, instance, **kwargs):
+    city = Post.objects.filter(pk=instance.post_id).values_list('city', flat=True).first()
+    bump_city_version(city)
+
+
+@receiver(post_save, sender=Post)
+def create_post_engagement(sender, instance, created, **kwargs):
+    if created:
+        PostEngagement.objects.get_or_create(post=instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') + 1)
+        PostEngagement.record(instance.post_id, instance.user_id, comments=1, when=instance.created_at)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') - 1)
+    PostEngagement.record(instance.post_id, instance.user_id, comments=-1)
+
+
+@receiver(post_save, sender=Reaction)
+def reaction_created(sender, instance, created, **kwargs):
+    if created:
+        Post.bump_hot_score(instance.post_id, instance.emoji, 1)
+        PostEngagement.record(instance.post_id, instance.user_id, reactions=1, when=instance.created_at)
+
+
+@receiver(post_delete, sender=Reaction)
+def reaction_deleted(sender, instance, **kwargs):
+    Post.bump_hot_score(instance.post_id, instance.emoji, -1)
+    PostEngagement.record(instance.post_id, instance.user_id, reactions=-1)
+
+
+@receiver(post_save, sender=SwappOffer)
+def swapp_offer_saved(sender, instance, **kwargs):
+    offer_changed(instance)
+
+
+@receiver(post_save, sender=MarketplaceItem)
+def marketplace_item_saved(sender, instance, **kwargs):
+    listing_changed(instance)
+
+
+def _rsvp_rows(through, instance, reverse, pk_set):
+    rows = through.objects.filter(user_id=instance.pk) if reverse else through.objects.filter(event_id=instance.pk)
+    if pk_set is not None:
+        rows = rows.filter(**{'event_id__in' if reverse else 'user_id__in': pk_set})
+    return rows
+
+
+@receiver(m2m_changed, sender=Event.rsvps.through)
+def event_rsvps_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep Event.rsvp_count in step with the rsvps table, from either side of
+    the relation. Counts move by relative UPDATEs in the same transaction, so
+    concurrent RSVPs never overwrite each other.
+    """
+    if action in ('pre_remove', 'pre_clear'):
+        # Only rows that actually exist are removed; remember them before they go.
+        instance._rsvps_leaving = Counter(_rsvp_rows(sender, instance, reverse, pk_set).values_list('event_id', flat=True))
+        return
+    if action == 'post_add':
+        # Django passes only the ids it actually inserted.
+        deltas = Counter(pk_set) if reverse else {instance.pk: len(pk_set)}
+    elif action in ('post_remove', 'post_clear'):
+        deltas = {event_id: -count for event_id, count in instance.__dict__.pop('_rsvps_leaving', {}).items()}
+    else:
+        return
+    if not deltas:
+        return
+    Event.bump_rsvp_counts(deltas)
+    for city in Event.objects.filter(pk__in=list(deltas)).values_list('city', flat=True).distinct():
+        bump_city_version(city)
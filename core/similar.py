@@ -0,0 +1,240 @@
+import re
+import threading
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+from scipy import sparse
+
+from .models import MarketplaceItem, normalize_city
+
+# Feature hashing keeps the column space fixed, so listings added after a build never need a new vocabulary.
+N_FEATURES = 2 ** 20
+TITLE_WEIGHT = 2  # title terms are counted twice
+CATEGORY_WEIGHT = 2
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the this to was were will with '
+    'you your i my me we our new used good great very'.split()
+)
+# Rebuild from scratch (fresh IDF, no dead rows) once this share of the index has changed since the last build.
+REBUILD_RATIO = 0.2
+# Rows written by a transaction that committed late can carry an older updated_at than ones already seen.
+SYNC_SLACK = timedelta(seconds=60)
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) > 1 and token not in STOP_WORDS]
+
+
+def listing_terms(title, description, category):
+    terms = tokenize(title or '') * TITLE_WEIGHT + tokenize(description or '')
+    if category:
+        terms += [f'category={category.strip().lower()}'] * CATEGORY_WEIGHT
+    return terms
+
+
+def term_columns(terms):
+    return np.fromiter((zlib.crc32(term.encode()) % N_FEATURES for term in terms), dtype=np.int32, count=len(terms))
+
+
+def term_frequencies(rows):
+    """
+    Sparse sublinear term-frequency matrix (1 + log tf) for an iterable of
+    (title, description, category), one row per listing.
+    """
+    indptr, indices = [0], []
+    for title, description, category in rows:
+        columns = term_columns(listing_terms(title, description, category))
+        indices.append(columns)
+        indptr.append(indptr[-1] + len(columns))
+    indices = np.concatenate(indices) if indices else np.empty(0, dtype=np.int32)
+    counts = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32), indices, np.array(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, N_FEATURES),
+    )
+    counts.sum_duplicates()
+    counts.data = 1 + np.log(counts.data)
+    return counts
+
+
+def l2_normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(matrix.dtype)
+    return matrix
+
+
+class SimilarityIndex:
+    """
+    TF-IDF vectors for one city's available listings, scored by cosine
+    similarity. The main matrix is CSC so a query only touches the columns of
+    its own terms. Listings that change after a build are appended to a
+    small buffer matrix (their old row is masked out) until enough of the
+    index has changed to warrant a rebuild.
+    """
+
+    def __init__(self, pks, tf):
+        n = len(pks)
+        df = np.bincount(tf.indices, minlength=N_FEATURES)
+        self.idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        self.matrix = l2_normalize(self.weigh(tf)).tocsc()
+        self.pks = np.asarray(pks, dtype=np.int64)
+        self.row_of = {pk: row for row, pk in enumerate(pks)}
+        self.alive = np.ones(n, dtype=bool)
+        self.buffer = {}  # pk -> (columns, values) for listings changed since the build
+        self._buffer_matrix = None
+        self.changed = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, rows):
+        """`rows` is an iterable of (pk, title, description, category)."""
+        rows = list(rows)
+        return cls([row[0] for row in rows], term_frequencies(row[1:] for row in rows))
+
+    def weigh(self, tf):
+        # Scale the stored values in place; broadcasting against the dense idf vector would copy 2**20 floats.
+        tf.data *= self.idf[tf.indices]
+        return tf
+
+    def vectorize(self, title, description, category):
+        vector = l2_normalize(self.weigh(term_frequencies([(title, description, category)])))
+        return vector.indices, vector.data
+
+    def upsert(self, pk, title, description, category):
+        with self.lock:
+            self._discard(pk)
+            self.buffer[pk] = self.vectorize(title, description, category)
+            self._buffer_matrix = None
+            self.changed += 1
+
+    def remove(self, pk):
+        with self.lock:
+            if self._discard(pk):
+                self.changed += 1
+
+    def _discard(self, pk):
+        row = self.row_of.get(pk)
+        found = row is not None and self.alive[row]
+        if found:
+            self.alive[row] = False
+        if self.buffer.pop(pk, None) is not None:
+            self._buffer_matrix = None
+            found = True
+        return found
+
+    def needs_rebuild(self):
+        return self.changed > REBUILD_RATIO * max(len(self.pks), 100)
+
+    def _buffered(self):
+        if self._buffer_matrix is None:
+            pks = list(self.buffer)
+            indptr = np.cumsum([0] + [len(self.buffer[pk][0]) for pk in pks])
+            indices = np.concatenate([self.buffer[pk][0] for pk in pks]) if pks else np.empty(0, dtype=np.int32)
+            data = np.concatenate([self.buffer[pk][1] for pk in pks]) if pks else np.empty(0, dtype=np.float32)
+            self._buffer_matrix = (
+                np.asarray(pks, dtype=np.int64),
+                sparse.csr_matrix((data, indices, indptr), shape=(len(pks), N_FEATURES)).tocsc(),
+            )
+        return self._buffer_matrix
+
+    def query(self, columns, values, k=10, exclude=None):
+        """Top-k (pk, score) by cosine similarity to the normalized vector (columns, values)."""
+        with self.lock:
+            # Only the query's own term columns can contribute to a dot product.
+            scores = self.matrix[:, columns] @ values
+            scores[~self.alive] = 0
+            buffer_pks, buffer_matrix = self._buffered()
+            buffer_scores = buffer_matrix[:, columns] @ values if len(buffer_pks) else np.empty(0, dtype=np.float32)
+
+        pks = np.concatenate([self.pks, buffer_pks])
+        scores = np.concatenate([np.asarray(scores).ravel(), buffer_scores])
+        if exclude is not None:
+            scores[pks == exclude] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(pks[i]), float(scores[i])) for i in candidates]
+
+
+def indexed_listings(city_key):
+    return MarketplaceItem.objects.filter(
+        Q(expiry_date__isnull=True) | Q(expiry_date__gte=timezone.localdate()),
+        city_key=city_key, status='available',
+    )
+
+
+class CityIndexes:
+    """
+    Per-process registry of SimilarityIndex objects, built lazily per city.
+    Before each query the city's index catches up with listings whose
+    updated_at moved since its last sync, so every worker process converges
+    without cross-process signalling. Each city has its own lock, so a cold
+    build in one city never holds up lookups in another.
+    """
+
+    def __init__(self):
+        self.indexes = {}
+        self.synced = {}  # city_key -> (updated_at high-water mark, {pk: updated_at})
+        self.city_locks = {}
+        self.lock = threading.Lock()  # guards city_locks only
+
+    def city_lock(self, city_key):
+        with self.lock:
+            return self.city_locks.setdefault(city_key, threading.Lock())
+
+    def build(self, city_key):
+        rows = list(indexed_listings(city_key).values_list('pk', 'title', 'description', 'category', 'updated_at'))
+        index = SimilarityIndex.build(row[:4] for row in rows)
+        seen = {row[0]: row[4] for row in rows}
+        self.indexes[city_key] = index
+        self.synced[city_key] = (max(seen.values(), default=timezone.now()), seen)
+        return index
+
+    def sync(self, city_key):
+        index = self.indexes[city_key]
+        high_water, seen = self.synced[city_key]
+        changed = (
+            MarketplaceItem.objects.filter(city_key=city_key, updated_at__gte=high_water - SYNC_SLACK)
+            .values_list('pk', 'title', 'description', 'category', 'status', 'expiry_date', 'updated_at')
+        )
+        today = timezone.localdate()
+        for pk, title, description, category, status, expiry_date, updated_at in changed:
+            if seen.get(pk) == updated_at:
+                continue
+            seen[pk] = updated_at
+            high_water = max(high_water, updated_at)
+            if status == 'available' and (expiry_date is None or expiry_date >= today):
+                index.upsert(pk, title, description, category)
+            else:
+                index.remove(pk)
+        self.synced[city_key] = (high_water, seen)
+        return index
+
+    def get(self, city_key):
+        with self.city_lock(city_key):
+            if city_key not in self.indexes:
+                return self.build(city_key)
+            index = self.sync(city_key)
+            if index.needs_rebuild():
+                return self.build(city_key)
+            return index
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+            self.synced.clear()
+
+
+city_indexes = CityIndexes()
+
+
+def similar_listings(item, k=10):
+    """[(pk, score)] for the available listings in `item`'s city most similar to it, best first."""
+    index = city_indexes.get(normalize_city(item.city))
+    columns, values = index.vectorize(item.title, item.description, item.category)
+    return index.query(columns, values, k=k, exclude=item.pk)
@@ -0,0 +1,184 @@
+from django.db import transaction
+from django.db.models import F, Prefetch, Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from .cache import bump_city_version
+from .models import MarketplaceItem, MarketplaceMedia, Notification, SwappOffer, User
+
+# Offers the seller can still act on; accepted and declined are final.
+OPEN_STATUSES = ('pending', 'countered')
+# Seller replies the buyer has not looked at yet count towards the outbox badge.
+REPLY_STATUSES = ('accepted', 'declined', 'countered')
+OFFER_BOXES = ('inbox', 'outbox')
+ACCEPT_XP = 20
+OFFERS_LINK = '/my-swapps'
+
+
+class OfferError(Exception):
+    """A swap action that cannot be applied; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _notification(user_id, content):
+    return Notification(user_id=user_id, content=content[:255], link=OFFERS_LINK)
+
+
+def _locked_open_offer(offer_id, user):
+    # of=('self',) keeps the joined item unlocked, so a decline never waits on (or deadlocks with) an accept.
+    offer = get_object_or_404(SwappOffer.objects.select_for_update(of=('self',)).select_related('item'), pk=offer_id)
+    if offer.item.seller_id != user.pk:
+        raise OfferError('You are not the seller of this item.', status=403)
+    if offer.status not in OPEN_STATUSES:
+        raise OfferError(f'This offer has already been {offer.status}.', status=409)
+    return offer
+
+
+def accept_offer(offer_id, user):
+    """
+    Accept an offer in one transaction: lock both items (in pk order), mark
+    them traded, accept the offer, decline every other open offer that
+    involves either item in a single UPDATE, award XP to both parties and
+    queue the notifications. Raises OfferError if the offer or an item is no
+    longer available; nothing is written in that case.
+    """
+    with transaction.atomic():
+        offer = get_object_or_404(SwappOffer.objects.select_related('item'), pk=offer_id)
+        if offer.item.seller_id != user.pk:
+            raise OfferError('You are not the seller of this item.', status=403)
+
+        item_ids = sorted({offer.item_id, offer.offered_item_id} - {None})
+        items = {
+            item.pk: item
+            for item in MarketplaceItem.objects.select_for_update().filter(pk__in=item_ids).order_by('pk')
+        }
+        # Re-read the offer now that the items are locked: a competing accept may have just declined it.
+        offer = _locked_open_offer(offer_id, user)
+        item = items[offer.item_id]
+        if item.status != 'available':
+            raise OfferError('This item is no longer available.', status=409)
+        offered_item = items.get(offer.offered_item_id)
+        if offered_item is not None and (
+            offered_item.status != 'available' or offered_item.seller_id != offer.offered_by_id
+        ):
+            raise OfferError('The offered item is no longer available.', status=409)
+
+        # The status condition is the real guard where SELECT ... FOR UPDATE is a no-op (SQLite).
+        traded = MarketplaceItem.objects.filter(pk__in=item_ids, status='available').update(
+            status='traded', updated_at=timezone.now(),
+        )
+        if traded != len(item_ids):
+            raise OfferError('This item is no longer available.', status=409)
+        SwappOffer.objects.filter(pk=offer.pk).update(status='accepted', is_seen=False)
+        offer.status, offer.is_seen = 'accepted', False
+
+        competing = list(
+            SwappOffer.objects.select_for_update(of=('self',))
+            .filter(Q(item_id__in=item_ids) | Q(offered_item_id__in=item_ids), status__in=OPEN_STATUSES)
+            .exclude(pk=offer.pk)
+            .values_list('pk', 'offered_by_id', 'item_id', 'item__seller_id', 'item__title')
+        )
+        if competing:
+            SwappOffer.objects.filter(pk__in=[row[0] for row in competing]).update(status='declined', is_seen=False)
+
+        User.objects.filter(pk__in={user.pk, offer.offered_by_id}).update(xp=F('xp') + ACCEPT_XP)
+
+        notifications = [
+            _notification(offer.offered_by_id, f'{user.username} accepted your Swapp offer on "{item.title}".'),
+        ]
+        for _, offered_by_id, item_id, seller_id, title in competing:
+            if item_id in items:
+                notifications.append(_notification(
+                    offered_by_id, f'Your Swapp offer on "{title}" was declined: the item has been traded.',
+                ))
+            else:
+                notifications.append(_notification(
+                    seller_id, f'A Swapp offer on "{title}" was withdrawn: the offered item has been traded.',
+                ))
+        Notification.objects.bulk_create(notifications)
+
+    # update() skips the signals that normally invalidate cached feed pages.
+    for city in {listing.city for listing in items.values()}:
+        bump_city_version(city)
+    return offer, len(competing)
+
+
+def decline_offer(offer_id, user):
+    with transaction.atomic():
+        offer = _locked_open_offer(offer_id, user)
+        offer.status, offer.is_seen = 'declined', False
+        offer.save(update_fields=['status', 'is_seen'])
+        Notification.objects.create(
+            user_id=offer.offered_by_id, link=OFFERS_LINK,
+            content=f'Your Swapp offer on "{offer.item.title}" was declined.'[:255],
+        )
+    return offer
+
+
+def counter_offer(offer_id, user, cash_difference=None, message=None):
+    """Counter an open offer; a `cash_difference` or `message` of None keeps the current value."""
+    with transaction.atomic():
+        offer = _locked_open_offer(offer_id, user)
+        offer.status, offer.is_seen = 'countered', False
+        if cash_difference is not None:
+            offer.cash_difference = cash_difference
+        if message is not None:
+            offer.message = message
+        offer.save(update_fields=['status', 'is_seen', 'cash_difference', 'message'])
+        Notification.objects.create(
+            user_id=offer.offered_by_id, link=OFFERS_LINK,
+            content=f'{user.username} countered your Swapp offer on "{offer.item.title}".'[:255],
+        )
+    return offer
+
+
+def apply_offer_action(offer_id, user, action, data):
+    """Dispatch an 'accept' / 'decline' / 'counter' action with its request data; returns the offer."""
+    if action == 'accept':
+        return accept_offer(offer_id, user)[0]
+    if action == 'decline':
+        return decline_offer(offer_id, user)
+    if action == 'counter':
+        return counter_offer(offer_id, user, data.get('cash_difference'), data.get('message'))
+    raise OfferError('Invalid action.')
+
+
+def offer_box(user, box):
+    """Offers received by `user` ('inbox') or made by `user` ('outbox'), newest first."""
+    offers = SwappOffer.objects.filter(recipient=user) if box == 'inbox' else SwappOffer.objects.filter(offered_by=user)
+    return offers.order_by('-date_created')
+
+
+def offer_summaries(offers):
+    """`offers` with everything SwappOfferSummarySerializer reads, in a fixed number of queries."""
+    ready_media = MarketplaceMedia.objects.filter(status=MarketplaceMedia.READY).order_by('pk')
+    return offers.select_related('item', 'offered_item', 'offered_by', 'recipient').prefetch_related(
+        Prefetch('item__media', queryset=ready_media),
+        Prefetch('offered_item__media', queryset=ready_media),
+    )
+
+
+def unseen_offers(user, box):
+    """
+    New offers the seller has not seen ('inbox') and seller replies the buyer
+    has not seen ('outbox'); each is served by a partial index on is_seen=False.
+    """
+    if box == 'inbox':
+        return SwappOffer.objects.filter(recipient=user, is_seen=False, status='pending')
+    return SwappOffer.objects.filter(offered_by=user, is_seen=False, status__in=REPLY_STATUSES)
+
+
+def unseen_counts(user):
+    return {box: unseen_offers(user, box).count() for box in OFFER_BOXES}
+
+
+def mark_seen(user, box, ids=None):
+    """Mark the unseen offers in `box` (optionally only `ids`) as seen; returns how many changed."""
+    offers = unseen_offers(user, box)
+    if ids is not None:
+        offers = offers.filter(pk__in=ids)
+    return offers.update(is_seen=True)
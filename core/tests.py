@@ -1,3 +1,1162 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from cloudinary.utils import cloudinary_url
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .bulk import IMPORT_BATCH_SIZE, ListingImport
+from .cache import get_city_version
+from .models import (
+    User, Post, Comment, Event, Group, EventWaitlistEntry, PollOption, PostEngagement, PostParticipant, Reaction,
+    MarketplaceItem, MarketplaceMedia, Notification, SwapCycle, SwappOffer, TrendingRank,
+)
+from .counters import BufferedCounter, post_views
+from .imaging import DERIVATIVE_FORMATS, generate_derivatives, process_image
+from .ingest import LocalMediaStorage, _load_storage, ingest_media, stage_upload
+from .lifecycle import expire_listings
+from .matching import WantGraph, rebuild_city
+from .media import MEDIA_PRESETS, media_srcset, media_url
+from .pagination import FeedPagination
+from .ranking import recompute_trending
+from .rsvps import ATTENDING, WAITLISTED, join_event, leave_event
+from .search import get_search_backend
+from .similar import CityIndexes, SimilarityIndex, city_indexes
+from .swaps import ACCEPT_XP, OfferError, accept_offer, decline_offer
+from .views import CommentListCreateView
+
+
+class PostFeedQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pass', city='toronto')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                user=self.user, title=f'Post {i}', content='...', post_type='discussion', city='toronto',
+            )
+            Reaction.objects.create(user=self.user, post=post, emoji='👍')
+            for text in ('yes', 'no'):
+                option = PollOption.objects.create(post=post, text=text)
+                option.votes.add(self.user)
+
+    def count_feed_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/', {'city': 'toronto'})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_query_count_is_constant_in_page_size(self):
+        self.make_posts(2)
+        small, _ = self.count_feed_queries()
+        self.make_posts(8)
+        large, results = self.count_feed_queries()
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(small, large)
+        self.assertEqual(results[0]['reaction_summary'], {'👍': 1})
+        self.assertNotIn('city_key', results[0])
+        self.assertNotIn('random_key', results[0])
+        self.assertEqual(results[0]['user_reactions'], ['👍'])
+        self.assertEqual([o['votes_count'] for o in results[0]['poll_options']], [1, 1])
+
+
+class FeedCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pager', password='pass', city='toronto')
+        # Pairs of posts share a created_at, so the pk tie-breaker is exercised too.
+        now = timezone.now()
+        for i in range(24):
+            post = Post.objects.create(
+                user=self.user, title=f'Post {i}', content='...', post_type='discussion', city='toronto',
+                hot_score=i % 5,
+            )
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(minutes=i // 2))
+        self.client = APIClient()
+
+    def walk(self, params):
+        url, seen = '/api/posts/', []
+        params = {'city': 'toronto', 'cursor': '', **params}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen += [post['id'] for post in response.data['results']]
+            url, params = response.data['next'], None
+        return seen
+
+    def test_cursor_pages_cover_the_feed_once_in_order(self):
+        for sort, ordering in (('new', ('-created_at', '-id')), ('hottest', ('-hot_score', '-created_at', '-id'))):
+            with self.subTest(sort=sort):
+                expected = list(Post.objects.order_by(*ordering).values_list('pk', flat=True))
+                self.assertEqual(self.walk({'sort': sort}), expected)
+
+        seen = self.walk({'sort': 'random', 'seed': 'abc'})
+        self.assertEqual(sorted(seen), sorted(Post.objects.values_list('pk', flat=True)))
+        self.assertEqual(seen, self.walk({'sort': 'random', 'seed': 'abc'}))
+
+    def test_tampered_cursors_are_rejected(self):
+        encode = FeedPagination().encode_cursor
+        tampered = {
+            'new': [['notadate', 5], [None, None], [[1], [2]], ['2026-01-01T00:00:00Z', 'x'], [1, 2, 3]],
+            'hottest': [['NaN', '2026-01-01T00:00:00Z', 1], [True, '2026-01-01T00:00:00Z', 1]],
+            'random': [[1, 0.5, 3], [False, 'x', 3], [False, 0.5, None]],
+        }
+        for sort, positions in tampered.items():
+            for position in positions:
+                with self.subTest(sort=sort, position=position):
+                    response = self.client.get('/api/posts/', {'sort': sort, 'cursor': encode(position)})
+                    self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/posts/', {'cursor': 'not base64 json!'})
+        self.assertEqual(response.status_code, 404)
+
+
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('searcher', password='pass', city='toronto')
+        self.titled = Post.objects.create(
+            user=self.user, title='Community garden opening', content='Bring gloves.', post_type='discussion',
+            city='toronto',
+        )
+        # Identical bodies tie on rank, so paging also has to fall through to created_at and id.
+        for i in range(22):
+            Post.objects.create(
+                user=self.user, title=f'Weekend {i}', content='garden ' * (1 + i % 3) + 'tools and seeds',
+                post_type='discussion', city='toronto',
+            )
+        Post.objects.create(user=self.user, title='Bike lanes', content='...', post_type='discussion', city='toronto')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        url, params, seen = '/api/posts/', {'city': 'toronto', 'search': query, 'cursor': ''}, []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen += [post['id'] for post in response.data['results']]
+            url, params = response.data['next'], None
+        return seen
+
+    def test_results_are_ranked_matches(self):
+        self.assertEqual(self.search('GARDENS'), [])
+        self.assertEqual(self.search('bike'), [Post.objects.get(title='Bike lanes').pk])
+        self.assertEqual(self.search('"garden" OR *'), [])
+
+        # A title match outranks every body match.
+        results = self.search('garden')
+        self.assertEqual(len(results), 23)
+        self.assertEqual(results[0], self.titled.pk)
+
+    def test_cursor_pages_follow_rank(self):
+        expected = list(
+            get_search_backend().search(Post.objects.all(), 'garden')
+            .order_by('-rank', '-created_at', '-id').values_list('pk', flat=True)
+        )
+        self.assertEqual(self.search('garden'), expected)
+
+    def test_edited_and_deleted_posts_drop_out(self):
+        self.titled.title = 'Community orchard opening'
+        self.titled.save()
+        self.assertNotIn(self.titled.pk, self.search('garden'))
+        self.assertEqual(self.search('orchard'), [self.titled.pk])
+
+        self.titled.delete()
+        self.assertEqual(self.search('orchard'), [])
+
+
+class CityFeedCacheTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('poster', password='pass', city='toronto')
+        for i in range(3):
+            Post.objects.create(user=user, title=f'Post {i}', content='...', post_type='discussion', city='toronto')
+        self.client = APIClient()
+
+    def get(self, **params):
+        response = self.client.get('/api/posts/', {'city': 'toronto', **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_anonymous_pages_are_cached_until_the_city_changes(self):
+        self.assertEqual(self.get()['X-Feed-Cache'], 'miss')
+        self.assertEqual(self.get()['X-Feed-Cache'], 'hit')
+        Post.objects.create(
+            user=User.objects.get(), title='New', content='...', post_type='discussion', city='Toronto',
+        )
+        self.assertEqual(self.get()['X-Feed-Cache'], 'miss')
+
+    def test_unseeded_random_pages_are_not_cached(self):
+        first, second = self.get(sort='random'), self.get(sort='random')
+        self.assertNotIn('X-Feed-Cache', first)
+        self.assertNotIn('X-Feed-Cache', second)
+        self.assertNotEqual(first.data['seed'], second.data['seed'])
+
+        self.assertEqual(self.get(sort='random', seed='abc')['X-Feed-Cache'], 'miss')
+        self.assertEqual(self.get(sort='random', seed='abc')['X-Feed-Cache'], 'hit')
+
+
+class HotScoreTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'fan{i}', password='pass', city='toronto') for i in range(3)]
+        self.quiet, self.loved = [
+            Post.objects.create(user=self.users[0], title=title, content='...', post_type='discussion', city='toronto')
+            for title in ('Quiet', 'Loved')
+        ]
+
+    def hot_scores(self):
+        return list(Post.objects.order_by('pk').values_list('hot_score', flat=True))
+
+    def test_reactions_keep_hot_score_and_hottest_order(self):
+        for user in self.users:
+            Reaction.objects.create(user=user, post=self.loved, emoji='❤️')
+        Reaction.objects.create(user=self.users[0], post=self.quiet, emoji='👍')
+        Reaction.objects.create(user=self.users[1], post=self.quiet, emoji='👎')
+        Reaction.objects.create(user=self.users[2], post=self.quiet, emoji='🎉')
+        self.assertEqual(self.hot_scores(), [0, 6])
+
+        Reaction.objects.filter(post=self.loved, user=self.users[0]).delete()
+        self.assertEqual(self.hot_scores(), [0, 4])
+
+        response = APIClient().get('/api/posts/', {'city': 'toronto', 'sort': 'hottest'})
+        self.assertEqual([post['id'] for post in response.data['results']], [self.loved.pk, self.quiet.pk])
+
+    def test_rebuild_recomputes_drifted_scores(self):
+        Reaction.objects.create(user=self.users[0], post=self.loved, emoji='❤️')
+        Post.objects.update(hot_score=42)
+        call_command('rebuild_hot_scores', stdout=StringIO())
+        self.assertEqual(self.hot_scores(), [0, 2])
+
+
+class ReactionToggleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reactor', password='pass', city='toronto')
+        self.post = Post.objects.create(
+            user=self.user, title='Post', content='...', post_type='discussion', city='toronto',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def toggle(self, emoji='❤️'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/reactions/', {'post': self.post.pk, 'emoji': emoji})
+        self.assertEqual(response.status_code, 201)
+        return len(queries)
+
+    def engagement(self):
+        self.post.refresh_from_db()
+        engagement = PostEngagement.objects.get(post=self.post)
+        return self.post.hot_score, engagement.reaction_count, engagement.participant_count
+
+    def test_toggle_keeps_counters_in_step_without_recounting(self):
+        added = self.toggle()
+        self.assertEqual(self.engagement(), (2, 1, 1))
+        # A second reaction from the same user is not a second participant.
+        self.toggle('👍')
+        self.assertEqual(self.engagement(), (3, 2, 1))
+        removed = self.toggle()
+        self.assertEqual(self.engagement(), (1, 1, 1))
+        self.toggle('👍')
+        self.assertEqual(self.engagement(), (0, 0, 0))
+        self.assertFalse(Reaction.objects.exists())
+
+        # Post lookup, BEGIN, reaction insert (+ delete), participant upsert, engagement, hot_score, COMMIT.
+        self.assertEqual(added, 7)
+        self.assertEqual(removed, 8)
+
+    def test_participants_span_comments_and_reactions(self):
+        self.toggle()
+        comment = Comment.objects.create(post=self.post, user=self.user, content='hi')
+        self.assertEqual(self.engagement()[1:], (1, 1))
+        self.toggle()
+        self.assertEqual(self.engagement()[1:], (0, 1))
+        comment.delete()
+        self.assertEqual(self.engagement()[1:], (0, 0))
+
+        PostEngagement.objects.filter(post=self.post).update(participant_count=9)
+        PostEngagement.rebuild([self.post.pk])
+        self.assertEqual(self.engagement()[1:], (0, 0))
+
+
+class HighlightsFeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('talker', password='pass', city='toronto')
+        self.silent, self.busy, self.liked = [
+            Post.objects.create(user=self.user, title=title, content='...', post_type='discussion', city='toronto')
+            for title in ('Silent', 'Busy', 'Liked')
+        ]
+        for text in ('one', 'two', 'three'):
+            Comment.objects.create(post=self.busy, user=self.user, content=text)
+        Reaction.objects.create(user=self.user, post=self.liked, emoji='👍')
+
+    def highlights(self):
+        response = APIClient().get('/api/posts/', {'city': 'toronto', 'sort': 'highlights'})
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']]
+
+    def test_highlights_rank_by_engagement(self):
+        self.assertEqual(self.highlights(), [self.busy.pk, self.liked.pk, self.silent.pk])
+        engagement = PostEngagement.objects.get(post=self.busy)
+        self.assertEqual((engagement.comment_count, engagement.score, engagement.participant_count), (3, 3, 1))
+
+    def test_reconcile_repairs_drifted_rollups(self):
+        PostEngagement.objects.filter(post=self.liked).update(reaction_count=50, score=50)
+        PostEngagement.objects.filter(post=self.busy).delete()
+        call_command('reconcile_engagement', batch_size=2, stdout=StringIO())
+
+        rollups = {e.post_id: (e.comment_count, e.reaction_count, e.score) for e in PostEngagement.objects.all()}
+        self.assertEqual(rollups, {self.silent.pk: (0, 0, 0), self.busy.pk: (3, 0, 3), self.liked.pk: (0, 1, 1)})
+
+
+class TrendingRankTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('trender', password='pass', city='toronto')
+        now = timezone.now()
+        self.posts = {}
+        for title, city, hot_score, age in (
+            ('Fresh', 'toronto', 2, timedelta(0)),
+            ('Yesterday', 'toronto', 20, timedelta(days=1)),
+            ('Ancient', 'toronto', 500, timedelta(days=30)),
+            ('Elsewhere', 'ottawa', 5, timedelta(0)),
+        ):
+            post = Post.objects.create(
+                user=user, title=title, content='...', post_type='discussion', city=city, hot_score=hot_score,
+            )
+            Post.objects.filter(pk=post.pk).update(created_at=now - age)
+            self.posts[title] = post.pk
+
+    def trending(self):
+        response = APIClient().get('/api/posts/', {'city': 'toronto', 'sort': 'trending'})
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']]
+
+    def test_recent_activity_outranks_older_points(self):
+        self.assertEqual(recompute_trending(batch_size=1), {'ottawa': 1, 'toronto': 2})
+        self.assertEqual(self.trending(), [self.posts['Fresh'], self.posts['Yesterday']])
+
+    def test_posts_leaving_the_window_are_dropped(self):
+        recompute_trending()
+        self.assertEqual(recompute_trending(now=timezone.now() + timedelta(days=20)), {'ottawa': 0, 'toronto': 0})
+        self.assertFalse(TrendingRank.objects.exists())
+        self.assertEqual(self.trending(), [])
+
+
+class PostParticipantTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('joiner', password='pass', city='toronto')
+        self.post = Post.objects.create(
+            user=self.user, title='Post', content='...', post_type='discussion', city='toronto',
+        )
+
+    def test_increment_between_decrement_statements_is_not_lost(self):
+        self.assertEqual(PostParticipant.touch(self.post.pk, self.user.pk, 1), 1)
+        interleaved = []
+
+        def after_missed_update(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith('UPDATE') and 'participant' in sql and not interleaved:
+                # A comment lands right after the decrement's UPDATE found nothing above 1.
+                interleaved.append(PostParticipant.touch(self.post.pk, self.user.pk, 1))
+            return result
+
+        with connection.execute_wrapper(after_missed_update):
+            left = PostParticipant.touch(self.post.pk, self.user.pk, -1)
+
+        self.assertEqual(interleaved, [0])
+        self.assertEqual(left, 0)
+        self.assertEqual(PostParticipant.objects.get(post=self.post, user=self.user).activity, 1)
+
+        self.assertEqual(PostParticipant.touch(self.post.pk, self.user.pk, -1), -1)
+        self.assertFalse(PostParticipant.objects.exists())
+        self.assertEqual(PostParticipant.touch(self.post.pk, self.user.pk, -1), 0)
+
+
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('talker', password='pass', city='toronto')
+        self.post = Post.objects.create(
+            user=self.user, title='Post', content='...', post_type='discussion', city='toronto',
+        )
+        self.root = self.comment('root')
+        # A deep chain under the first reply, and more direct replies than one page shows.
+        self.chain = [self.comment('chain 0', self.root)]
+        for i in range(1, 6):
+            self.chain.append(self.comment(f'chain {i}', self.chain[-1]))
+        self.siblings = [self.comment(f'sibling {i}', self.root) for i in range(7)]
+        self.client = APIClient()
+
+    def comment(self, content, parent=None):
+        return Comment.objects.create(post=self.post, user=self.user, content=content, parent=parent)
+
+    def get(self, url=None, **params):
+        url = url or f'/api/posts/{self.post.pk}/comments/'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], len(queries)
+
+    def test_max_depth_truncates_the_tree(self):
+        results, _ = self.get(max_depth=2)
+        root = results[0]
+        self.assertEqual(root['reply_count'], 8)
+        chain0 = root['replies'][0]
+        chain1 = chain0['replies'][0]
+        self.assertEqual(chain1['content'], 'chain 1')
+        self.assertEqual(chain1['replies'], [])
+        self.assertEqual(chain1['reply_count'], 1)
+        self.assertIn(f'parent={chain1["id"]}', chain1['more_replies'])
+
+        results, _ = self.get(max_depth=0)
+        self.assertEqual(results[0]['replies'], [])
+        self.assertEqual(results[0]['reply_count'], 8)
+
+    def test_more_replies_continues_after_the_shown_replies(self):
+        results, _ = self.get(max_depth=1)
+        root = results[0]
+        shown = [reply['content'] for reply in root['replies']]
+        self.assertEqual(shown, ['chain 0'] + [f'sibling {i}' for i in range(4)])
+
+        rest, _ = self.get(root['more_replies'])
+        self.assertEqual([reply['content'] for reply in rest], [f'sibling {i}' for i in range(4, 7)])
+        self.assertTrue(all(reply['more_replies'] is None for reply in rest))
+
+    def test_parent_fetches_a_subtree(self):
+        results, _ = self.get(parent=self.chain[2].pk, max_depth=2)
+        self.assertEqual([c['content'] for c in results], ['chain 3'])
+        chain4 = results[0]['replies'][0]
+        self.assertEqual(chain4['content'], 'chain 4')
+        self.assertEqual([c['content'] for c in chain4['replies']], ['chain 5'])
+        self.assertEqual(chain4['replies'][0]['replies'], [])
+        self.assertIsNone(chain4['replies'][0]['more_replies'])
+
+        response = self.client.get(f'/api/posts/{self.post.pk}/comments/', {'parent': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_queries_and_rows_are_bounded_by_the_page_not_the_thread(self):
+        _, small = self.get(max_depth=1)
+        for i in range(50):
+            self.comment(f'extra {i}', self.root)
+        results, large = self.get(max_depth=1)
+        self.assertEqual(small, large)
+        self.assertEqual(results[0]['reply_count'], 58)
+        self.assertEqual(len(results[0]['replies']), CommentListCreateView.REPLIES_PER_COMMENT)
+
+
+class MarketplaceFeedQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pass', city='toronto')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_items(self, count):
+        for i in range(count):
+            item = MarketplaceItem.objects.create(
+                seller=self.user, title=f'Item {i}', description='...', price=10, category='misc', city='toronto',
+            )
+            MarketplaceMedia.objects.create(item=item, file='sample')
+            if i % 2 == 0:
+                item.saved_by.add(self.user)
+
+    def count_feed_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/marketplace/', {'city': 'toronto'})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_query_count_is_constant_in_page_size(self):
+        self.make_items(2)
+        small, _ = self.count_feed_queries()
+        self.make_items(8)
+        large, results = self.count_feed_queries()
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(small, large)
+        saved = {item.id for item in self.user.saved_items.all()}
+        for result in results:
+            self.assertEqual(result['is_saved'], result['id'] in saved)
+            self.assertEqual(result['saved_by_user'], result['id'] in saved)
+            self.assertEqual(len(result['images']), 1)
+
+
+
+class MediaURLTests(TestCase):
+    def setUp(self):
+        media_url.cache_clear()
+        media_srcset.cache_clear()
+
+    def test_card_preset_matches_the_legacy_transformation(self):
+        legacy, _ = cloudinary_url('listing/1', width=400, height=400, crop='fill', quality='auto')
+        self.assertEqual(media_url('listing/1'), legacy)
+        self.assertEqual(media_url('listing/1', 'card', 200), media_url('listing/1', 'thumb'))
+
+    def test_urls_are_memoized_per_preset(self):
+        for _ in range(3):
+            media_url('listing/1', 'thumb')
+            media_url('listing/1', 'full')
+        info = media_url.cache_info()
+        self.assertEqual((info.misses, info.hits), (2, 4))
+
+        srcset = media_srcset('listing/1', 'card')
+        self.assertEqual(
+            [candidate.rsplit(' ', 1)[1] for candidate in srcset.split(', ')], ['200w', '400w', '800w', '1200w'],
+        )
+        self.assertIn(f"{media_url('listing/1', 'card', 800)} 800w", srcset)
+
+    def test_listing_media_follow_the_requested_preset(self):
+        user = User.objects.create_user('seller', password='pass', city='toronto')
+        item = MarketplaceItem.objects.create(
+            seller=user, title='Lamp', description='...', price=10, category='misc', city='toronto',
+        )
+        MarketplaceMedia.objects.create(item=item, file='listing/1')
+        for preset, expected in (('thumb', 'thumb'), ('full', 'full'), ('huge', 'card')):
+            with self.subTest(preset=preset):
+                response = APIClient().get('/api/marketplace/', {'city': 'toronto', 'media_preset': preset})
+                self.assertEqual(response.data['results'][0]['images'][0]['file'], media_url('listing/1', expected))
+
+
+class FlakyMediaStorage(LocalMediaStorage):
+    """LocalMediaStorage whose first `failures` saves raise, like a storage backend having a bad minute."""
+    failures = 0
+
+    def save(self, path, is_video=False):
+        if FlakyMediaStorage.failures:
+            FlakyMediaStorage.failures -= 1
+            raise ConnectionError('upload timed out')
+        return super().save(path, is_video)
+
+
+class IngestMediaTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        overrides = override_settings(
+            MEDIA_ROOT=os.path.join(root, 'media'), MEDIA_STAGING_ROOT=os.path.join(root, 'staging'),
+            MARKETPLACE_MEDIA_STORAGE='core.tests.FlakyMediaStorage',
+            MEDIA_INGEST_MAX_ATTEMPTS=3, MEDIA_INGEST_RETRY_DELAY=0,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        _load_storage.cache_clear()
+        self.addCleanup(_load_storage.cache_clear)
+
+        seller = User.objects.create_user('uploader', password='pass', city='toronto')
+        self.item = MarketplaceItem.objects.create(
+            seller=seller, title='Bike', description='...', price=10, category='misc', city='toronto',
+        )
+
+    def stage(self):
+        return MarketplaceMedia.objects.create(
+            item=self.item, is_video=True, status=MarketplaceMedia.PROCESSING,
+            staged_file=stage_upload(SimpleUploadedFile('ride.mp4', b'not really a video')),
+        )
+
+    def test_uploads_are_retried_until_they_land(self):
+        FlakyMediaStorage.failures = 2
+        media = self.stage()
+        with self.assertLogs('core.ingest', 'WARNING') as logs:
+            self.assertTrue(ingest_media(media.pk))
+        self.assertEqual(len(logs.records), 2)
+
+        media.refresh_from_db()
+        self.assertEqual((media.status, media.attempts, media.error), (MarketplaceMedia.READY, 3, ''))
+        self.assertEqual(media.staged_file, '')
+        self.assertEqual(os.listdir(settings.MEDIA_STAGING_ROOT), [])
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'marketplace', 'media'))), 1)
+        self.assertFalse(ingest_media(media.pk))
+
+    def test_exhausted_retries_fail_and_the_command_picks_them_up(self):
+        FlakyMediaStorage.failures = 3
+        media = self.stage()
+        with self.assertLogs('core.ingest', 'WARNING'):
+            self.assertFalse(ingest_media(media.pk))
+        media.refresh_from_db()
+        self.assertEqual((media.status, media.attempts), (MarketplaceMedia.FAILED, 3))
+        self.assertEqual(media.error, 'ConnectionError: upload timed out')
+        self.assertTrue(os.path.exists(media.staged_file))
+
+        out = StringIO()
+        call_command('ingest_media', retry_failed=True, stdout=out)
+        self.assertIn('Ingested 1 media (0 failed)', out.getvalue())
+        media.refresh_from_db()
+        self.assertEqual((media.status, media.attempts), (MarketplaceMedia.READY, 4))
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write_photo(self):
+        # 600x300 landscape pixels, tagged "rotate 90" and carrying a camera model, like a phone photo.
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x0110] = 'Pocket Camera'
+        path = os.path.join(self.root, 'photo.jpg')
+        Image.new('RGB', (600, 300), 'red').save(path, 'JPEG', exif=exif)
+        return path
+
+    def test_derivatives_are_rendered_per_preset_and_format(self):
+        result = process_image(self.write_photo(), self.root)
+
+        # The orientation is baked into the pixels, then every metadata tag is dropped.
+        self.assertEqual((result['width'], result['height']), (300, 600))
+        with Image.open(result['original']['path']) as original:
+            self.assertEqual((original.format, original.size), ('JPEG', (300, 600)))
+            self.assertEqual(dict(original.getexif()), {})
+
+        self.assertEqual(set(result['derivatives']), set(MEDIA_PRESETS))
+        sizes = {name: (entry['width'], entry['height']) for name, entry in result['derivatives'].items()}
+        # 'full' only ever scales down, the 'fill' presets crop to their exact box.
+        self.assertEqual(sizes, {'thumb': (200, 200), 'card': (400, 400), 'full': (300, 600)})
+        for entry in result['derivatives'].values():
+            for key, (fmt, _) in DERIVATIVE_FORMATS.items():
+                with Image.open(entry[key]['path']) as derivative:
+                    self.assertEqual((derivative.format, derivative.size), (fmt, (entry['width'], entry['height'])))
+                self.assertEqual(entry[key]['bytes'], os.path.getsize(entry[key]['path']))
+
+    def test_transparent_images_are_flattened_for_jpeg(self):
+        path = os.path.join(self.root, 'logo.png')
+        Image.new('RGBA', (500, 500), (0, 0, 255, 0)).save(path)
+        result = generate_derivatives(path)
+
+        with Image.open(result['original']['path']) as original:
+            self.assertEqual((original.format, original.mode), ('PNG', 'RGBA'))
+        with Image.open(result['derivatives']['card']['jpeg']['path']) as card:
+            self.assertEqual((card.mode, card.getpixel((0, 0))), ('RGB', (255, 255, 255)))
+        with Image.open(result['derivatives']['card']['webp']['path']) as card:
+            self.assertEqual(card.mode, 'RGBA')
+
+
+class CityKeyTests(TestCase):
+    def test_partial_save_of_city_updates_city_key(self):
+        user = User.objects.create_user('mover', password='pass', city='toronto')
+        post = Post.objects.create(user=user, title='Post', content='...', post_type='discussion', city='Toronto')
+        self.assertEqual(post.city_key, 'toronto')
+
+        post.city = 'North York '
+        post.save(update_fields=['city'])
+        user.city = 'brampton'
+        user.save(update_fields=['city', 'bio'])
+
+        self.assertEqual(Post.objects.get(pk=post.pk).city_key, 'north-york')
+        self.assertEqual(User.objects.get(pk=user.pk).city_key, 'brampton')
+        self.assertEqual(list(Post.objects.filter(city_key='north-york')), [post])
+
+    def test_city_key_is_not_serialized(self):
+        user = User.objects.create_user('organizer', password='pass', city='toronto')
+        Group.objects.create(name='Runners', description='...', city='Toronto', created_by=user)
+        response = APIClient().get('/api/groups-public/', {'city': 'toronto'})
+        self.assertEqual(response.status_code, 200)
+        group = response.data['results'][0] if isinstance(response.data, dict) else response.data[0]
+        self.assertEqual(group['city'], 'Toronto')
+        self.assertNotIn('city_key', group)
+
+
+class MarketplaceFilterTests(TestCase):
+    def test_non_numeric_prices_are_rejected(self):
+        client = APIClient()
+        for value in ('abc', 'NaN', 'sNaN', 'Infinity', '-inf'):
+            for param in ('min_price', 'max_price'):
+                with self.subTest(param=param, value=value):
+                    response = client.get('/api/marketplace/', {param: value})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.data, {param: 'Must be a number.'})
+        self.assertEqual(client.get('/api/marketplace/', {'min_price': '10.50'}).status_code, 200)
+
+
+class ListingImportTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user('shop', password='pass', city='toronto', is_business=True)
+        self.row = {'title': 'Lamp', 'description': '...', 'price': '10', 'category': 'home', 'condition': 'used'}
+
+    def upload(self, name, content):
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        return client.post('/api/marketplace/import/', {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+    def test_read_error_part_way_reports_what_was_created(self):
+        def rows():
+            for number in range(1, IMPORT_BATCH_SIZE + 11):
+                yield number, self.row
+            raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+
+        before = get_city_version('toronto')
+        result = ListingImport(self.seller).run(rows())
+        self.assertEqual(result['created'], IMPORT_BATCH_SIZE + 10)
+        self.assertIn('Could not read the file', result['error'])
+        self.assertEqual(MarketplaceItem.objects.filter(seller=self.seller).count(), IMPORT_BATCH_SIZE + 10)
+        # bulk_create sends no post_save; the import bumps the city's feed version itself.
+        self.assertEqual(get_city_version('toronto'), before + 1)
+
+    def test_undecodable_tail_still_returns_the_created_count(self):
+        # Large enough that the decoder reaches the bad bytes only after the first batch is saved.
+        content = (json.dumps(self.row) + '\n').encode() * (IMPORT_BATCH_SIZE * 2) + b'\xff\xfe\n'
+        response = self.upload('listings.jsonl', content)
+        self.assertEqual(response.status_code, 400)
+        created = response.data['created']
+        self.assertGreaterEqual(created, IMPORT_BATCH_SIZE)
+        self.assertEqual(MarketplaceItem.objects.filter(seller=self.seller).count(), created)
+        self.assertIn('error', response.data)
+        self.seller.refresh_from_db()
+        self.assertEqual(self.seller.xp, 10)
+
+    def test_json_array_upload_is_rejected_with_a_clear_message(self):
+        response = self.upload('listings.json', json.dumps([self.row]).encode())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+        self.assertIn('upload JSONL', response.data['error'])
+        self.assertEqual(response.data['errors'], [])
+
+        response = self.upload('listings.json', (json.dumps(self.row) + '\n').encode())
+        self.assertEqual(response.status_code, 201)
+
+
+class ExpireListingsTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user('lister', password='pass', city='toronto')
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.items = [
+            MarketplaceItem.objects.create(
+                seller=self.seller, title=f'Item {i}', description='...', price=10, category='misc',
+                city='toronto', expiry_date=yesterday,
+            )
+            for i in range(3)
+        ]
+
+    def test_only_listings_the_update_changed_are_counted_and_notified(self):
+        sold = self.items[0]
+        before = MarketplaceItem.objects.get(pk=self.items[1].pk).updated_at
+
+        def sell_after_select(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith('SELECT') and 'expiry_date' in sql and not MarketplaceItem.objects.filter(status='sold').exists():
+                # The listing sells between the sweeper's SELECT and its UPDATE.
+                MarketplaceItem.objects.filter(pk=sold.pk).update(status='sold')
+            return result
+
+        with connection.execute_wrapper(sell_after_select):
+            stats = expire_listings()
+
+        self.assertEqual(stats['expired'], 2)
+        self.assertEqual(MarketplaceItem.objects.get(pk=sold.pk).status, 'sold')
+        notification = Notification.objects.get(user=self.seller)
+        self.assertEqual(notification.content, '2 of your listings have expired.')
+        self.assertGreater(MarketplaceItem.objects.get(pk=self.items[1].pk).updated_at, before)
+        self.assertEqual(expire_listings()['expired'], 0)
+
+
+class SimilarListingTests(TestCase):
+    def setUp(self):
+        city_indexes.clear()
+        self.seller = User.objects.create_user('lister', password='pass', city='toronto')
+
+    def listing(self, title, **fields):
+        return MarketplaceItem.objects.create(
+            seller=self.seller, title=title, description='vintage road bike, steel frame', price=100,
+            category='bikes', city='toronto', **fields,
+        )
+
+    def test_recommends_only_available_unexpired_listings(self):
+        item = self.listing('Road bike')
+        similar = self.listing('Vintage road bike')
+        self.listing('Steel road bike', status='sold')
+        expired = self.listing('Old road bike')
+        # Built before the listing expires, as if the sweeper has not reached it yet.
+        self.client.get(f'/api/marketplace/{item.pk}/similar/')
+        MarketplaceItem.objects.filter(pk=expired.pk).update(expiry_date=timezone.localdate() - timedelta(days=1))
+
+        results = self.client.get(f'/api/marketplace/{item.pk}/similar/').data['results']
+        self.assertEqual([entry['id'] for entry in results], [similar.pk])
+
+    def test_a_cold_build_does_not_block_other_cities(self):
+        building, release = threading.Event(), threading.Event()
+
+        class SlowIndexes(CityIndexes):
+            def build(self, city_key):
+                if city_key == 'slow':
+                    building.set()
+                    release.wait(5)
+                    self.indexes[city_key] = SimilarityIndex.build([])
+                    return self.indexes[city_key]
+                return super().build(city_key)
+
+        indexes = SlowIndexes()
+        slow = threading.Thread(target=indexes.get, args=('slow',))
+        slow.start()
+        try:
+            self.assertTrue(building.wait(5))
+            self.listing('Road bike')
+            started = time.monotonic()
+            self.assertEqual(len(indexes.get('toronto').pks), 1)
+            self.assertLess(time.monotonic() - started, 2)
+        finally:
+            release.set()
+            slow.join()
+
+
+class EventFeedQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('attendee', password='pass', city='toronto')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_events(self, count):
+        for i in range(count):
+            host = User.objects.create_user(f'host{Event.objects.count()}', password='pass', city='toronto')
+            event = Event.objects.create(
+                host=host, title=f'Event {i}', description='...', location='Park', city='toronto',
+                datetime=timezone.now() + timedelta(days=1),
+            )
+            event.rsvps.add(host)
+            if i % 2 == 0:
+                event.rsvps.add(self.user)
+
+    def count_feed_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/events/', {'city': 'toronto'})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_query_count_is_constant_in_page_size(self):
+        self.make_events(2)
+        small, _ = self.count_feed_queries()
+        self.make_events(8)
+        large, results = self.count_feed_queries()
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(small, large)
+        attending = set(self.user.rsvped_events.values_list('id', flat=True))
+        for result in results:
+            self.assertEqual(result['has_rsvped'], result['id'] in attending)
+            self.assertEqual(result['rsvp_count'], 2 if result['id'] in attending else 1)
+
+class BufferedCounterTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('viewer', password='pass', city='toronto')
+        self.posts = [
+            Post.objects.create(user=user, title=f'Post {i}', content='...', post_type='discussion', city='toronto')
+            for i in range(3)
+        ]
+        self.counter = BufferedCounter(Post, 'views_count')
+
+    def views(self):
+        return list(Post.objects.order_by('pk').values_list('views_count', flat=True))
+
+    def test_flush_writes_the_buffered_totals_once(self):
+        first, second, third = (post.pk for post in self.posts)
+        for pk in (first, first, first, second):
+            self.counter.incr(pk)
+        self.counter.incr(third, 2)
+        self.assertEqual(self.views(), [0, 0, 0])
+        self.assertEqual(self.counter.get_pending(first), 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.counter.flush(), 3)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.views(), [3, 1, 2])
+        self.assertEqual(self.counter.get_pending(first), 0)
+        self.assertEqual(self.counter.flush(), 0)
+
+        self.counter.incr(first)
+        self.counter.flush()
+        self.assertEqual(self.views(), [4, 1, 2])
+
+    @override_settings(VIEW_COUNTER_MAX_PENDING=2)
+    def test_a_full_buffer_flushes_early(self):
+        self.counter.incr(self.posts[0].pk)
+        self.counter.incr(self.posts[0].pk)
+        self.assertEqual(self.views(), [0, 0, 0])
+        self.counter.incr(self.posts[1].pk)
+        self.assertEqual(self.views(), [2, 1, 0])
+
+    def test_detail_views_include_unflushed_views(self):
+        post_views.flush()
+        self.addCleanup(post_views.flush)
+        client = APIClient()
+        counts = [client.get(f'/api/posts/{self.posts[0].pk}/').data['views_count'] for _ in range(3)]
+        self.assertEqual(counts, [1, 2, 3])
+        post_views.flush()
+        self.assertEqual(self.views(), [3, 0, 0])
+
+
+class MySwappOffersTests(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user('buyer', password='pass', city='toronto')
+        self.seller = User.objects.create_user('seller', password='pass', city='toronto')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def make_offers(self, count):
+        for i in range(count):
+            item = MarketplaceItem.objects.create(
+                seller=self.seller, title=f'Item {i}', description='...', price=10, category='misc', city='toronto',
+            )
+            SwappOffer.objects.create(item=item, offered_by=self.buyer)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/swapp/my-offers/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_deprecated_route_returns_bounded_pages(self):
+        self.make_offers(2)
+        _, small = self.get()
+        self.make_offers(10)
+        response, large = self.get()
+
+        self.assertEqual(small, large)
+        self.assertEqual(response['Deprecation'], 'true')
+        self.assertEqual(len(response.data['sent']), 10)
+        self.assertEqual(response.data['received'], [])
+        self.assertIsNone(response.data['received_next'])
+
+        rest = self.client.get(response.data['sent_next']).data['results']
+        shown = [offer['id'] for offer in response.data['sent'] + rest]
+        self.assertEqual(shown, list(SwappOffer.objects.order_by('-date_created').values_list('pk', flat=True)))
+
+
+class SwapMatchingTests(TestCase):
+    def test_cycles_on_a_small_graph(self):
+        graph = WantGraph.from_wants([
+            (1, 2, 'a'), (2, 1, 'b'), (1, 2, 'a2'),  # a two-way swap; a second want on the same owner is ignored
+            (1, 3, 'c'), (3, 4, 'd'), (4, 1, 'e'),  # a three-way ring through 1
+            (2, 5, 'f'), (5, 6, 'g'), (6, 7, 'h'), (7, 8, 'i'), (8, 2, 'j'),  # five users: too long by default
+            (4, 9, 'k'),  # a dead end
+        ])
+        self.assertEqual(sorted(graph.cycles()), [(1, 2), (1, 3, 4)])
+        self.assertEqual(sorted(graph.cycles(max_length=5)), [(1, 2), (1, 3, 4), (2, 5, 6, 7, 8)])
+        self.assertEqual(graph.legs((1, 3, 4)), [(3, 1, 'c'), (4, 3, 'd'), (1, 4, 'e')])
+        self.assertEqual(graph.cycles_through(4, 1), [(1, 3, 4)])
+        self.assertEqual(graph.cycles_through(4, 9), [])
+
+    def test_offers_keep_suggestions_current(self):
+        users = [User.objects.create_user(f'trader{i}', password='pass', city='toronto') for i in range(3)]
+        items = [
+            MarketplaceItem.objects.create(
+                seller=user, title=f'Thing {i}', description='...', price=10, category='misc', city='toronto',
+            )
+            for i, user in enumerate(users)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            SwappOffer.objects.create(item=items[1], offered_by=users[0])
+            SwappOffer.objects.create(item=items[2], offered_by=users[1])
+        self.assertFalse(SwapCycle.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            closing = SwappOffer.objects.create(item=items[0], offered_by=users[2])
+
+        client = APIClient()
+        client.force_authenticate(users[0])
+        cycles = client.get('/api/swapp/suggestions/').data['results']
+        self.assertEqual(len(cycles), 1)
+        legs = [(leg['giver']['id'], leg['receiver']['id'], leg['item']['id']) for leg in cycles[0]['legs']]
+        self.assertEqual(legs, [
+            (users[1].pk, users[0].pk, items[1].pk),
+            (users[2].pk, users[1].pk, items[2].pk),
+            (users[0].pk, users[2].pk, items[0].pk),
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            decline_offer(closing.pk, users[0])
+        self.assertFalse(SwapCycle.objects.exists())
+        self.assertEqual(rebuild_city('toronto'), {'users': 2, 'cycles': 0})
+
+
+class SwappOfferActionTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', password='pass', city='toronto')
+        self.buyer = User.objects.create_user('buyer', password='pass', city='toronto')
+        self.item = MarketplaceItem.objects.create(
+            seller=self.seller, title='Bike', description='...', price=100, category='bikes', city='toronto',
+        )
+        self.offered = MarketplaceItem.objects.create(
+            seller=self.buyer, title='Board', description='...', price=50, category='sports', city='toronto',
+        )
+        self.offer = SwappOffer.objects.create(item=self.item, offered_by=self.buyer, offered_item=self.offered)
+
+    def act(self, user, action):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(f'/api/swapp/offers/{self.offer.pk}/{action}/')
+
+    def assertNothingWritten(self):
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.status, 'pending')
+        self.assertEqual(
+            list(MarketplaceItem.objects.order_by('pk').values_list('status', flat=True)), ['available', 'traded'],
+        )
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(list(User.objects.values_list('xp', flat=True).distinct()), [0])
+
+    def test_only_the_seller_can_act(self):
+        for action in ('accept', 'decline'):
+            with self.subTest(action=action):
+                self.assertEqual(self.act(self.buyer, action).status_code, 403)
+                self.assertEqual(SwappOffer.objects.get().status, 'pending')
+
+    def test_resolved_offers_and_traded_items_are_rejected(self):
+        self.assertEqual(self.act(self.seller, 'decline').status_code, 200)
+        for action in ('accept', 'decline'):
+            with self.subTest(action=action):
+                response = self.act(self.seller, action)
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(response.data['error'], 'This offer has already been declined.')
+        self.assertEqual(Notification.objects.count(), 1)
+
+        Notification.objects.all().delete()
+        SwappOffer.objects.filter(pk=self.offer.pk).update(status='pending')
+        MarketplaceItem.objects.filter(pk=self.offered.pk).update(status='traded')
+        response = self.act(self.seller, 'accept')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['error'], 'The offered item is no longer available.')
+        self.assertNothingWritten()
+
+
+class SwappOfferConcurrencyTests(TransactionTestCase):
+    """Simultaneous accepts of competing offers on one item: exactly one may win."""
+
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', password='pass', city='toronto')
+        self.item = MarketplaceItem.objects.create(
+            seller=self.seller, title='Bike', description='...', price=100, category='bikes', city='toronto',
+        )
+        self.offers = []
+        for i in range(4):
+            buyer = User.objects.create_user(f'buyer{i}', password='pass', city='toronto')
+            offered = MarketplaceItem.objects.create(
+                seller=buyer, title=f'Board {i}', description='...', price=50, category='sports', city='toronto',
+            )
+            self.offers.append(SwappOffer.objects.create(item=self.item, offered_by=buyer, offered_item=offered))
+
+    def accept_concurrently(self, offers):
+        barrier = threading.Barrier(len(offers))
+        outcomes = []
+
+        def accept(offer):
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        accept_offer(offer.pk, self.seller)
+                        outcomes.append('accepted')
+                    except OfferError as exc:
+                        outcomes.append(exc.status)
+                    except OperationalError:
+                        # SQLite's shared-cache test database fails on lock contention instead of waiting.
+                        if connection.vendor != 'sqlite':
+                            raise
+                        time.sleep(0.01)
+                        continue
+                    break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=(offer,)) for offer in offers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_only_one_simultaneous_accept_wins(self):
+        outcomes = self.accept_concurrently(self.offers)
+
+        self.assertEqual(outcomes.count('accepted'), 1, outcomes)
+        self.assertEqual(sorted(o for o in outcomes if o != 'accepted'), [409] * (len(self.offers) - 1))
+        statuses = list(SwappOffer.objects.order_by('status').values_list('status', flat=True))
+        self.assertEqual(statuses, ['accepted'] + ['declined'] * (len(self.offers) - 1))
+
+        winner = SwappOffer.objects.get(status='accepted')
+        self.item.refresh_from_db()
+        winner.offered_item.refresh_from_db()
+        self.assertEqual((self.item.status, winner.offered_item.status), ('traded', 'traded'))
+        self.assertEqual(
+            MarketplaceItem.objects.filter(status='available').count(), len(self.offers) - 1,
+        )
+        self.seller.refresh_from_db()
+        self.assertEqual(self.seller.xp, ACCEPT_XP)
+        self.assertEqual(User.objects.filter(xp=ACCEPT_XP).count(), 2)
+
+
+class EventRSVPLoadTests(TransactionTestCase):
+    """
+    Smoke test: a small flash crowd of simultaneous RSVPs on one capped event
+    with a waitlist. The load check with thousands of users is the
+    `loadtest_rsvps` management command.
+    """
+
+    USERS = 300
+    THREADS = 12
+    LIMIT = 50
+
+    def setUp(self):
+        host = User.objects.create_user('host', password='pass', city='toronto')
+        self.event = Event.objects.create(
+            host=host, title='Launch party', description='...', location='Hall', city='toronto',
+            datetime=timezone.now() + timedelta(days=1), rsvp_limit=self.LIMIT, waitlist_enabled=True,
+        )
+        User.objects.bulk_create([User(username=f'fan{i}', password='!') for i in range(self.USERS)])
+        self.users = list(User.objects.filter(username__startswith='fan').order_by('pk'))
+
+    def run_concurrently(self, func, users):
+        barrier = threading.Barrier(self.THREADS)
+        results = {}
+
+        def worker(chunk):
+            barrier.wait()
+            try:
+                for user in chunk:
+                    while True:
+                        try:
+                            results[user.pk] = func(self.event, user)
+                        except OperationalError:
+                            # SQLite's shared-cache test database fails on lock contention instead of waiting.
+                            if connection.vendor != 'sqlite':
+                                raise
+                            time.sleep(0.001)
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(users[i::self.THREADS],)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_capacity_holds_and_waitlist_promotes_in_order(self):
+        results = self.run_concurrently(join_event, self.users)
+
+        statuses = Counter(status for status, _ in results.values())
+        self.assertEqual(statuses, {ATTENDING: self.LIMIT, WAITLISTED: self.USERS - self.LIMIT})
+        positions = sorted(position for status, position in results.values() if status == WAITLISTED)
+        self.assertEqual(positions, list(range(1, self.USERS - self.LIMIT + 1)))
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.rsvp_count, self.LIMIT)
+        self.assertEqual(self.event.rsvps.count(), self.LIMIT)
+
+        queue = list(EventWaitlistEntry.objects.filter(event=self.event).order_by('pk').values_list('user_id', flat=True))
+        leaving = list(self.event.rsvps.all()[:10])
+        self.run_concurrently(leave_event, leaving)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.rsvp_count, self.LIMIT)
+        attendees = set(self.event.rsvps.values_list('pk', flat=True))
+        self.assertEqual(len(attendees), self.LIMIT)
+        self.assertTrue(set(queue[:len(leaving)]) <= attendees)
+        self.assertEqual(EventWaitlistEntry.objects.filter(event=self.event).count(), len(queue) - len(leaving))
@@ -12,7 +12,10 @@ from .views import (
     MessageListCreateView, NotificationUpdateView, ReportListView, ThreadListView, JoinGroupView,
     ReportCreateView, ReportActionView, toggle_save_item, FeedbackCreateView, GroupMessageListCreateView,
      SwappOfferListView, SwappOfferDetailView, SwappOfferAcceptView, SwappOfferDeclineView, SwappOfferCounterView,
-     SwappOfferActionView, MySwappOffersView, PublicGroupListView,
+     SwappOfferActionView, MySwappOffersView, PublicGroupListView, FeedCacheStatsView,
+     ReactionBatchView, MarketplaceDetailView, MarketplaceImportView, MarketplaceExportView,
+     MarketplaceSimilarView, SwappOfferInboxView, SwappOfferOutboxView, SwappOfferUnseenCountView,
+     SwappOfferSeenView, SwapSuggestionListView,
 )
 
 
@@ -38,6 +41,10 @@ urlpatterns = [
     # Marketplace
     path('marketplace/', MarketplaceListView.as_view(), name='marketplace'),
     path('marketplace/create/', MarketplaceCreateView.as_view(), name='marketplace-create'),
+    path('marketplace/<int:pk>/', MarketplaceDetailView.as_view(), name='marketplace-detail'),
+    path('marketplace/<int:pk>/similar/', MarketplaceSimilarView.as_view(), name='marketplace-similar'),
+    path('marketplace/import/', MarketplaceImportView.as_view(), name='marketplace-import'),
+    path('marketplace/export/', MarketplaceExportView.as_view(), name='marketplace-export'),
     path('marketplace/<int:pk>/save/', toggle_save_item, name='toggle-save-item'),
 
     # Swapp Offers
@@ -48,13 +55,19 @@ urlpatterns = [
     path('swapp/offers/<int:pk>/decline/', SwappOfferDeclineView.as_view(), name='swapp-offer-decline'),
     path('swapp/offers/<int:pk>/counter/', SwappOfferCounterView.as_view(), name='swapp-offer-counter'),
 
-    path('swapp/my-offers/', MySwappOffersView.as_view(), name='my-swapp-offers'),
+    path('swapp/my-offers/', MySwappOffersView.as_view(), name='my-swapp-offers'),  # deprecated
+    path('swapp/inbox/', SwappOfferInboxView.as_view(), name='swapp-inbox'),
+    path('swapp/outbox/', SwappOfferOutboxView.as_view(), name='swapp-outbox'),
+    path('swapp/unseen-count/', SwappOfferUnseenCountView.as_view(), name='swapp-unseen-count'),
+    path('swapp/seen/', SwappOfferSeenView.as_view(), name='swapp-seen'),
+    path('swapp/suggestions/', SwapSuggestionListView.as_view(), name='swapp-suggestions'),
     path('swapp/offer/<int:pk>/action/', SwappOfferActionView.as_view(), name='swapp-offer-action'),
     # Notifications
     path('notifications/', NotificationListView.as_view(), name='notifications'),
     path('notifications/<int:pk>/', NotificationUpdateView.as_view(), name='notification-update'),
 
     path('reactions/', ReactionCreateView.as_view(), name='reaction-create'),
+    path('reactions/batch/', ReactionBatchView.as_view(), name='reaction-batch'),
 
     # Messaging
     path('messages/', MessageListCreateView.as_view(), name='message-list-create'),
@@ -79,6 +92,9 @@ urlpatterns = [
 
     # Leaderboard
     path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+
+    # Metrics
+    path('metrics/feed-cache/', FeedCacheStatsView.as_view(), name='feed-cache-stats'),
 ]
 
 # Static/media file serving during development
@@ -1,4 +1,9 @@
+from urllib.parse import urlencode
+
+from django.core.mail import send_mail
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.db.models import Q
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
@@ -10,10 +15,12 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.generics import ListAPIView, UpdateAPIView, RetrieveAPIView, CreateAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly, BasePermission
 from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.parsers import MultiPartParser
 from rest_framework_simplejwt.views import TokenObtainPairView
+from django.utils import timezone
 from django.utils.text import slugify
-from django.db.models import Count, F, IntegerField, Value
-from django.db.models.functions import Coalesce
+from django.db.models import Count, F, IntegerField, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
 from rest_framework.exceptions import ValidationError
 from rest_framework import filters
 from django.db.models import Case, When, IntegerField, Sum
@@ -21,15 +28,31 @@ from .models import (
     Post, Event, Notification, MarketplaceItem,
     Message, Comment, SwappOffer, Group, Reaction, PollOption,
     Report, Feedback, MarketplaceMedia, GroupChat, GroupMessage,
+    REACTION_WEIGHTS, normalize_city,
 )
+from .bulk import IMPORT_FORMATS, ListingImport, import_format, iter_rows, stream_csv, stream_jsonl
+from .cache import CityFeedCacheMixin, get_stats as get_feed_cache_stats
+from .counters import ViewCountMixin, event_views, marketplace_views, post_views
+from .filters import MarketplaceFilter
+from .ingest import enqueue, stage_upload
+from .matching import cycle_summaries, live_cycles
+from .pagination import FeedPagination, RandomSamplePagination
+from .reactions import apply_reaction
+from .rsvps import CANCELLED, FULL, LEFT_WAITLIST, WAITLISTED, toggle_rsvp
+from .search import PostSearchFilter
 from .serializers import (
     PostSerializer, EventSerializer, RegisterSerializer,
-    NotificationSerializer, UserProfileSerializer, ReactionSerializer,
-    MarketplaceItemSerializer, SwappOfferSerializer,
+    NotificationSerializer, UserProfileSerializer, ReactionSerializer, ReactionBatchSerializer,
+    MarketplaceItemSerializer, SwappOfferSerializer, SwappOfferSummarySerializer, SwapCycleSerializer,
     CommentSerializer, CustomTokenObtainPairSerializer,
     UserSerializer, GroupSerializer, ReportSerializer, GroupMessageSerializer,
     FeedbackSerializer, MessageSerializer, MiniUserSerializer,
 )
+from .similar import similar_listings
+from .swaps import (
+    OFFER_BOXES, OfferError, accept_offer, apply_offer_action, counter_offer, decline_offer, mark_seen,
+    offer_box, offer_summaries, unseen_counts,
+)
 
 from django.contrib.auth import get_user_model
 User = get_user_model()
@@ -48,6 +71,10 @@ class IsAdminOrModerator(BasePermission):
             request.user.is_staff or getattr(request.user, 'is_moderator', False)
         )
 
+class IsBusinessUser(BasePermission):
+    def has_permission(self, request, view):
+        return request.user and request.user.is_authenticated and request.user.is_business
+
 class IsOwnerOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
         return request.method in ['GET', 'HEAD'] or obj.user == request.user
@@ -95,45 +122,58 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 
 from django.db.models import Count, Case, When, Value, IntegerField, Sum  # ensure these are imported
 
-class PostListCreateView(generics.ListCreateAPIView):
+class PostListCreateView(CityFeedCacheMixin, generics.ListCreateAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'content']
+    pagination_class = FeedPagination
+    filter_backends = [PostSearchFilter]
+    feed_cache_name = 'posts'
     
-    REACTION_WEIGHTS = {
-        '👍': 1,
-        '❤️': 2,
-        '😂': 1,
-        '👎': -1,
-    }
+    REACTION_WEIGHTS = REACTION_WEIGHTS
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('sort') == 'random' and not params.get('search'):
+                self._paginator = RandomSamplePagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
-        city = self.request.query_params.get('city', '').strip().lower()
+        city = normalize_city(self.request.query_params.get('city'))
         sort = self.request.query_params.get('sort', 'newest')
         category = self.request.query_params.get('category', '').strip().lower()
 
-        qs = Post.objects.filter(city=city) if city else Post.objects.all()
+        qs = Post.objects.filter(city_key=city) if city else Post.objects.all()
 
-        if city:
-            qs = qs.filter(city__iexact=city)
         if category:
             qs = qs.filter(category__iexact=category)
 
         if sort == 'hottest':
-            when_conditions = [
-                When(reactions__emoji=emoji, then=Value(weight))
-                for emoji, weight in self.REACTION_WEIGHTS.items()
-            ]
-            qs = qs.annotate(score=Sum(Case(*when_conditions, output_field=IntegerField()))).order_by('-score', '-created_at')
+            # hot_score is kept up to date by the Reaction signals (see rebuild_hot_scores)
+            qs = qs.order_by('-hot_score', '-created_at')
         elif sort == 'discussed':
             return qs.order_by('-comment_count', '-created_at')
         elif sort == 'highlights':
-            qs = qs.annotate(score=Count('comments') + Count('reactions')).order_by('-score', '-created_at')
+            # PostEngagement is maintained on comment/reaction writes (see reconcile_engagement)
+            qs = (
+                qs.filter(engagement__isnull=False)
+                .annotate(highlight_score=F('engagement__score'))
+                .order_by('-highlight_score', '-created_at', '-id')
+            )
+        elif sort == 'trending':
+            # TrendingRank is materialized by the compute_trending job (see core.ranking)
+            qs = (
+                qs.filter(trending__isnull=False)
+                .annotate(trending_score=F('trending__score'))
+                .order_by('-trending_score', '-created_at', '-id')
+            )
         elif sort == 'random':
-            qs = qs.order_by('?')
+            qs = qs.order_by('random_key', 'id')  # paged by RandomSamplePagination
         else:
-            qs = qs.order_by('-created_at')
+            qs = qs.order_by('-created_at', '-id')
 
         return qs
 
@@ -151,23 +191,10 @@ class PostListCreateView(generics.ListCreateAPIView):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def handle_swapp_action(request, pk):
-    offer = get_object_or_404(SwappOffer, pk=pk)
-    action = request.data.get('action')
-    cash_difference = request.data.get('cash_difference', 0)
-
-    if action == 'accept':
-        offer.status = 'accepted'
-    elif action == 'decline':
-        offer.status = 'declined'
-    elif action == 'counter':
-        offer.status = 'countered'
-        offer.cash_difference = cash_difference
-        # You could also handle offered_item changes here if needed
-    else:
-        return Response({'error': 'Invalid action'}, status=400)
-
-    offer.is_seen = False
-    offer.save()
+    try:
+        offer = apply_offer_action(pk, request.user, request.data.get('action'), request.data)
+    except OfferError as exc:
+        return Response({'error': exc.message}, status=exc.status)
     return Response({'status': offer.status})
 
 # views.py
@@ -178,29 +205,140 @@ class ReactionCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         post = serializer.validated_data['post']
         emoji = serializer.validated_data['emoji']
-        user = self.request.user
-
-        # Optional: toggle behavior
-        existing = Reaction.objects.filter(post=post, user=user, emoji=emoji).first()
-        if existing:
-            existing.delete()
-        else:
-            serializer.save(user=user)
+        apply_reaction(self.request.user, post, emoji)
 
 
+class ReactionBatchView(APIView):
+    """
+    Applies a list of reaction changes in order, e.g. a mobile client flushing
+    reactions queued while offline. Each item is applied atomically on its own,
+    so one bad item does not undo the rest.
+    """
+    permission_classes = [IsAuthenticated]
 
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
+    def post(self, request):
+        serializer = ReactionBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['reactions']
+
+        posts = Post.objects.only('pk', 'city').in_bulk({item['post'] for item in items})
+        results = []
+        for item in items:
+            result = {'post': item['post'], 'emoji': item['emoji'], 'action': item['action']}
+            post = posts.get(item['post'])
+            if post is None:
+                result.update(status='error', error='Post not found.')
+            else:
+                result['status'] = apply_reaction(request.user, post, item['emoji'], item['action'])
+            results.append(result)
+        return Response({'results': results})
+
+
+class PostDetailView(ViewCountMixin, generics.RetrieveUpdateDestroyAPIView):
+    view_counter = post_views
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
 class CommentListCreateView(generics.ListCreateAPIView):
+    """
+    Lists a page of comments (top-level, or the direct replies of `?parent=`)
+    and attaches up to `?max_depth=` levels of replies, loaded one query per
+    level. Each comment shows at most REPLIES_PER_COMMENT replies; the rest
+    are reachable through its `more_replies` cursor link.
+    """
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = FeedPagination
+
+    DEFAULT_MAX_DEPTH = 3
+    MAX_DEPTH_LIMIT = 10
+    REPLIES_PER_COMMENT = 5
 
     def get_queryset(self):
         post_id = self.kwargs['post_id']
-        return Comment.objects.filter(post_id=post_id, parent=None).order_by('-created_at')
+        qs = Comment.objects.filter(post_id=post_id).select_related('user')
+        parent_id = self.request.query_params.get('parent')
+        if parent_id:
+            try:
+                parent_id = int(parent_id)
+            except ValueError:
+                raise ValidationError("parent must be an integer.")
+            return qs.filter(parent_id=parent_id).order_by('path')
+        return qs.filter(parent=None).order_by('-created_at', '-id')
+
+    def get_max_depth(self):
+        try:
+            max_depth = int(self.request.query_params.get('max_depth', self.DEFAULT_MAX_DEPTH))
+        except ValueError:
+            raise ValidationError("max_depth must be an integer.")
+        return max(0, min(max_depth, self.MAX_DEPTH_LIMIT))
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        comments = list(page) if page is not None else list(self.get_queryset())
+
+        context = self.get_serializer_context()
+        context.update(self.load_replies(comments))
+        serializer = self.get_serializer(comments, many=True, context=context)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def load_replies(self, comments):
+        """
+        Load the shown part of the reply tree level by level. Each level takes
+        at most REPLIES_PER_COMMENT + 1 replies per parent (the extra one only
+        signals `more_replies`) and reads each parent's total reply count from
+        the same rows, so no query returns more than that per shown comment.
+        """
+        max_depth = self.get_max_depth()
+        limit = self.REPLIES_PER_COMMENT
+        children, reply_counts = {}, {}
+        depth_limit = comments[0].depth + max_depth if comments else 0
+
+        parents = [comment.id for comment in comments]
+        for _ in range(max_depth):
+            if not parents:
+                break
+            level = (
+                Comment.objects.filter(parent_id__in=parents)
+                .annotate(
+                    position=Window(RowNumber(), partition_by=F('parent_id'), order_by=F('path').asc()),
+                    siblings=Window(Count('id'), partition_by=F('parent_id')),
+                )
+                .filter(position__lte=limit + 1)
+                .select_related('user')
+                .order_by('path')
+            )
+            parents = []
+            for comment in level:
+                children.setdefault(comment.parent_id, []).append(comment)
+                reply_counts[comment.parent_id] = comment.siblings
+                if comment.position <= limit:
+                    parents.append(comment.id)
+
+        if parents:
+            # Comments at the depth limit show no replies, only how many they have.
+            reply_counts.update(
+                Comment.objects.filter(parent_id__in=parents)
+                .values_list('parent_id').annotate(total=Count('id')).order_by()
+            )
+
+        return {
+            'comment_children': children,
+            'comment_reply_counts': reply_counts,
+            'comment_depth_limit': depth_limit,
+            'replies_per_comment': limit,
+            'more_replies_url': self.more_replies_url,
+        }
+
+    def more_replies_url(self, comment, after=None):
+        cursor = self.paginator.encode_cursor([after.path, after.id]) if after is not None else ''
+        params = {'parent': comment.id, 'cursor': cursor}
+        url = reverse('comment-list-create', kwargs={'post_id': comment.post_id})
+        return self.request.build_absolute_uri(f'{url}?{urlencode(params)}')
 
     def perform_create(self, serializer):
         post = get_object_or_404(Post, pk=self.kwargs['post_id'])
@@ -249,17 +387,62 @@ class CommentListCreateView(generics.ListCreateAPIView):
 # 🛍️ MARKETPLACE & SWAPP
 # ----------------------------------
 
-class MarketplaceListView(generics.ListAPIView):
+class MarketplaceListView(CityFeedCacheMixin, generics.ListAPIView):
     queryset = MarketplaceItem.objects.filter(status='available')
     serializer_class = MarketplaceItemSerializer
     permission_classes = [AllowAny]
+    pagination_class = FeedPagination
+    feed_cache_name = 'marketplace'
+
     def get_queryset(self):
-        qs = MarketplaceItem.objects.filter(status='available')
-        city = self.request.query_params.get('city')
+        qs = MarketplaceItem.objects.filter(status='available').prefetch_related('media').order_by('-id')
+        # Listings past their expiry date are hidden even before the expire_listings sweep flips them.
+        qs = qs.filter(Q(expiry_date__isnull=True) | Q(expiry_date__gte=timezone.localdate()))
+        city = normalize_city(self.request.query_params.get('city'))
 
         if city:
-            return qs.filter(city__iexact=slugify(city))
-        return qs
+            qs = qs.filter(city_key=city)
+
+        # Facet counts (see get_paginated_response) are computed over the base filters only.
+        self.filters = MarketplaceFilter(self.request)
+        self.facet_base_queryset = self.filters.filter_base(qs)
+        return self.filters.filter_facets(self.facet_base_queryset)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.request.query_params.get('facets', '1') not in ('0', 'false'):
+            response.data['facets'] = self.filters.facet_counts(self.facet_base_queryset)
+        return response
+
+class MarketplaceDetailView(ViewCountMixin, generics.RetrieveAPIView):
+    queryset = MarketplaceItem.objects.prefetch_related('media')
+    serializer_class = MarketplaceItemSerializer
+    permission_classes = [AllowAny]
+    view_counter = marketplace_views
+
+class MarketplaceSimilarView(APIView):
+    """Up to `?limit=` (default 10, max 50) available listings in the same city most similar to this one."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        item = get_object_or_404(MarketplaceItem, pk=pk)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+
+        # The index may trail a sale or expiry by a few seconds; over-fetch and re-check against the table.
+        scores = dict(similar_listings(item, k=limit * 2))
+        candidates = MarketplaceItem.objects.filter(
+            Q(expiry_date__isnull=True) | Q(expiry_date__gte=timezone.localdate()),
+            pk__in=scores, status='available',
+        )
+        items = {listing.pk: listing for listing in candidates.prefetch_related('media')}
+        ranked = [items[pk] for pk in scores if pk in items][:limit]
+        data = MarketplaceItemSerializer(ranked, many=True, context={'request': request}).data
+        for entry in data:
+            entry['similarity'] = round(scores[entry['id']], 4)
+        return Response({'results': data})
 
 class MarketplaceCreateView(generics.CreateAPIView):
     serializer_class = MarketplaceItemSerializer
@@ -271,12 +454,24 @@ class MarketplaceCreateView(generics.CreateAPIView):
         if not city:
             raise ValidationError("User must have a city to create a listing.")
 
+        files = self.request.FILES.getlist('images')
+        for file in files:
+            self.validate_file(file)
+
         item = serializer.save(seller=user, city=city)
 
-        for file in self.request.FILES.getlist('images'):
-            self.validate_file(file)
-            is_video = file.content_type.startswith('video')
-            MarketplaceMedia.objects.create(item=item, file=file, is_video=is_video)
+        # Uploads are staged locally and pushed to storage by the ingest pool; the
+        # listing is returned straight away with its media still 'processing'.
+        media = MarketplaceMedia.objects.bulk_create([
+            MarketplaceMedia(
+                item=item,
+                is_video=file.content_type.startswith('video'),
+                status=MarketplaceMedia.PROCESSING,
+                staged_file=stage_upload(file),
+            )
+            for file in files
+        ])
+        enqueue(m.pk for m in media)
 
         award_xp(user, 10)
 
@@ -292,6 +487,44 @@ class MarketplaceCreateView(generics.CreateAPIView):
 
 
 
+class MarketplaceImportView(APIView):
+    """
+    Bulk-create listings from an uploaded CSV or JSONL `file` (format taken
+    from the extension or `?type=`). Rows are validated and inserted in a
+    single streaming pass; invalid rows are reported by row number.
+    """
+    permission_classes = [IsBusinessUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload a CSV or JSONL file as "file".'}, status=400)
+        fmt = import_format(upload, request.query_params.get('type'))
+        if fmt not in IMPORT_FORMATS:
+            return Response({'error': f'Unsupported import format: {fmt}'}, status=400)
+
+        result = ListingImport(request.user).run(iter_rows(upload, fmt))
+        if result['created']:
+            # One award per import, not per listing.
+            award_xp(request.user, 10)
+        # A read error stops the import part-way; `created` still counts the listings already saved.
+        return Response(result, status=201 if result['created'] and 'error' not in result else 400)
+
+class MarketplaceExportView(APIView):
+    """Stream every listing of the requesting seller as CSV (default) or JSONL (`?type=jsonl`)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.query_params.get('type') == 'jsonl':
+            response = StreamingHttpResponse(stream_jsonl(request.user), content_type='application/x-ndjson')
+            response['Content-Disposition'] = 'attachment; filename="listings.jsonl"'
+        else:
+            response = StreamingHttpResponse(stream_csv(request.user), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="listings.csv"'
+        return response
+
+
 class SwappOfferListView(generics.ListAPIView):
     serializer_class = SwappOfferSerializer
     permission_classes = [IsAuthenticated]
@@ -300,9 +533,7 @@ class SwappOfferListView(generics.ListAPIView):
         user = self.request.user
         view_type = self.request.query_params.get('type', 'received')
 
-        if view_type == 'sent':
-            return SwappOffer.objects.filter(offered_by=user).order_by('-date_created')
-        return SwappOffer.objects.filter(item__seller=user).order_by('-date_created')
+        return offer_box(user, 'outbox' if view_type == 'sent' else 'inbox')
 
 
 class SwappOfferDetailView(generics.RetrieveAPIView):
@@ -312,29 +543,17 @@ class SwappOfferDetailView(generics.RetrieveAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return SwappOffer.objects.filter(Q(offered_by=user) | Q(item__seller=user))
+        return SwappOffer.objects.filter(Q(offered_by=user) | Q(recipient=user))
 
 
 class SwappOfferAcceptView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
-        offer = get_object_or_404(SwappOffer, pk=pk)
-
-        if offer.item.seller != request.user:
-            return Response({'error': 'You are not the seller of this item.'}, status=403)
-
-        offer.status = 'accepted'
-        offer.save()
-
-        # Mark item as swapped/sold
-        offer.item.status = 'traded'
-        offer.item.save()
-
-        # XP Reward
-        award_xp(offer.offered_by, 20)
-        award_xp(request.user, 20)
-
+        try:
+            accept_offer(pk, request.user)
+        except OfferError as exc:
+            return Response({'error': exc.message}, status=exc.status)
         return Response({'status': 'Offer accepted successfully.'})
 
 
@@ -342,14 +561,10 @@ class SwappOfferDeclineView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
-        offer = get_object_or_404(SwappOffer, pk=pk)
-
-        if offer.item.seller != request.user:
-            return Response({'error': 'You are not the seller of this item.'}, status=403)
-
-        offer.status = 'declined'
-        offer.save()
-
+        try:
+            decline_offer(pk, request.user)
+        except OfferError as exc:
+            return Response({'error': exc.message}, status=exc.status)
         return Response({'status': 'Offer declined.'})
 
 
@@ -357,61 +572,103 @@ class SwappOfferCounterView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
-        offer = get_object_or_404(SwappOffer, pk=pk)
-
-        if offer.item.seller != request.user:
-            return Response({'error': 'You are not the seller of this item.'}, status=403)
-
         counter_cash = request.data.get('cash_difference')
-        message = request.data.get('message', '')
-
         if counter_cash is None:
             return Response({'error': 'You must provide a cash difference for the counter.'}, status=400)
 
-        offer.status = 'countered'
-        offer.cash_difference = counter_cash
-        offer.message = message
-        offer.save()
-
+        try:
+            counter_offer(pk, request.user, counter_cash, request.data.get('message', ''))
+        except OfferError as exc:
+            return Response({'error': exc.message}, status=exc.status)
         return Response({'status': 'Offer countered successfully.'})
     
 # List all offers related to the current user
 class MySwappOffersView(APIView):
+    """
+    Deprecated: use swapp/inbox/ and swapp/outbox/ (or swapp/offers/?type=).
+    Kept for existing clients with its response shape, but each list is now
+    the newest page only; `sent_next` / `received_next` link to the rest.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        sent = SwappOffer.objects.filter(offered_by=request.user)
-        received = SwappOffer.objects.filter(item__seller=request.user)
-        return Response({
-            'sent': SwappOfferSerializer(sent, many=True).data,
-            'received': SwappOfferSerializer(received, many=True).data
-        })
+        page_size = FeedPagination().get_page_size(request)
+        data = {}
+        for key, box, offer_type in (('sent', 'outbox', 'sent'), ('received', 'inbox', 'received')):
+            offers = list(offer_box(request.user, box)[:page_size + 1])
+            data[key] = SwappOfferSerializer(offers[:page_size], many=True).data
+            next_url = f"{reverse('swapp-offer-list')}?{urlencode({'type': offer_type, 'page': 2})}"
+            data[f'{key}_next'] = request.build_absolute_uri(next_url) if len(offers) > page_size else None
+        response = Response(data)
+        response['Deprecation'] = 'true'
+        response['Link'] = f'<{request.build_absolute_uri(reverse("swapp-inbox"))}>; rel="successor-version"'
+        return response
+
+
+class SwappOfferInboxView(generics.ListAPIView):
+    """
+    Offers received (`box = 'inbox'`) or made (`'outbox'`) by the user as
+    compact summaries, newest first, optionally narrowed with `?status=`.
+    Pages are a fixed number of queries; pass `?cursor=` for keyset paging.
+    """
+    serializer_class = SwappOfferSummarySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = FeedPagination
+    box = 'inbox'
+
+    def get_queryset(self):
+        offers = offer_box(self.request.user, self.box)
+        offer_status = self.request.query_params.get('status')
+        if offer_status:
+            offers = offers.filter(status=offer_status)
+        return offer_summaries(offers)
+
+
+class SwappOfferOutboxView(SwappOfferInboxView):
+    box = 'outbox'
+
+
+class SwappOfferUnseenCountView(APIView):
+    """Badge counts: new offers received and seller replies to offers made that the user has not seen."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        counts = unseen_counts(request.user)
+        return Response({**counts, 'total': sum(counts.values())})
+
+
+class SwappOfferSeenView(APIView):
+    """Clears the badge for `box` ('inbox' or 'outbox'), or only for the offers listed in `ids`."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        box = request.data.get('box')
+        if box not in OFFER_BOXES:
+            return Response({'error': f"box must be one of: {', '.join(OFFER_BOXES)}."}, status=400)
+        ids = request.data.get('ids')
+        if ids is not None and (
+            not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)
+        ):
+            return Response({'error': 'ids must be a list of offer ids.'}, status=400)
+        return Response({'updated': mark_seen(request.user, box, ids)})
+
+class SwapSuggestionListView(generics.ListAPIView):
+    """Multi-way swaps the user could join, shortest rings first; only rings whose every leg still holds."""
+    serializer_class = SwapCycleSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return cycle_summaries(live_cycles(self.request.user))
 
 # Handle Offer Actions (Accept/Decline/Counter)
 class SwappOfferActionView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
-        offer = get_object_or_404(SwappOffer, pk=pk)
-        action = request.data.get('action')
-        if offer.item.seller != request.user:
-            return Response({'error': 'Unauthorized.'}, status=403)
-
-        if action == 'accept':
-            offer.status = 'accepted'
-            offer.save()
-            # Notify user
-        elif action == 'decline':
-            offer.status = 'declined'
-            offer.save()
-        elif action == 'counter':
-            offer.status = 'countered'
-            offer.cash_difference = request.data.get('cash_difference', offer.cash_difference)
-            offer.message = request.data.get('message', offer.message)
-            offer.save()
-        else:
-            return Response({'error': 'Invalid action.'}, status=400)
-
+        try:
+            offer = apply_offer_action(pk, request.user, request.data.get('action'), request.data)
+        except OfferError as exc:
+            return Response({'error': exc.message}, status=exc.status)
         return Response(SwappOfferSerializer(offer).data)
 
 class SwappOfferCreateView(CreateAPIView):
@@ -420,12 +677,12 @@ class SwappOfferCreateView(CreateAPIView):
     
 
     def perform_create(self, serializer):
+        offer = serializer.save(offered_by=self.request.user)
         Notification.objects.create(
             user=offer.item.seller,
             content=f"{offer.offered_by.username} made a Swapp offer on your item: {offer.item.title}.",
             link=f"/my-swapps"
                 )
-        serializer.save(offered_by=self.request.user)
         
         
         
@@ -448,15 +705,17 @@ def toggle_save_item(request, pk):
 # 📆 EVENTS & RSVP
 # ----------------------------------
 
-class EventListCreateView(generics.ListCreateAPIView):
+class EventListCreateView(CityFeedCacheMixin, generics.ListCreateAPIView):
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = FeedPagination
+    feed_cache_name = 'events'
 
     def get_queryset(self):
-        city = self.request.query_params.get('city')
-        if isinstance(city, str) and city.strip():
-            return Event.objects.filter(city__iexact=city.strip()).order_by('datetime')
-        return Event.objects.all().order_by('datetime')
+        city = normalize_city(self.request.query_params.get('city'))
+        if city:
+            return Event.objects.filter(city_key=city).order_by('datetime', 'id')
+        return Event.objects.all().order_by('datetime', 'id')
 
 
     def perform_create(self, serializer):
@@ -467,7 +726,8 @@ class EventListCreateView(generics.ListCreateAPIView):
     def get_serializer_context(self):
         return {'request': self.request}
     
-class EventDetailView(RetrieveAPIView):
+class EventDetailView(ViewCountMixin, RetrieveAPIView):
+    view_counter = event_views
     queryset = Event.objects.all()
     serializer_class = EventSerializer
     permission_classes = [permissions.AllowAny]
@@ -481,11 +741,11 @@ class RSVPEventView(UpdateAPIView):
         event = self.get_object()
         user = request.user
         
-        if event.datetime < now():
+        if event.datetime < timezone.now():
             return Response({'error': 'Cannot RSVP to past events'}, status=400)
 
-        if user in event.rsvps.all():
-            event.rsvps.remove(user)
+        result, position = toggle_rsvp(event, user)
+        if result == CANCELLED:
             send_mail(
                 subject='You CANCELLED an event RSVP!',
                 message=f"Hi {user.username}, you've cancelled your RSVP’d to: {event.title} on {event.datetime.strftime('%Y-%m-%d %H:%M')}.",
@@ -493,19 +753,21 @@ class RSVPEventView(UpdateAPIView):
                 recipient_list=[user.email],
 )
             return Response({'message': 'RSVP removed'}, status=200)
-        else:
-            if event.rsvp_limit and event.rsvps.count() >= event.rsvp_limit:
-                return Response({'error': 'Event is full'}, status=400)
+        if result == LEFT_WAITLIST:
+            return Response({'message': 'Removed from the waitlist'}, status=200)
+        if result == WAITLISTED:
+            return Response({'message': 'Event is full, you are on the waitlist', 'waitlist_position': position}, status=200)
+        if result == FULL:
+            return Response({'error': 'Event is full'}, status=400)
 
-            event.rsvps.add(user)
-            award_xp(user, 5)
-            send_mail(
-                subject='🎉 You RSVP’d to an event!',
-                message=f"Hi {user.username}, you've RSVP’d to: {event.title} on {event.datetime.strftime('%Y-%m-%d %H:%M')}.",
-                from_email=None,
-                recipient_list=[user.email],
+        award_xp(user, 5)
+        send_mail(
+            subject='🎉 You RSVP’d to an event!',
+            message=f"Hi {user.username}, you've RSVP’d to: {event.title} on {event.datetime.strftime('%Y-%m-%d %H:%M')}.",
+            from_email=None,
+            recipient_list=[user.email],
 )
-            return Response({'message': 'RSVP successful'}, status=200)
+        return Response({'message': 'RSVP successful'}, status=200)
 
 # ----------------------------------
 # 💬 MESSAGING
@@ -733,8 +995,8 @@ class PublicGroupListView(ListAPIView):
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        city = self.request.query_params.get('city', '').lower()
-        return Group.objects.filter(is_public=True, city=city)
+        city = normalize_city(self.request.query_params.get('city'))
+        return Group.objects.filter(is_public=True, city_key=city)
 
 class JoinGroupView(APIView):
     permission_classes = [IsAuthenticated]
@@ -806,16 +1068,21 @@ class FeedbackListView(ListAPIView):
     def get_queryset(self):
         return Feedback.objects.all().order_by('-created_at')
 
+class FeedCacheStatsView(APIView):
+    permission_classes = [IsAdminOrModerator]
+
+    def get(self, request):
+        return Response(get_feed_cache_stats())
+
 class LeaderboardView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        city = request.query_params.get('city')
+        city = normalize_city(request.query_params.get('city'))
         if not city:
             return Response({'error': 'City is required.'}, status=400)
 
-        city = city.lower()
-        top_users = User.objects.filter(city=city).order_by('-xp')[:10]
+        top_users = User.objects.filter(city_key=city).order_by('-xp')[:10]
         data = [{"username": u.username, "xp": u.xp} for u in top_users]
         return Response(data)
 
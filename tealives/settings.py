@@ -132,6 +132,37 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache (feed page cache, see core/cache.py)
+if IS_RENDER:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+FEED_CACHE_TIMEOUT = 300  # seconds; stale pages are also dropped on every city version bump
+
+# Marketplace media ingestion (see core/ingest.py). Uploads are staged under
+# MEDIA_STAGING_ROOT and pushed to storage by a background pool of workers.
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_STAGING_ROOT = os.environ.get('MEDIA_STAGING_ROOT', BASE_DIR / 'media_staging')
+# 'core.ingest.LocalMediaStorage' keeps everything on local disk for offline development.
+MARKETPLACE_MEDIA_STORAGE = os.environ.get('MARKETPLACE_MEDIA_STORAGE', 'core.ingest.CloudinaryMediaStorage')
+MEDIA_INGEST_WORKERS = 4
+MEDIA_INGEST_MAX_ATTEMPTS = 3
+MEDIA_INGEST_RETRY_DELAY = 2  # seconds, doubled after every failed attempt
+IMAGE_PROCESS_WORKERS = None  # processes rendering image derivatives (core/imaging.py); None = one per CPU
+
+# Write-behind view counters (see core/counters.py): at most this many seconds of views are lost on a crash.
+VIEW_COUNTER_FLUSH_INTERVAL = 10
+VIEW_COUNTER_MAX_PENDING = 1000  # distinct rows buffered before an early flush
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 